@@ -40,7 +40,7 @@ class DatasetArchiver(object):
         self.dataset = dataset
         self.notation = notation
         self.updated = updated.replace(microsecond=0)
-        self.endpoint = Endpoint(store.query_endpoint)
+        self.endpoint = Endpoint(store.query_endpoint, admission_pool='batch')
 
     @property
     def graph_names(self):
@@ -243,7 +243,7 @@ class DatasetArchiver(object):
 def update_dataset_archives(sender, update_definition, store_graphs, when, **kwargs):
     for store in store_graphs:
         graph_names = store_graphs[store]
-        endpoint = Endpoint(store.query_endpoint)
+        endpoint = Endpoint(store.query_endpoint, admission_pool='batch')
 
         if DATASET_NOTATION:
             notation_clause = """
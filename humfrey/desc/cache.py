@@ -0,0 +1,160 @@
+"""
+Caching of rendered DocView responses.
+
+Responses are cached for each document URL and the format it was rendered
+in, along with the versions of the graphs that contributed to them (those that ov:describe the
+resource). Each graph has a version number in Django's cache, which is bumped
+when the graphs_updated signal is sent for it; a cached response is only used
+if the versions of all its graphs are unchanged. Resources whose descriptions
+don't say which graphs they came from are versioned on the store's result
+cache generation instead, so are invalidated by any update.
+
+Cached responses have an ETag derived from their graph versions, and a
+Last-Modified of when they were rendered, so conditional requests can be
+answered without rendering anything.
+"""
+
+import calendar
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+from humfrey.signals import graphs_updated
+from humfrey.sparql import cache as results_cache
+from humfrey.utils.statsd import statsd
+
+logger = logging.getLogger(__name__)
+
+# Seconds to cache rendered documents for; zero disables caching. Set 'doc'
+# in the [cache] section of your config file to change it.
+TIMEOUT = getattr(settings, 'CACHE_TIMES', {}).get('doc', 0)
+
+# These shouldn't be shared between clients. Vary is kept, so that caches
+# downstream know that the response was negotiated.
+_UNCACHED_HEADERS = frozenset(['set-cookie'])
+
+def _hash(*args):
+    return hashlib.sha1('\0'.join(a.encode('utf-8') if isinstance(a, unicode) else str(a) for a in args)).hexdigest()
+
+def _version_key(url, graph):
+    return 'desc:graph-version:%s' % _hash(url, graph)
+
+def get_versions(url, graphs):
+    """
+    Returns a dictionary of the current versions of graphs in a store.
+
+    If graphs is empty, returns the store's result cache generation, keyed on
+    None.
+    """
+    if not graphs:
+        return {None: results_cache.get_generation(url)}
+    keys = dict((_version_key(url, graph), graph) for graph in graphs)
+    versions = cache.get_many(keys.keys())
+    for key in keys:
+        if key not in versions:
+            # As with results_cache.get_generation, start from the current
+            # time so as not to reuse old versions if this one was evicted.
+            cache.add(key, int(time.time() * 1000), results_cache.GENERATION_TIMEOUT)
+            versions[key] = cache.get(key)
+    return dict((keys[key], version) for key, version in versions.iteritems())
+
+def invalidate(url, graphs):
+    """
+    Bumps the versions of graphs in a store, invalidating cached documents
+    built from them.
+    """
+    for graph in graphs:
+        key = _version_key(url, graph)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), results_cache.GENERATION_TIMEOUT)
+    logger.debug("Invalidated cached documents for %d graphs in %r", len(graphs), url)
+
+def get_cache_key(url, doc_url, format):
+    """
+    Returns the cache key for a document rendered in a format.
+
+    This is keyed on the negotiated format rather than the Accept header, as
+    clients send many different Accept headers that lead to the same thing.
+    """
+    return 'desc:response:%s' % _hash(url, doc_url, format)
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in (e.strip() for e in if_none_match.split(',')) or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+def _add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+def get(request, key, url):
+    """
+    Returns a response for request from the cache, or None.
+
+    The response will be a 304 Not Modified if the request's conditional
+    headers match the cached response.
+    """
+    cached = cache.get(key)
+    if cached is None:
+        statsd.incr('humfrey.doc-cache.miss')
+        return None
+    if get_versions(url, [g for g in cached['versions'] if g is not None]) != cached['versions']:
+        statsd.incr('humfrey.doc-cache.stale')
+        return None
+    statsd.incr('humfrey.doc-cache.hit')
+
+    etag, last_modified = cached['etag'], cached['last_modified']
+    if _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+        for header, value in cached['headers']:
+            if header.lower() == 'vary':
+                response[header] = value
+        return _add_validators(response, etag, last_modified)
+    response = HttpResponse(cached['content'], status=cached['status'])
+    for header, value in cached['headers']:
+        response[header] = value
+    return _add_validators(response, etag, last_modified)
+
+def put(key, url, graphs, generation, response, timeout=None):
+    """
+    Caches a successful response, and adds an ETag and Last-Modified to it.
+
+    generation is the store's result cache generation from before the
+    response was built; if it has since changed, the response may be out of
+    date and isn't cached.
+    """
+    timeout = TIMEOUT if timeout is None else timeout
+    if response.status_code != 200 or not timeout:
+        return response
+    versions = get_versions(url, graphs)
+    if results_cache.get_generation(url) != generation:
+        statsd.incr('humfrey.doc-cache.changed')
+        return response
+
+    # Reading the content consumes it if it's an iterator, so put it back.
+    content = response.content
+    response.content = content
+    etag = '"%s"' % _hash(key, *sorted(versions.items()))
+    last_modified = calendar.timegm(time.gmtime())
+    cache.set(key, {'versions': versions,
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'status': response.status_code,
+                    'headers': [(h, v) for h, v in response.items() if h.lower() not in _UNCACHED_HEADERS],
+                    'content': content}, timeout)
+    return _add_validators(response, etag, last_modified)
+
+@receiver(graphs_updated)
+def _graphs_updated(sender, store, graphs, **kwargs):
+    invalidate(store.query_endpoint, graphs)
@@ -1,3 +1,4 @@
 from django.db import models
 
-# Create your models here.
+# Connects the signal receiver that invalidates cached documents
+from humfrey.desc import cache
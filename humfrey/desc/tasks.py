@@ -0,0 +1,166 @@
+"""
+Warms caches for resources in graphs that have just been updated.
+
+After an update, the first visitor to each affected page would otherwise pay
+for looking up its types, querying for its description and rendering it. The
+warm_caches task does this ahead of time for each local resource in the
+updated graphs, so that the type cache and (if enabled) the document cache
+are populated before anyone asks.
+
+Documents are rendered by passing requests through the full middleware
+stack, so they are cached exactly as they would be for a visitor negotiating
+the same format.
+"""
+
+import logging
+import threading
+import urlparse
+
+from celery.task import task
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.test.client import RequestFactory
+import rdflib
+
+from humfrey.desc import cache as doc_cache
+from humfrey.linkeddata.mappingconf import set_id_mapping
+from humfrey.linkeddata.uri import doc_forwards
+from humfrey.signals import graphs_updated
+from humfrey.sparql import typecache
+from humfrey.sparql.endpoint import Endpoint
+from humfrey.utils.statsd import statsd
+
+logger = logging.getLogger(__name__)
+
+ID_MAPPING = getattr(settings, 'ID_MAPPING', ())
+
+# The number of documents to render at once
+CONCURRENCY = getattr(settings, 'CACHE_WARMER_CONCURRENCY', 4)
+# The most resources to warm caches for after an update
+MAX_RESOURCES = getattr(settings, 'CACHE_WARMER_MAX_RESOURCES', 10000)
+# The (format, Accept header) pairs to render each document for. A format of
+# None requests the document's canonical URL, which is rendered (and cached)
+# in whichever format the Accept header negotiates, so there's one entry for
+# each format that clients commonly negotiate. Other URLs include the format,
+# so are cached regardless of the Accept header.
+VARIANTS = getattr(settings, 'CACHE_WARMER_VARIANTS', (
+    (None, 'text/html'),
+    (None, 'application/rdf+xml'),
+    ('rdf', '*/*'),
+    ('ttl', '*/*'),
+    ('nt', '*/*'),
+    ('json', '*/*'),
+))
+
+_subjects_query = """
+    SELECT DISTINCT ?s WHERE {
+      VALUES ?g { %s }
+      GRAPH ?g { ?s ?p ?o }
+      FILTER ( isIRI(?s) )
+    } LIMIT %d
+"""
+
+def get_subjects(endpoint, graphs, limit=None):
+    """
+    Returns the URIs of resources described in any of graphs.
+    """
+    if not graphs:
+        return []
+    query = _subjects_query % (' '.join(rdflib.URIRef(g).n3() for g in graphs),
+                               limit or MAX_RESOURCES)
+    return [result.s for result in endpoint.query(query, cache_timeout=0)]
+
+def get_doc_urls(uri, variants=None):
+    """
+    Yields (url, accept) pairs for each variant of uri's document.
+
+    Only resources with local documents (i.e. those in ID_MAPPING) are
+    considered.
+    """
+    for id_prefix, doc_prefix, _ in ID_MAPPING:
+        if uri.startswith(id_prefix):
+            break
+    else:
+        return
+    doc_urls = doc_forwards(uri, described=True)
+    for format, accept in (variants or VARIANTS):
+        yield doc_urls[format], accept
+
+class _Renderer(object):
+    """
+    Renders documents through the usual request handling machinery.
+    """
+    def __init__(self):
+        self._handler = BaseHandler()
+        self._handler.load_middleware()
+        self._factory = RequestFactory()
+
+    def __call__(self, url, accept):
+        parsed = urlparse.urlparse(url)
+        path = parsed.path + ('?' + parsed.query if parsed.query else '')
+        request = self._factory.get(path,
+                                    HTTP_HOST=parsed.netloc,
+                                    HTTP_ACCEPT=accept,
+                                    HTTP_USER_AGENT='humfrey cache warmer')
+        if parsed.scheme == 'https':
+            request.META['wsgi.url_scheme'] = 'https'
+        return self._handler.get_response(request)
+
+def _worker(render, documents):
+    while True:
+        try:
+            url, accept = documents.pop()
+        except IndexError:
+            break
+        try:
+            with statsd.timer('humfrey.cache-warmer.render'):
+                response = render(url, accept)
+        except Exception:
+            logger.exception("Failed to render %r for cache warming", url)
+            statsd.incr('humfrey.cache-warmer.error')
+        else:
+            if response.status_code == 200:
+                statsd.incr('humfrey.cache-warmer.rendered')
+            else:
+                statsd.incr('humfrey.cache-warmer.status.%d' % response.status_code)
+
+def render_documents(documents, render=None, concurrency=None):
+    """
+    Renders each of a list of (url, accept) pairs, using a bounded number of
+    threads.
+    """
+    documents = list(documents)
+    documents.reverse()
+    render = render or _Renderer()
+    workers = [threading.Thread(target=_worker, args=(render, documents))
+               for i in range(min(concurrency or CONCURRENCY, len(documents)))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+@task(name='humfrey.desc.warm_caches', ignore_result=True)
+def warm_caches(sender, store, graphs, when, **kwargs):
+    endpoint = Endpoint(store.query_endpoint, admission_pool='batch')
+    subjects = get_subjects(endpoint, graphs)
+    logger.info("Warming caches for %d resources in %d updated graphs", len(subjects), len(graphs))
+    statsd.incr('humfrey.cache-warmer.resources', len(subjects))
+
+    # Looked up in batches, which is much quicker than one at a time when
+    # each document is rendered.
+    with statsd.timer('humfrey.cache-warmer.types'):
+        typecache.get_types(endpoint, subjects)
+
+    if not doc_cache.TIMEOUT:
+        return
+
+    set_id_mapping(ID_MAPPING)
+    try:
+        documents = [doc for subject in subjects for doc in get_doc_urls(subject)]
+    finally:
+        set_id_mapping(None)
+    with statsd.timer('humfrey.cache-warmer.documents'):
+        render_documents(documents)
+    logger.info("Rendered %d documents for cache warming", len(documents))
+
+graphs_updated.connect(warm_caches.delay)
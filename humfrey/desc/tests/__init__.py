@@ -1 +1,3 @@
-from .views import *
\ No newline at end of file
+from .cache import *
+from .tasks import *
+from .views import *
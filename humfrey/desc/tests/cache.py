@@ -0,0 +1,88 @@
+import mock
+import unittest
+
+import rdflib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test.client import RequestFactory
+
+from humfrey.desc import cache as doc_cache
+from humfrey.signals import graphs_updated
+from humfrey.sparql import cache as results_cache
+
+STORE_URL = 'http://sparql.example.org/query'
+DOC_URL = 'http://data.example.org/doc/foo'
+GRAPHS = [rdflib.URIRef('http://data.example.org/graph/%d' % i) for i in range(2)]
+
+class DocCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.key = doc_cache.get_cache_key(STORE_URL, DOC_URL, 'html')
+
+    def put(self, graphs=GRAPHS, content='<p>foo</p>'):
+        generation = results_cache.get_generation(STORE_URL)
+        response = HttpResponse(iter([content]), mimetype='text/html')
+        return doc_cache.put(self.key, STORE_URL, graphs, generation, response, timeout=60)
+
+    def get(self, **headers):
+        return doc_cache.get(self.factory.get('/doc/foo', **headers), self.key, STORE_URL)
+
+    def testCached(self):
+        self.assertEqual(self.get(), None)
+        response = self.put()
+        self.assertEqual(response.content, '<p>foo</p>')
+        cached = self.get()
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.content, '<p>foo</p>')
+        self.assertEqual(cached['Content-Type'], 'text/html')
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(cached['Last-Modified'], response['Last-Modified'])
+
+    def testVaryKept(self):
+        response = HttpResponse(iter(['<p>foo</p>']), mimetype='text/html')
+        response['Vary'] = 'Accept'
+        response['Set-Cookie'] = 'foo=bar'
+        response = doc_cache.put(self.key, STORE_URL, GRAPHS, results_cache.get_generation(STORE_URL),
+                                 response, timeout=60)
+        cached = self.get()
+        self.assertEqual(cached['Vary'], 'Accept')
+        self.assertFalse(cached.has_header('Set-Cookie'))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag'])['Vary'], 'Accept')
+
+    def testConditional(self):
+        response = self.put()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 00:00:00 GMT').status_code, 200)
+
+    def testInvalidatedByGraph(self):
+        self.put()
+        graphs_updated.send(None, store=mock.Mock(query_endpoint=STORE_URL),
+                            graphs=frozenset(GRAPHS[1:]), when=None)
+        self.assertEqual(self.get(), None)
+
+    def testNotInvalidatedByOtherGraphs(self):
+        self.put(GRAPHS[:1])
+        doc_cache.invalidate(STORE_URL, GRAPHS[1:])
+        self.assertNotEqual(self.get(), None)
+
+    def testWithoutGraphs(self):
+        self.put([])
+        self.assertNotEqual(self.get(), None)
+        results_cache.invalidate(STORE_URL)
+        self.assertEqual(self.get(), None)
+
+    def testUpdatedWhileRendering(self):
+        generation = results_cache.get_generation(STORE_URL)
+        results_cache.invalidate(STORE_URL)
+        response = doc_cache.put(self.key, STORE_URL, GRAPHS, generation, HttpResponse('foo'), timeout=60)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.get(), None)
+
+    def testErrorsNotCached(self):
+        generation = results_cache.get_generation(STORE_URL)
+        doc_cache.put(self.key, STORE_URL, GRAPHS, generation, HttpResponse('foo', status=500), timeout=60)
+        self.assertEqual(self.get(), None)
@@ -0,0 +1,70 @@
+import threading
+import unittest
+
+import mock
+import rdflib
+
+from humfrey.desc import tasks
+from humfrey.linkeddata.mappingconf import set_id_mapping
+from humfrey.signals import graphs_updated
+from humfrey.sparql.endpoint import Endpoint
+from humfrey.sparql.tests.server import SparqlServer
+from humfrey.sparql.tests.typecache import srx
+
+# Don't try to queue cache warming when other tests send graphs_updated.
+graphs_updated.disconnect(tasks.warm_caches.delay)
+
+TEST_ID_MAPPING = (('http://id.example.org/', 'http://data.example.org/doc/', True),)
+
+class CacheWarmerTestCase(unittest.TestCase):
+    def testGetSubjects(self):
+        with SparqlServer() as server:
+            server.response_body = srx(['s'], [['http://id.example.org/foo']])
+            endpoint = Endpoint(server.url)
+            self.assertEqual(tasks.get_subjects(endpoint, []), [])
+            self.assertEqual(server.queries, 0)
+            self.assertEqual(tasks.get_subjects(endpoint, ['http://data.example.org/graph/foo']),
+                             [rdflib.URIRef('http://id.example.org/foo')])
+
+    def testGetDocURLs(self):
+        variants = ((None, 'text/html'), ('ttl', ''))
+        set_id_mapping(TEST_ID_MAPPING)
+        try:
+            with mock.patch('humfrey.desc.tasks.ID_MAPPING', TEST_ID_MAPPING):
+                self.assertEqual(list(tasks.get_doc_urls(rdflib.URIRef('http://id.example.org/foo'), variants)),
+                                 [('http://data.example.org/doc/foo', 'text/html'),
+                                  ('http://data.example.org/doc/foo.ttl', '')])
+                self.assertEqual(list(tasks.get_doc_urls(rdflib.URIRef('http://other.example.org/foo'), variants)), [])
+        finally:
+            set_id_mapping(None)
+
+    def testRenderDocuments(self):
+        rendered, threads = [], set()
+        def render(url, accept):
+            rendered.append((url, accept))
+            threads.add(threading.current_thread())
+            if url == 'broken':
+                raise Exception
+            return mock.Mock(status_code=200)
+        documents = [('http://data.example.org/doc/%d' % i, '') for i in range(10)] + [('broken', '')]
+        tasks.render_documents(documents, render, concurrency=3)
+        self.assertEqual(sorted(rendered), sorted(documents))
+        self.assertTrue(len(threads) <= 3)
+
+    @mock.patch('humfrey.desc.tasks.render_documents')
+    @mock.patch('humfrey.sparql.typecache.get_types')
+    @mock.patch('humfrey.desc.tasks.get_subjects')
+    def testWarmCaches(self, get_subjects, get_types, render_documents):
+        subjects = [rdflib.URIRef('http://id.example.org/foo'), rdflib.URIRef('http://other.example.org/bar')]
+        get_subjects.return_value = subjects
+        store = mock.Mock(query_endpoint='http://sparql.example.org/query')
+        with mock.patch('humfrey.desc.tasks.ID_MAPPING', TEST_ID_MAPPING):
+            with mock.patch('humfrey.desc.cache.TIMEOUT', 0):
+                tasks.warm_caches(None, store=store, graphs=['http://data.example.org/graph/foo'], when=None)
+                self.assertEqual(get_types.call_args[0][1], subjects)
+                self.assertFalse(render_documents.called)
+            with mock.patch('humfrey.desc.cache.TIMEOUT', 60):
+                tasks.warm_caches(None, store=store, graphs=['http://data.example.org/graph/foo'], when=None)
+                documents = render_documents.call_args[0][0]
+                self.assertEqual(len(documents), len(tasks.VARIANTS))
+                self.assertTrue(all(url.startswith('http://data.example.org/doc/foo') for url, accept in documents))
@@ -15,14 +15,19 @@ from django_conneg import decorators
 from django_conneg.views import HTMLView, ContentNegotiatedView
 from django_conneg.http import HttpResponseSeeOther, HttpResponseTemporaryRedirect, MediaType
 
+from humfrey.desc import cache as doc_cache
+from humfrey.linkeddata.labels import index_labels
 from humfrey.linkeddata.resource import Resource, IRI
 from humfrey.linkeddata.uri import doc_forward, doc_backward
 from humfrey.linkeddata.views import MappingView
+from humfrey.sparql import cache as results_cache
+from humfrey.sparql.batch import query_triples
 from humfrey.sparql.utils import get_labels
 
 from humfrey.results.views.json import JSONRDFView
 from humfrey.results.views.standard import RDFView
 from humfrey.sparql.views import StoreView
+from humfrey.utils.graph import CompactGraph
 from humfrey.utils.namespaces import NS, expand
 
 logger = logging.getLogger(__name__)
@@ -126,6 +131,21 @@ class DocView(MappingView, StoreView, RDFView, JSONRDFView, HTMLView):
         # canonicalisation doesn't get stuck in an endless redirect loop.
         doc_url = request.build_absolute_uri().replace('#', '%23')
 
+        # Rendered responses are cached by URL and the format to render,
+        # which is either given in the URL or negotiated. On a miss we note
+        # the result cache generation, so that we don't cache something that
+        # was built while an update was happening.
+        cache_key = None
+        if doc_cache.TIMEOUT:
+            store_url = self.store.query_endpoint
+            cache_format = doc_backward(doc_url, self.conneg.renderers_by_format)[1] \
+                        or (request.renderers[0].format if request.renderers else '')
+            cache_key = doc_cache.get_cache_key(store_url, doc_url, cache_format)
+            response = doc_cache.get(request, cache_key, store_url)
+            if response is not None:
+                return response
+            generation = results_cache.get_generation(store_url)
+
         # Given a URL 'http://example.org/doc/foo.bar' we check whether 'foo',
         # has a type (ergo 'bar' is a format), and if not we assume that
         # 'foo.bar' is part of the URI
@@ -164,19 +184,18 @@ class DocView(MappingView, StoreView, RDFView, JSONRDFView, HTMLView):
         subject_uri, doc_uri = self.context['subject_uri'], self.context['doc_uri']
         types = self.context['types']
 
-        queries, graph = [], rdflib.ConjunctiveGraph()
-        for prefix, namespace_uri in NS.iteritems():
-            graph.namespace_manager.bind(prefix, namespace_uri)
-
+        graph = CompactGraph()
         graph += ((subject_uri, NS.rdf.type, t) for t in types)
         subject = Resource(subject_uri, graph, self.endpoint)
 
-        for query in subject.get_queries():
-            graph += self.endpoint.query(query)
-            queries.append(query)
+        # The DESCRIBE, CONSTRUCT and any additional queries are independent
+        # of one another, so run them concurrently.
+        queries = list(subject.get_queries())
+        graph += query_triples(self.endpoint, queries)
 
-        licenses, datasets = set(), set()
+        licenses, datasets, graph_names = set(), set(), set()
         for graph_name in graph.subjects(NS['ov'].describes):
+            graph_names.add(graph_name)
             graph.add((doc_uri, NS['dcterms'].source, graph_name))
             licenses.update(graph.objects(graph_name, NS['dcterms'].license))
             datasets.update(graph.objects(graph_name, NS['void'].inDataset))
@@ -221,6 +240,10 @@ class DocView(MappingView, StoreView, RDFView, JSONRDFView, HTMLView):
         if expected_doc_url != doc_url:
             additional_headers['Content-Location'] = expected_doc_url
 
+        # The graph is now final, so we can find labels for everything in it
+        # at once, instead of as each resource is rendered.
+        index_labels(graph)
+
         # NOTE: This getattrs every atttr on subject, so would force
         # memoization on any cached attributes. We call it as late as
         # possible to make sure the graph won't change afterwards, making
@@ -229,11 +252,17 @@ class DocView(MappingView, StoreView, RDFView, JSONRDFView, HTMLView):
 
         if self.context['format']:
             try:
-                return self.render_to_format(format=format)
+                response = self.render_to_format(format=format)
             except KeyError:
                 raise Http404
         else:
-            return self.render()
+            response = self.render()
+
+        # If what looked like a format turned out to be part of the URI,
+        # we've rendered something other than what the key says.
+        if cache_key and (format or '') == cache_format:
+            response = doc_cache.put(cache_key, store_url, graph_names, generation, response)
+        return response
 
     @property
     def _doc_rdf_processors(self):
@@ -43,7 +43,7 @@ class IndexUpdater(object):
 
     def update_for_store(self, index, store):
         hash_key = 'humfrey:elasticsearch:indices:%s:%s' % (index.slug, store.slug)
-        endpoint = Endpoint(store.query_endpoint)
+        endpoint = Endpoint(store.query_endpoint, admission_pool='batch')
 
         logger.debug("Performing SPARQL query.", extra={'query': index.query})
         results = endpoint.query(index.query, defer=True).get_bindings()
@@ -0,0 +1,82 @@
+"""
+Per-graph indexes of resource labels.
+
+Finding a label for a resource means looking for each of a list of label
+predicates and picking the best by language. When rendering a page that
+links to hundreds of resources, doing that one resource at a time means
+repeated scans of the graph, so instead we build a LabelIndex once the graph
+won't change any more, and attach it to the graph with index_labels().
+"""
+
+import re
+
+from rdflib import URIRef, BNode
+
+from humfrey.utils.namespaces import expand, get_namespace_index
+
+# In order of preference
+LABEL_PROPERTIES = ('skos:prefLabel', 'rdfs:label', 'foaf:name', 'doap:name', 'dcterms:title', 'dc:title', 'rdf:value')
+
+LOCALPART_RE = re.compile('^[a-zA-Z\d_-]+$')
+
+_LANGUAGE_RANKS = {'en-GB': -3, 'en-US': -2, 'en': -1}
+
+def language_rank(value):
+    """
+    Sort key for values by language preference; lower is better.
+    """
+    if isinstance(value, (URIRef, BNode)):
+        return -4
+    return _LANGUAGE_RANKS.get(value.language, 0)
+
+def qname(uri):
+    """
+    Returns a prefixed name for uri, or uri itself if there isn't one.
+    """
+    for namespace, prefix in get_namespace_index().matches(uri):
+        localpart = uri[len(namespace):]
+        if LOCALPART_RE.match(localpart):
+            return '%s:%s' % (prefix, localpart)
+    return uri
+
+class LabelIndex(object):
+    """
+    The best label for each subject in a graph.
+
+    The best label is the one with the most preferred language, then from the
+    most preferred predicate, then the first in sorted order, as chosen by
+    BaseResource.actual_label. Subjects are keyed by their unicode
+    representation, as hashing rdflib terms is comparatively slow.
+    """
+    def __init__(self, graph):
+        best = {}
+        for i, name in enumerate(LABEL_PROPERTIES):
+            for subject, label in graph.subject_objects(expand(name)):
+                subject = unicode(subject)
+                key = language_rank(label), i, label
+                if subject not in best or key < best[subject]:
+                    best[subject] = key
+        self._labels = dict((subject, key[2]) for subject, key in best.iteritems())
+
+    def __contains__(self, subject):
+        return unicode(subject) in self._labels
+
+    def __len__(self):
+        return len(self._labels)
+
+    def get(self, subject, default=None):
+        return self._labels.get(unicode(subject), default)
+
+def index_labels(graph):
+    """
+    Builds and attaches a LabelIndex to graph, which must not be changed
+    afterwards.
+    """
+    graph.label_index = LabelIndex(graph)
+    return graph.label_index
+
+def get_label_index(graph):
+    """
+    Returns the LabelIndex attached to graph, or None.
+    """
+    return getattr(graph, 'label_index', None)
@@ -18,11 +18,10 @@ from django.utils.safestring import mark_safe
 from humfrey.utils.namespaces import NS, expand, PINGBACK
 from humfrey.linkeddata.uri import doc_forward
 from humfrey.linkeddata.mappingconf import get_resource_registry
+from humfrey.linkeddata.labels import LABEL_PROPERTIES, get_label_index, language_rank, qname
 
 image_logger = logging.getLogger('humfrey.utils.resource.image')
 
-LOCALPART_RE = re.compile('^[a-zA-Z\d_-]+$')
-
 IRI = re.compile(ur'^([^\\<>"{}|\[\]^`\x00-\x20])*$')
 
 def cache_per_identifier(f):
@@ -53,6 +52,11 @@ def is_resource(r):
 class ResourceRegistry(object):
     def __init__(self, *args):
         self._registry = defaultdict(set)
+        # Composed classes, by identifier type and matched rdf:types, and the
+        # bases for each set of matched rdf:types. The registry isn't changed
+        # after construction, so these never need invalidating.
+        self._classes = {}
+        self._bases = {}
         for arg in args:
             if isinstance(arg, (list, tuple)):
                 klass, types = arg[0], arg[1:]
@@ -67,9 +71,29 @@ class ResourceRegistry(object):
     def get_resource(self, identifier, graph, endpoint):
         if isinstance(identifier, BaseResource):
             return identifier
+        registry = self._registry
+        types = frozenset(t for t in graph.objects(identifier, NS['rdf'].type) if t in registry)
+        key = type(identifier), types
+        try:
+            cls = self._classes[key]
+        except KeyError:
+            bases = self.get_bases(types)
+            cls = self._classes[key] = type(type(identifier).__name__ + bases[0].__name__, bases + (type(identifier),), {})
+        return cls(identifier, graph, endpoint)
+
+    def get_bases(self, types):
+        """
+        Returns the resource classes to be combined for a set of rdf:types,
+        most specific first.
+        """
+        try:
+            return self._bases[types]
+        except KeyError:
+            pass
         classes = [BaseResource]
-        for t in graph.objects(identifier, NS['rdf'].type):
-            for new_class in self._registry.get(t, ()):
+        # Sorted so that the result doesn't depend on set ordering
+        for t in sorted(types):
+            for new_class in sorted(self._registry.get(t, ()), key=lambda cls: (cls.__module__, cls.__name__)):
                 # This merry dance makes sure that we drop superclasses if
                 # we've got something more specific
                 for c in classes:
@@ -84,9 +108,8 @@ class ResourceRegistry(object):
                 else:
                     classes.append(new_class)
         classes.sort(key=lambda cls:-getattr(cls, '_priority', 0))
-        cls = type(type(identifier).__name__ + classes[0].__name__, tuple(classes) + (type(identifier),), {})
-        resource = cls(identifier, graph, endpoint)
-        return resource
+        bases = self._bases[types] = tuple(classes)
+        return bases
 
     @classmethod
     def _get_object(cls, class_path):
@@ -240,7 +263,7 @@ class BaseResource(object):
 
         return [(Resource(p, self._graph, self._endpoint), os) for p, os in sorted(data.iteritems())]
 
-    _LABEL_PROPERTIES = ('skos:prefLabel', 'rdfs:label', 'foaf:name', 'doap:name', 'dcterms:title', 'dc:title', 'rdf:value')
+    _LABEL_PROPERTIES = LABEL_PROPERTIES
 
     def depictions(self):
         ds = list(itertools.chain(*map(self.get_all, settings.IMAGE_PROPERTIES)))
@@ -263,21 +286,11 @@ class BaseResource(object):
         return self._label
 
     def localised(self, values):
-        def f(v):
-            if isinstance(v, (URIRef, BNode)):
-                return -4
-            else:
-                return {'en-GB':-3, 'en-US':-2, 'en':-1}.get(v.language, 0)
-        return sorted(values, key=f)
+        return sorted(values, key=language_rank)
 
     @property
     def label2(self):
-        for prefix, uri in NS.iteritems():
-            if self._identifier.startswith(uri):
-                localpart = self._identifier[len(uri):]
-                if LOCALPART_RE.match(localpart):
-                    return '%s:%s' % (prefix, localpart)
-        return self._identifier
+        return qname(self._identifier)
 
     @property
     def actual_label(self):
@@ -285,6 +298,13 @@ class BaseResource(object):
         Finds a label predicate, or returns None
         """
         if '_actual_label' not in self.__dict__:
+            label_index = get_label_index(self._graph)
+            if label_index is not None and self._LABEL_PROPERTIES is LABEL_PROPERTIES:
+                label = label_index.get(unicode(self._identifier))
+                if is_resource(label):
+                    label = Resource(label, self._graph, self._endpoint)
+                self._actual_label = label
+                return label
             labels = list(itertools.chain(*[self.get_all(p) for p in self._LABEL_PROPERTIES]))
             if labels:
                 self._actual_label = self.localised(labels)[0]
@@ -9,7 +9,7 @@ import rdflib
 from django.core.urlresolvers import set_urlconf
 from django_hosts.reverse import get_host
 
-from humfrey.linkeddata import mappingconf, resource
+from humfrey.linkeddata import labels, mappingconf, resource
 from humfrey.linkeddata.uri import doc_forward, doc_backward
 from humfrey.tests.stubs import patch_id_mapping
 
@@ -103,6 +103,20 @@ class URITestCase(RelativeURLTestCase):
         self.assertEqual(doc_forward(uri),
                          'http://data.example.org/doc/foo')
 
+    @set_mappingconf
+    def testOverlappingMappings(self):
+        # The first matching prefix wins, not the longest
+        mappingconf.set_id_mapping((
+            ('http://id.example.org/', 'http://data.example.org/doc/', True),
+            ('http://id.example.org/special/', 'http://data.example.org/special/', False),
+        ))
+        uri = rdflib.URIRef('http://id.example.org/special/foo')
+        self.assertEqual(doc_forward(uri), 'http://data.example.org/doc/special/foo')
+        self.assertEqual(doc_backward('http://data.example.org/special/foo'),
+                         (rdflib.URIRef('http://id.example.org/special/foo'), None, False))
+        self.assertEqual(doc_backward('http://data.example.org/doc/foo.nt'),
+                         (rdflib.URIRef('http://id.example.org/foo'), 'nt', True))
+
 class UnicodeURITestCase(RelativeURLTestCase):
     TESTS = [
         (u'http://id.example.org/fuß', 'http://data.example.org/doc/fu%C3%9F'),
@@ -136,6 +150,67 @@ class UnicodeURITestCase(RelativeURLTestCase):
                 self.assertRelativeEqual(doc_backward(url)[0], uri)
                 self.assertRelativeEqual(doc_forward(doc_backward(url)[0], described=True), url)
 
+class ResourceRegistryTestCase(unittest2.TestCase):
+    class Thing(object):
+        types = ('foaf:Document',)
+    class SpecificThing(Thing):
+        types = ('foaf:Image',)
+
+    def setUp(self):
+        self.registry = resource.ResourceRegistry(self.Thing, self.SpecificThing)
+        self.graph = rdflib.ConjunctiveGraph()
+        self.uris = [rdflib.URIRef('http://id.example.org/%d' % i) for i in range(3)]
+        for uri in self.uris[:2]:
+            self.graph.add((uri, rdflib.RDF.type, rdflib.URIRef('http://xmlns.com/foaf/0.1/Image')))
+            self.graph.add((uri, rdflib.RDF.type, rdflib.URIRef('http://xmlns.com/foaf/0.1/Document')))
+        self.graph.add((self.uris[1], rdflib.RDF.type, rdflib.URIRef('http://example.org/Unregistered')))
+
+    def testClassesShared(self):
+        one, two, three = [self.registry.get_resource(uri, self.graph, None) for uri in self.uris]
+        self.assertIs(type(one), type(two))
+        self.assertIsNot(type(one), type(three))
+        self.assertEqual(type(one).__bases__, (self.SpecificThing, resource.BaseResource, rdflib.URIRef))
+        self.assertEqual(type(three).__bases__, (resource.BaseResource, rdflib.URIRef))
+        self.assertEqual(unicode(one), unicode(self.uris[0]))
+
+    def testIdentifierType(self):
+        bnode = rdflib.BNode()
+        self.graph.add((bnode, rdflib.RDF.type, rdflib.URIRef('http://xmlns.com/foaf/0.1/Image')))
+        one = self.registry.get_resource(self.uris[0], self.graph, None)
+        two = self.registry.get_resource(bnode, self.graph, None)
+        self.assertIsInstance(two, rdflib.BNode)
+        self.assertIsNot(type(one), type(two))
+        self.assertEqual(type(one).__bases__[:-1], type(two).__bases__[:-1])
+
+class LabelIndexTestCase(unittest2.TestCase):
+    def setUp(self):
+        self.graph = rdflib.ConjunctiveGraph()
+        self.uris = [rdflib.URIRef('http://id.example.org/%d' % i) for i in range(4)]
+        skos, rdfs = rdflib.Namespace('http://www.w3.org/2004/02/skos/core#'), rdflib.RDFS
+        for triple in [(self.uris[0], rdfs.label, rdflib.Literal('b', lang='en')),
+                       (self.uris[0], rdfs.label, rdflib.Literal('a', lang='fr')),
+                       (self.uris[0], skos.prefLabel, rdflib.Literal('c', lang='en-GB')),
+                       (self.uris[1], rdfs.label, rdflib.Literal('d')),
+                       (self.uris[1], skos.prefLabel, rdflib.Literal('e')),
+                       (self.uris[2], rdfs.label, rdflib.Literal('g')),
+                       (self.uris[2], rdfs.label, rdflib.Literal('f'))]:
+            self.graph.add(triple)
+
+    @set_mappingconf
+    def testMatchesUnindexed(self):
+        expected = [resource.Resource(uri, self.graph, None).actual_label for uri in self.uris]
+        self.assertEqual(expected, [rdflib.Literal('c', lang='en-GB'), rdflib.Literal('e'), rdflib.Literal('f'), None])
+        label_index = labels.index_labels(self.graph)
+        self.assertIs(labels.get_label_index(self.graph), label_index)
+        self.assertEqual(len(label_index), 3)
+        self.assertEqual([resource.Resource(uri, self.graph, None).actual_label for uri in self.uris], expected)
+
+    def testQName(self):
+        self.assertEqual(labels.qname(rdflib.URIRef('http://www.w3.org/2000/01/rdf-schema#label')), 'rdfs:label')
+        self.assertEqual(labels.qname(rdflib.URIRef('http://www.w3.org/2000/01/rdf-schema#a.b')),
+                         rdflib.URIRef('http://www.w3.org/2000/01/rdf-schema#a.b'))
+        self.assertEqual(labels.qname(rdflib.URIRef('http://example.org/foo')), rdflib.URIRef('http://example.org/foo'))
+
 
 if __name__ == '__main__':
     unittest2.main()
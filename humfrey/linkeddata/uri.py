@@ -19,8 +19,35 @@ else:
         return reverse(*args, **kwargs)
     with_hosts = False
 
+from humfrey.utils.prefixes import PrefixIndex
+
 from .mappingconf import get_id_mapping, get_doc_view, get_desc_view
 
+# PrefixIndexes for ID mappings, by the id() of the mapping (and for backward
+# indexes, the scheme and host of the URL). The mapping is kept alongside its
+# index so that its id isn't reused. Mappings mustn't be changed in place.
+_forward_indexes, _backward_indexes = {}, {}
+# Start afresh if we see more mappings than this
+_MAX_INDEXES = 100
+
+def _get_index(indexes, key, mapping, items):
+    entry = indexes.get(key)
+    if entry is None or entry[0] is not mapping:
+        if len(indexes) >= _MAX_INDEXES:
+            indexes.clear()
+        # Values include their position in the mapping, so that where more
+        # than one prefix matches we can pick the first, as a linear scan
+        # would.
+        entry = indexes[key] = mapping, PrefixIndex((prefix, (i,) + tuple(value))
+                                                    for i, (prefix, value) in enumerate(items))
+    return entry[1]
+
+def _first_match(index, uri):
+    matches = index.matches(uri)
+    if matches:
+        prefix, value = min(matches, key=lambda match: match[1][0])
+        return (prefix,) + value[1:]
+
 class DocURLs(object):
     def __init__(self, base, format_pattern):
         self._base = base
@@ -44,11 +71,15 @@ def doc_forwards(uri, graph=None, described=None):
     else:
         encoded_uri = urllib.unquote(uri)
 
-    for id_prefix, doc_prefix, _ in get_id_mapping():
-        if uri.startswith(id_prefix):
-            base = doc_prefix + urllib.quote(encoded_uri[len(id_prefix):])
-            pattern = base.replace('%', '%%') + '.%(format)s'
-            return DocURLs(base, pattern)
+    id_mapping = get_id_mapping()
+    index = _get_index(_forward_indexes, id(id_mapping), id_mapping,
+                       ((id_prefix, (doc_prefix,)) for id_prefix, doc_prefix, _ in id_mapping))
+    match = _first_match(index, uri)
+    if match:
+        id_prefix, doc_prefix = match
+        base = doc_prefix + urllib.quote(encoded_uri[len(id_prefix):])
+        pattern = base.replace('%', '%%') + '.%(format)s'
+        return DocURLs(base, pattern)
 
     if graph is not None and not described and any(graph.triples((uri, None, None))):
         described = True
@@ -105,7 +136,25 @@ def doc_backward(url, formats=None):
     else:
         url_part = urlparse.urlparse(url).path
 
-    for id_prefix, doc_prefix, is_local in get_id_mapping():
+    id_mapping = get_id_mapping()
+    if all(doc_prefix.startswith('/') or urlparse.urlparse(doc_prefix).scheme
+           for _, doc_prefix, _ in id_mapping):
+        # Doc prefixes only depend on the scheme and host of url once
+        # resolved, so can be indexed.
+        parsed_url = urlparse.urlparse(url)
+        index = _get_index(_backward_indexes,
+                           (id(id_mapping), parsed_url.scheme, parsed_url.netloc),
+                           id_mapping,
+                           ((urlparse.urljoin(url, doc_prefix), (id_prefix, is_local))
+                            for id_prefix, doc_prefix, is_local in id_mapping))
+        match = _first_match(index, url_part)
+        if match:
+            doc_prefix, id_prefix, is_local = match
+            url_part = id_prefix + url_part[len(doc_prefix):]
+            return rdflib.URIRef(urllib.unquote(url_part)), format, is_local
+        return None, None, None
+
+    for id_prefix, doc_prefix, is_local in id_mapping:
         doc_prefix = urlparse.urljoin(url, doc_prefix)
         if url_part.startswith(doc_prefix):
             url_part = id_prefix + url_part[len(doc_prefix):]
@@ -7,13 +7,18 @@ from django_conneg.decorators import renderer
 from django_conneg.views import ContentNegotiatedView
 
 from humfrey.linkeddata.resource import Resource
+from humfrey.utils.graph import CompactGraph
 
 class KMLView(ContentNegotiatedView):
     @renderer(format='kml', mimetypes=('application/vnd.google-earth.kml+xml',), name='KML')
     def render_kml(self, request, context, template_name):
-        if not isinstance(context.get('graph'), rdflib.ConjunctiveGraph):
+        if not isinstance(context.get('graph'), (rdflib.ConjunctiveGraph, CompactGraph)):
             return NotImplemented
         graph = context['graph']
+        if not isinstance(graph, CompactGraph):
+            # We look up coordinates for every subject, which CompactGraph is
+            # quicker at.
+            graph = CompactGraph(graph)
         subjects = set()
         for subject in set(graph.subjects()):
             subject = Resource(subject, graph, self.endpoint)
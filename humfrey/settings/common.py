@@ -78,6 +78,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'humfrey.base.middleware.AccessControlAllowOriginMiddleware',
+    'humfrey.sparql.middleware.StoreBusyMiddleware',
 )
 
 TEMPLATE_DIRS = (
@@ -209,6 +210,15 @@ if config.get('update:enabled') == 'true':
         'humfrey.update.transform.xslt.XSLT',
     )
     UPDATE_TRANSFORM_REPOSITORY = config.get('update:transform_repository')
+    # The number of independent parts of a pipeline to run at once
+    UPDATE_TRANSFORM_WORKERS = int(config.get('update:transform_workers') or 4)
+    # Whether to reuse the outputs of deterministic transforms between updates
+    UPDATE_OUTPUT_CACHE = config.get('update:output_cache') != 'false'
+    # Whether transforms may hand triples to each other without writing them
+    # to intermediate files
+    UPDATE_STREAMING = config.get('update:streaming') == 'true'
+    # Whether to gzip uploads to the graph store, if it supports that
+    UPDATE_UPLOAD_GZIP = config.get('update:upload_gzip') == 'true'
 
 if config.get('ckan:enabled') == 'true':
     CKAN_API_KEY = config.get('ckan:api_key')
@@ -217,9 +227,16 @@ if config.get('ckan:enabled') == 'true':
 
 
 SPARQL_FORM_COMMON_PREFIXES = (config.get('sparql:form_common_prefixes') or 'true') == 'true'
+# Whether identical concurrent queries from different processes should share
+# a response, coordinated using redis.
+SPARQL_SINGLE_FLIGHT_REDIS = config.get('sparql:single_flight_redis') == 'true'
 
 CACHE_TIMES = {
     'page': 1800,
+    # SPARQL query results; zero disables caching
+    'sparql-query': 0,
+    # Rendered DocView responses; zero disables caching
+    'doc': 0,
 }
 CACHE_TIMES.update(dict((k[6:], int(v)) for k, v in config.iteritems() if k.startswith('cache:')))
 
@@ -1,10 +1,15 @@
 from django.contrib import admin
 from guardian.admin import GuardedModelAdmin
 
-from .models import Store, UserPrivileges
+from .models import Store, StoreReplica, UserPrivileges
+
+class StoreReplicaInline(admin.TabularInline):
+    model = StoreReplica
+    extra = 1
 
 class StoreAdmin(GuardedModelAdmin):
     list_display = ('slug', 'name')
+    inlines = [StoreReplicaInline]
 
 admin.site.register(Store, StoreAdmin)
 admin.site.register(UserPrivileges)
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Limits on the number of concurrent queries sent to each store.
+
+Without a limit, a busy site can send a store more queries than it can
+handle at once, and then every request slows down. Instead, each query
+endpoint has an AdmissionQueue for each of a number of pools, which lets a
+fixed number of queries through at once and makes the rest wait their turn.
+If too many are already waiting, or a query waits for too long, StoreBusy is
+raised, which StoreBusyMiddleware turns into a 503 Service Unavailable with
+a Retry-After header.
+
+There are two pools: 'interactive' for queries made while rendering pages
+(the default), and 'batch' for background work such as updates, indexing and
+archiving. Keeping them separate means a large update can't starve visitors
+of queries, or vice versa. Configure them with SPARQL_ADMISSION, which maps
+pool names to dictionaries with any of these keys:
+
+concurrency
+    The number of queries to let through at once
+queue
+    The number of queries that may wait, or None for no limit
+timeout
+    Seconds a query may wait, or None to wait as long as it takes
+
+SPARQL_ADMISSION_BY_ENDPOINT maps query endpoint URLs to dictionaries of the
+same form, overriding SPARQL_ADMISSION for particular stores.
+
+Queries are admitted to the queue for whichever of a store's query endpoint
+and its replicas they're sent to (see humfrey.sparql.routing). A query holds
+its place until its response has been read to the end or closed.
+"""
+
+import contextlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from humfrey.utils.statsd import statsd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL = 'interactive'
+
+POOLS = {
+    'interactive': {'concurrency': 16, 'queue': 64, 'timeout': 10},
+    'batch': {'concurrency': 4, 'queue': None, 'timeout': None},
+}
+for _name, _options in getattr(settings, 'SPARQL_ADMISSION', {}).iteritems():
+    POOLS[_name] = dict(POOLS.get(_name, {}), **_options)
+POOLS_BY_ENDPOINT = getattr(settings, 'SPARQL_ADMISSION_BY_ENDPOINT', {})
+
+class StoreBusy(Exception):
+    """
+    Raised when a store has too many queries waiting for it.
+
+    retry_after is an estimate of when to try again, in seconds.
+    """
+    def __init__(self, url, pool, retry_after):
+        self.url, self.pool, self.retry_after = url, pool, retry_after
+        super(StoreBusy, self).__init__("Too many queries waiting for %s (%s)" % (url, pool))
+
+class AdmissionQueue(object):
+    # Weighting of the latest duration in the moving average
+    _duration_weight = 0.1
+
+    def __init__(self, url, pool, concurrency, queue=None, timeout=None):
+        self.url, self.pool = url, pool
+        self.concurrency, self.queue, self.timeout = concurrency, queue, timeout
+        self.active = self.waiting = 0
+        self.average_duration = 1.0
+        self._condition = threading.Condition()
+        self._stat_prefix = 'humfrey.sparql-admission.%s' % pool
+
+    def get_retry_after(self):
+        """
+        Returns an estimate of how many seconds it'll be until a new query
+        could be let through.
+        """
+        backlog = (self.waiting + 1) / float(self.concurrency)
+        return max(1, int(math.ceil(backlog * self.average_duration)))
+
+    def _busy(self):
+        statsd.incr('%s.rejected' % self._stat_prefix)
+        logger.warning("Rejecting query to %r (%s) with %d active and %d waiting",
+                       self.url, self.pool, self.active, self.waiting)
+        return StoreBusy(self.url, self.pool, self.get_retry_after())
+
+    def acquire(self):
+        start = time.time()
+        with self._condition:
+            if self.active >= self.concurrency:
+                if self.queue is not None and self.waiting >= self.queue:
+                    raise self._busy()
+                self.waiting += 1
+                statsd.gauge('%s.queue-depth' % self._stat_prefix, self.waiting)
+                try:
+                    while self.active >= self.concurrency:
+                        if self.timeout is None:
+                            self._condition.wait()
+                            continue
+                        remaining = start + self.timeout - time.time()
+                        if remaining <= 0:
+                            raise self._busy()
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    statsd.gauge('%s.queue-depth' % self._stat_prefix, self.waiting)
+            self.active += 1
+        statsd.timing('%s.wait' % self._stat_prefix, (time.time() - start) * 1000)
+        return time.time()
+
+    def release(self, started):
+        duration = time.time() - started
+        with self._condition:
+            self.active -= 1
+            self.average_duration += self._duration_weight * (duration - self.average_duration)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def admit(self):
+        started = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def open(self, func, *args):
+        """
+        Calls func(*args) once let through, and returns the response it
+        returns wrapped in an AdmittedResponse.
+        """
+        started = self.acquire()
+        try:
+            response = func(*args)
+        except BaseException:
+            self.release(started)
+            raise
+        return AdmittedResponse(self, started, response)
+
+class AdmittedResponse(object):
+    """
+    A file-like wrapper around a response, which holds its place in an
+    AdmissionQueue until it has been read to the end or closed.
+    """
+    def __init__(self, queue, started, response):
+        self._queue, self._started, self._response = queue, started, response
+        self.status, self.reason, self.headers = response.status, response.reason, response.headers
+        self._check_done(None)
+
+    def _release(self):
+        if self._queue is not None:
+            self._queue.release(self._started)
+            self._queue = None
+
+    def _check_done(self, data):
+        if data == '' or self._response.isclosed():
+            self._release()
+        return data
+
+    def read(self, amt=None):
+        data = self._check_done(self._response.read(amt))
+        if amt is None or amt < 0:
+            self._release()
+        return data
+
+    def readline(self):
+        return self._check_done(self._response.readline())
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        self._release()
+        self._response.close()
+
+    def __del__(self):
+        self._release()
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_queue(url, pool=None):
+    """
+    Returns the AdmissionQueue for a query endpoint URL and pool name.
+    """
+    pool = pool or DEFAULT_POOL
+    try:
+        return _queues[url, pool]
+    except KeyError:
+        pass
+    with _queues_lock:
+        if (url, pool) not in _queues:
+            options = dict(POOLS[pool], **POOLS_BY_ENDPOINT.get(url, {}).get(pool, {}))
+            _queues[url, pool] = AdmissionQueue(url, pool, **options)
+        return _queues[url, pool]
+
+def admit(url, pool=None):
+    """
+    Context manager that waits for a query to be let through to an endpoint.
+
+    Raises StoreBusy if it's not let through.
+    """
+    return get_queue(url, pool).admit()
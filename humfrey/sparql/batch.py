@@ -0,0 +1,96 @@
+"""
+Runs several graph-returning SPARQL queries concurrently.
+
+Each query is performed in its own thread, and triples are handed back to the
+calling thread as they are parsed, so that the time taken is bounded by the
+slowest query rather than the sum of them all. Triples should only be added
+to a graph from the calling thread, as rdflib graphs aren't thread-safe.
+"""
+
+import logging
+import Queue
+import sys
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of queries to have in flight at once for a batch.
+MAX_WORKERS = getattr(settings, 'SPARQL_QUERY_CONCURRENCY', 4)
+
+# Triples are passed between threads in chunks to cut down on locking.
+_CHUNK_SIZE = 500
+
+def _get_triples(endpoint, query):
+    result = endpoint.query(query, defer=True,
+                            preferred_media_types=endpoint._supported_media_types)
+    if hasattr(result, 'get_triples'):
+        return result.get_triples()
+    else:
+        # Already a graph
+        return iter(result)
+
+def _worker(endpoint, queries, queue):
+    try:
+        while True:
+            try:
+                query = queries.pop()
+            except IndexError:
+                break
+            chunk = []
+            for triple in _get_triples(endpoint, query):
+                chunk.append(triple)
+                if len(chunk) >= _CHUNK_SIZE:
+                    queue.put(('triples', chunk))
+                    chunk = []
+            queue.put(('triples', chunk))
+    except:
+        queue.put(('exception', sys.exc_info()))
+    else:
+        queue.put(('done', None))
+
+def query_triples(endpoint, queries, max_workers=None):
+    """
+    Performs each of queries against endpoint, yielding the resulting triples
+    in the order they arrive.
+
+    If any query fails its exception is re-raised here once the other queries
+    in flight have finished.
+    """
+    queries = list(queries)
+    max_workers = min(max_workers or MAX_WORKERS, len(queries))
+
+    if max_workers <= 1:
+        for query in queries:
+            for triple in _get_triples(endpoint, query):
+                yield triple
+        return
+
+    # Each worker pops queries off the end of this list until there are none
+    # left. list.pop() is atomic, so there's no need for a lock.
+    queries.reverse()
+    queue = Queue.Queue()
+    workers = [threading.Thread(target=_worker, args=(endpoint, queries, queue))
+               for i in range(max_workers)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    running, exc_info = len(workers), None
+    while running:
+        type, value = queue.get()
+        if type == 'triples':
+            if exc_info is None:
+                for triple in value:
+                    yield triple
+        elif type == 'exception':
+            # Stop any workers from starting more queries.
+            del queries[:]
+            exc_info = exc_info or value
+            running -= 1
+        elif type == 'done':
+            running -= 1
+
+    if exc_info:
+        raise exc_info[0], exc_info[1], exc_info[2]
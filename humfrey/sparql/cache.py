@@ -0,0 +1,145 @@
+"""
+Caching of raw SPARQL query responses.
+
+Responses are stored verbatim (i.e. as SRX, N-Triples, etc.) in Django's
+cache, keyed on the endpoint URL, the Accept header sent, and the normalized
+query text. Each endpoint has a generation number which forms part of the key;
+it is bumped whenever the graphs_updated signal is sent for a store, which
+invalidates everything cached for that store at once.
+
+Generations are the time they began, in milliseconds, which lets the query
+router tell when a store was last updated without looking anything else up.
+
+The signal is usually sent by a Celery worker, so the bump only reaches web
+processes if they share Django's cache with it. With the default locmem
+backend each process has its own generations, and web processes won't see
+updates until their cached results expire; use memcached or similar when
+caching query results.
+"""
+
+import hashlib
+import logging
+import time
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+
+from humfrey.signals import graphs_updated
+from humfrey.utils.statsd import statsd
+
+logger = logging.getLogger(__name__)
+
+# Default number of seconds to cache query results for; zero disables caching.
+# Set 'sparql-query' in the [cache] section of your config file to change it.
+DEFAULT_TIMEOUT = getattr(settings, 'CACHE_TIMES', {}).get('sparql-query', 0)
+# Responses larger than this many bytes are streamed rather than cached.
+MAX_SIZE = getattr(settings, 'SPARQL_RESULT_CACHE_MAX_SIZE', 1024 * 1024)
+# Seconds to keep generations for. A timeout of None means Django's default
+# (five minutes), and memcached takes anything over 30 days to be a
+# timestamp, so this is as long as we can portably ask for.
+GENERATION_TIMEOUT = 30 * 24 * 3600
+
+def _hash(*args):
+    return hashlib.sha1('\0'.join(a.encode('utf-8') if isinstance(a, unicode) else str(a) for a in args)).hexdigest()
+
+def _generation_key(url):
+    return 'sparql:generation:%s' % _hash(url)
+
+def get_generation(url):
+    """
+    Returns the current cache generation for an endpoint URL.
+    """
+    key = _generation_key(url)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the current time, so that if the generation is evicted
+        # from the cache we don't end up reusing old keys.
+        cache.add(key, int(time.time() * 1000), GENERATION_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+def invalidate(url):
+    """
+    Invalidates all cached results for an endpoint URL.
+    """
+    key = _generation_key(url)
+    # The generation must change even if the clock hasn't.
+    generation = max(int(time.time() * 1000), (cache.get(key) or 0) + 1)
+    cache.set(key, generation, GENERATION_TIMEOUT)
+    logger.debug("Invalidated cached query results for %r", url)
+
+def get_generation_age(generation):
+    """
+    Returns the number of seconds since a generation began.
+    """
+    return time.time() - generation / 1000.0
+
+def get_cache_key(url, accept, query, generation=None):
+    if generation is None:
+        generation = get_generation(url)
+    return 'sparql:result:%s' % _hash(url, generation, accept, query)
+
+def get(key):
+    """
+    Returns a (content_type, stream) pair for a cached response, or None.
+    """
+    cached = cache.get(key)
+    if cached is None:
+        statsd.incr('humfrey.sparql-cache.miss')
+        return None
+    statsd.incr('humfrey.sparql-cache.hit')
+    content_type, body = cached
+    return content_type, StringIO(body)
+
+def put(key, content_type, response, timeout):
+    """
+    Reads a response and caches it, returning a stream over the same content.
+
+    If the response turns out to be larger than MAX_SIZE it isn't cached, and
+    the returned stream will continue reading from the response.
+    """
+    body = response.read(MAX_SIZE + 1)
+    if len(body) > MAX_SIZE:
+        statsd.incr('humfrey.sparql-cache.too-large')
+        return _PrefixedStream(body, response)
+    cache.set(key, (content_type, body), timeout)
+    return StringIO(body)
+
+class _PrefixedStream(object):
+    """
+    A file-like object that reads from a string and then from a stream.
+    """
+    def __init__(self, prefix, stream):
+        self._prefix, self._stream = StringIO(prefix), stream
+
+    def read(self, num=None):
+        if num is None or num < 0:
+            return self._prefix.read() + self._stream.read()
+        data = self._prefix.read(num)
+        if len(data) < num:
+            data += self._stream.read(num - len(data))
+        return data
+
+    def readline(self):
+        line = self._prefix.readline()
+        if line and not line.endswith('\n'):
+            line += self._stream.readline()
+        elif not line:
+            line = self._stream.readline()
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        self._stream.close()
+
+@receiver(graphs_updated)
+def _graphs_updated(sender, store, **kwargs):
+    invalidate(store.query_endpoint)
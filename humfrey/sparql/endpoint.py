@@ -1,4 +1,3 @@
-from collections import defaultdict
 import logging
 import sys
 import time
@@ -17,6 +16,8 @@ from humfrey import streaming
 from humfrey.utils.user_agents import USER_AGENTS
 from humfrey.utils.statsd import statsd
 
+from . import cache as results_cache, routing, singleflight
+
 def is_qname(uri):
     return len(uri.split(':')) == 2 and '/' not in uri.split(':')[1]
 
@@ -61,11 +62,21 @@ class Endpoint(object):
                               'text/turtle',
                               'text/n3',
                               'application/rdf+xml']
-    def __init__(self, url, update_url=None, namespaces={}, preferred_media_types=()):
+    def __init__(self, url, update_url=None, namespaces={}, preferred_media_types=(), admission_pool=None, replicas=()):
+        """
+        admission_pool is the name of the pool of concurrent queries to the
+        store that queries are made from; use 'batch' for background work.
+        See humfrey.sparql.admission.
+
+        replicas are further query endpoints serving the same data as url,
+        between which queries are routed; see humfrey.sparql.routing. They
+        aren't used for the 'batch' pool, which always queries url.
+        """
         self._url, self._update_url = url, update_url
+        self._admission_pool = admission_pool
+        self._replicas = tuple(replicas) if admission_pool != 'batch' else ()
         self._namespaces = NS.copy()
         self._namespaces.update(namespaces)
-        self._cache = defaultdict(dict)
 
         self._accept_header = self._get_accept_header(preferred_media_types or self._supported_media_types)
 
@@ -100,39 +111,65 @@ class Endpoint(object):
             query = ''.join(prefixes + q)
         return query
 
-    def query(self, query, common_prefixes=True, timeout=None, log_failure=True, preferred_media_types=None, defer=False):
+    def query(self, query, common_prefixes=True, timeout=None, log_failure=True, preferred_media_types=None, defer=False, cache_timeout=None):
         original_query = query
         query = self.normalize_query(query, common_prefixes)
 
-        request = urllib2.Request(self._url, urllib.urlencode({
+        body = urllib.urlencode({
             'query': query.encode('utf-8'),
-        }))
+        })
 
         if not defer:
             # Pick the quickest to parse, as it will never be passed through
             # verbatim.
             preferred_media_types = self._supported_media_types
+        headers = {'User-Agent': USER_AGENTS['agent']}
         if preferred_media_types:
-            request.add_header('Accept', self._get_accept_header(preferred_media_types))
+            headers['Accept'] = self._get_accept_header(preferred_media_types)
         else:
-            request.add_header('Accept', self._accept_header)
-        request.add_header('User-Agent', USER_AGENTS['agent'])
+            headers['Accept'] = self._accept_header
         if timeout:
-            request.add_header('Timeout', str(timeout))
+            headers['Timeout'] = str(timeout)
+
+        # Results are cached by their raw response, so can be cached whether
+        # or not they're going to be parsed.
+        if cache_timeout is None:
+            cache_timeout = results_cache.DEFAULT_TIMEOUT
+        generation = results_cache.get_generation(self._url)
+        cache_key = results_cache.get_cache_key(self._url, headers['Accept'], query, generation) if cache_timeout else None
+
+        # Replicas may not have caught up with a recent update
+        if self._replicas and results_cache.get_generation_age(generation) >= routing.UPDATE_LAG:
+            replicas = self._replicas
+        else:
+            replicas = ()
+
+        def fetch():
+            logging.debug("Querying %r", self._url)
+            # This holds its place in the admission queue until it's been read
+            response = routing.urlopen(self._url, body, headers, replicas, self._admission_pool)
+            if response.status >= 400:
+                error_content = response.read()
+                raise QueryError(error_content, response.status)
+            content_type = response.headers.get('Content-Type', 'application/rdf+xml')
+            if cache_key:
+                response = results_cache.put(cache_key, content_type, response, cache_timeout)
+            return content_type, response
 
         start_time = time.time()
 
         try:
-            logging.debug("Querying %r", self._url)
-            try:
-                response = urllib2.urlopen(request)
-            except urllib2.HTTPError as e:
-                error_content = e.read()
-                raise QueryError(error_content, e.code)
+            cached = results_cache.get(cache_key) if cache_key else None
+            if cached:
+                content_type, response = cached
+            else:
+                # Identical concurrent queries share a single response
+                flight_key = cache_key or singleflight.get_key(self._url, headers['Accept'], query, timeout, generation)
+                content_type, response = singleflight.call(flight_key, fetch)
 
             time_to_start = time.time() - start_time
 
-            content_type, params = response.headers.get('Content-Type', 'application/rdf+xml'), {}
+            params = {}
             if ';' in content_type:
                 content_type, params_ = content_type.split(';', 1)
                 for param in params_.split(';'):
@@ -0,0 +1,20 @@
+import httplib
+
+from django.http import HttpResponse
+
+from .admission import StoreBusy
+
+class StoreBusyMiddleware(object):
+    """
+    Returns 503 Service Unavailable when a store has too many queries waiting
+    for it, with a Retry-After header saying when to try again.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, StoreBusy):
+            return None
+        response = HttpResponse("The service is busy at the moment. Please try again shortly.\n",
+                                content_type='text/plain',
+                                status=httplib.SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(exception.retry_after)
+        return response
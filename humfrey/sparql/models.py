@@ -1,10 +1,22 @@
-from django.db import models
+import logging
+import time
+
+from django.db import models, DatabaseError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
 from django.contrib.auth.models import User, Group
 
 from .endpoint import Endpoint
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_STORE_SLUG = getattr(settings, 'DEFAULT_STORE_SLUG', 'public')
+# Seconds before looking for changes to a store's replicas made elsewhere
+REPLICA_REFRESH_INTERVAL = getattr(settings, 'SPARQL_REPLICA_REFRESH_INTERVAL', 60)
+
+# Store slugs to (time to look again, replica query endpoints)
+_replica_urls = {}
 
 class Store(models.Model):
     slug = models.SlugField(primary_key=True)
@@ -17,14 +29,55 @@ class Store(models.Model):
     def __unicode__(self):
         return self.name
 
+    def get_replica_urls(self):
+        """
+        Returns the query endpoints of the store's enabled replicas.
+
+        These are remembered for REPLICA_REFRESH_INTERVAL seconds, so that
+        queries don't each have to look them up.
+        """
+        now = time.time()
+        entry = _replica_urls.get(self.slug)
+        if entry is None or entry[0] < now:
+            try:
+                urls = tuple(self.replicas.filter(enabled=True)
+                                          .order_by('query_endpoint')
+                                          .values_list('query_endpoint', flat=True))
+            except DatabaseError, e:
+                logger.warning("Couldn't find replicas for store %r: %s", self.slug, e)
+                urls = ()
+            entry = _replica_urls[self.slug] = now + REPLICA_REFRESH_INTERVAL, urls
+        return entry[1]
+
     def query(self, *args, **kwargs):
-        return Endpoint(self.query_endpoint).query(*args, **kwargs)
+        return Endpoint(self.query_endpoint, replicas=self.get_replica_urls()).query(*args, **kwargs)
 
     class Meta:
         permissions = (('administer_store', 'can administer'),
                        ('query_store', 'can query'),
                        ('update_store', 'can update'))
 
+class StoreReplica(models.Model):
+    """
+    A further query endpoint serving the same data as a store.
+
+    Queries to the store are routed between its query endpoint and its
+    replicas; see humfrey.sparql.routing.
+    """
+    store = models.ForeignKey(Store, related_name='replicas')
+    query_endpoint = models.URLField()
+    enabled = models.BooleanField(default=True)
+
+    def __unicode__(self):
+        return self.query_endpoint
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+@receiver(post_save, sender=StoreReplica)
+@receiver(post_delete, sender=StoreReplica)
+def _replicas_changed(sender, **kwargs):
+    _replica_urls.clear()
+
 class UserPrivileges(models.Model):
     user = models.ForeignKey(User, null=True, blank=True)
     group = models.ForeignKey(Group, null=True, blank=True)
@@ -0,0 +1,253 @@
+"""
+Persistent HTTP connections to SPARQL endpoints.
+
+Connections are kept alive and shared between requests and threads, so that
+a page which runs several queries against a store only pays for connection
+setup once. There is one ConnectionPool per scheme, host and port; use
+get_pool() to find it.
+
+Admission control (humfrey.sparql.admission) normally bounds the number of
+connections in use, but a pool also refuses to open more than
+SPARQL_CONNECTION_POOL_MAX at once, whether in use or idle. Beyond that,
+requests wait up to SPARQL_CONNECTION_POOL_WAIT seconds for one to be handed
+back before giving up with PoolExhausted.
+"""
+
+import collections
+import httplib
+import logging
+import socket
+import threading
+import time
+import urlparse
+
+from django.conf import settings
+
+from humfrey.utils.statsd import statsd
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of idle connections to keep around for each host
+POOL_SIZE = getattr(settings, 'SPARQL_CONNECTION_POOL_SIZE', 8)
+# Idle connections older than this many seconds are closed rather than reused,
+# as the server has probably given up on them.
+IDLE_TIMEOUT = getattr(settings, 'SPARQL_CONNECTION_IDLE_TIMEOUT', 30)
+# Socket timeout in seconds, or None to wait forever.
+SOCKET_TIMEOUT = getattr(settings, 'SPARQL_CONNECTION_TIMEOUT', None)
+# The maximum number of connections, in use or idle, to each host, or None
+# for no limit.
+MAX_CONNECTIONS = getattr(settings, 'SPARQL_CONNECTION_POOL_MAX', 32)
+# How many seconds to wait for a connection once there are MAX_CONNECTIONS.
+WAIT_TIMEOUT = getattr(settings, 'SPARQL_CONNECTION_POOL_WAIT', 30)
+
+_REDIRECT_CODES = frozenset([httplib.MOVED_PERMANENTLY, httplib.FOUND,
+                             httplib.SEE_OTHER, httplib.TEMPORARY_REDIRECT])
+
+class PoolExhausted(httplib.HTTPException):
+    pass
+
+class PooledResponse(object):
+    """
+    A file-like wrapper around an httplib.HTTPResponse.
+
+    The underlying connection is handed back to its pool once the body has
+    been read to the end. If the response is closed before then the
+    connection is thrown away, as it would still have unread data on it.
+    """
+    _chunk_size = 8192
+
+    def __init__(self, pool, connection, response):
+        self._pool, self._connection, self._response = pool, connection, response
+        self._buffer = ''
+        self.status = self.code = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+
+    def _check_done(self):
+        if self._connection and self._response.isclosed():
+            if self._response.will_close:
+                self._pool.discard(self._connection)
+            else:
+                self._pool.release(self._connection)
+            self._connection = None
+
+    def read(self, amt=None):
+        if amt is None or amt < 0:
+            data, self._buffer = self._buffer + self._response.read(), ''
+        elif len(self._buffer) >= amt:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        else:
+            data = self._buffer + self._response.read(amt - len(self._buffer))
+            self._buffer = ''
+        self._check_done()
+        return data
+
+    def readline(self):
+        while '\n' not in self._buffer:
+            chunk = self._response.read(self._chunk_size)
+            if not chunk:
+                break
+            self._buffer += chunk
+        self._check_done()
+        if '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            return line + '\n'
+        line, self._buffer = self._buffer, ''
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def isclosed(self):
+        """
+        Returns whether the body has been read to the end, or closed.
+        """
+        return self._response.isclosed() and not self._buffer
+
+    def close(self):
+        if self._connection:
+            self._pool.discard(self._connection)
+            self._connection = None
+        self._response.close()
+
+    def __del__(self):
+        # Don't hold on to a place in the pool if we've been abandoned.
+        if self._connection:
+            self._pool.discard(self._connection)
+            self._connection = None
+
+class ConnectionPool(object):
+    """
+    A pool of keep-alive connections to a single HTTP server.
+
+    At most `size` idle connections are retained. Connections are checked out
+    for the duration of a request and its response body, and at most
+    `max_connections` are open at once, counting idle ones; once there are
+    that many, requests wait up to `wait_timeout` seconds for one to come
+    free.
+    """
+
+    def __init__(self, scheme, host, port, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT, timeout=SOCKET_TIMEOUT,
+                 max_connections=MAX_CONNECTIONS, wait_timeout=WAIT_TIMEOUT):
+        self.scheme, self.host, self.port = scheme, host, port
+        self.size, self.idle_timeout, self.timeout = size, idle_timeout, timeout
+        self.max_connections, self.wait_timeout = max_connections, wait_timeout
+        self.connection_class = httplib.HTTPSConnection if scheme == 'https' else httplib.HTTPConnection
+        self._idle = collections.deque()
+        # Connections opened and not yet closed, whether in use or idle
+        self._open = 0
+        self._lock = threading.Condition()
+
+    def __repr__(self):
+        return '<ConnectionPool %s://%s:%d>' % (self.scheme, self.host, self.port)
+
+    def _get_connection(self):
+        deadline = None
+        with self._lock:
+            while True:
+                now = time.time()
+                while self._idle:
+                    # Most recently used first, as it's the least likely to
+                    # have been dropped by the server.
+                    connection, last_used = self._idle.pop()
+                    if now - last_used < self.idle_timeout:
+                        statsd.incr('humfrey.sparql-pool.hit')
+                        return connection, True
+                    connection.close()
+                    self._open -= 1
+                if self.max_connections is None or self._open < self.max_connections:
+                    self._open += 1
+                    break
+                if deadline is None:
+                    statsd.incr('humfrey.sparql-pool.wait')
+                    deadline = now + self.wait_timeout
+                elif now >= deadline:
+                    raise PoolExhausted("Timed out waiting for a connection to %s:%d" % (self.host, self.port))
+                self._lock.wait(deadline - now)
+        statsd.incr('humfrey.sparql-pool.miss')
+        return self.connection_class(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.time()))
+                statsd.gauge('humfrey.sparql-pool.idle', len(self._idle))
+                self._lock.notify()
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        connection.close()
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    def clear(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop()[0].close()
+                self._open -= 1
+            self._lock.notify_all()
+
+    def request(self, method, path, body=None, headers={}):
+        """
+        Performs an HTTP request, returning a PooledResponse.
+
+        If a reused connection turns out to have been closed by the server we
+        try again with a fresh one.
+        """
+        while True:
+            connection, reused = self._get_connection()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+            except (httplib.HTTPException, socket.error):
+                self.discard(connection)
+                if reused:
+                    logger.debug("Stale connection to %r; retrying", self)
+                    continue
+                raise
+            return PooledResponse(self, connection, response)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(url):
+    """
+    Returns the shared ConnectionPool for the server hosting url.
+    """
+    url = urlparse.urlparse(url)
+    port = url.port or (443 if url.scheme == 'https' else 80)
+    key = url.scheme, url.hostname, port
+    try:
+        return _pools[key]
+    except KeyError:
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(url.scheme, url.hostname, port)
+            return _pools[key]
+
+def urlopen(url, body=None, headers={}, max_redirects=5):
+    """
+    Like urllib2.urlopen, but using pooled connections.
+
+    Makes a POST request if a body is given. HTTP error responses are
+    returned rather than raised; check the status attribute.
+    """
+    method = 'GET' if body is None else 'POST'
+    for i in range(max_redirects + 1):
+        parsed = urlparse.urlparse(url)
+        path = urlparse.urlunparse(('', '', parsed.path or '/', parsed.params, parsed.query, ''))
+        request_headers = dict(headers)
+        if body is not None:
+            request_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        response = get_pool(url).request(method, path, body, request_headers)
+        location = response.headers.get('Location')
+        if response.status not in _REDIRECT_CODES or not location:
+            return response
+        response.read()
+        url = urlparse.urljoin(url, location)
+        # As urllib2, we follow redirects for POSTs by switching to GET.
+        if response.status != httplib.TEMPORARY_REDIRECT:
+            method, body = 'GET', None
+    raise httplib.HTTPException("Too many redirects")
@@ -0,0 +1,185 @@
+"""
+Redis bookkeeping for ProtectedQueryView's rate-limiting.
+
+Admitting a query (pruning dead queries, calculating the user's intensity and
+recording the new query), recording that it has started, and releasing it
+(forgetting it and adding its duration to the user's intensity) are each done
+by a Lua script, so each takes a single round trip and needs no optimistic
+locking.
+
+Each running query is a redis hash, which must be kept alive by updating its
+heartbeat. Rather than each query having a thread to do this, a single
+thread per process beats for all of them at once.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+import redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: user queries set, intensity updated, intensity value, new query
+# ARGV: now, minimum query intensity, decay, deny threshold, query key
+#       prefix, query ID, then field/value pairs for the new query
+_ADMIT = """
+local now, minimum = tonumber(ARGV[1]), tonumber(ARGV[2])
+local decay, deny = tonumber(ARGV[3]), tonumber(ARGV[4])
+local intensity = 0
+for _, id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    local key = ARGV[5] .. id
+    local query = redis.call('HMGET', key, 'heartbeat', 'started')
+    if not query[1] or tonumber(query[1]) < now then
+        redis.call('SREM', KEYS[1], id)
+        redis.call('DEL', key)
+    elseif query[2] then
+        intensity = intensity + math.max(minimum, now - tonumber(query[2]))
+    else
+        intensity = intensity + minimum
+    end
+end
+local updated = tonumber(redis.call('GET', KEYS[2]) or now)
+local value = tonumber(redis.call('GET', KEYS[3]) or 0)
+intensity = math.max(0, value + intensity - (now - updated) * decay)
+if intensity > deny then
+    return {0, tostring(intensity)}
+end
+redis.call('HMSET', KEYS[4], unpack(ARGV, 7))
+redis.call('SADD', KEYS[1], ARGV[6])
+return {1, tostring(intensity)}
+"""
+
+# KEYS: query
+# ARGV: field/value pairs
+_UPDATE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HMSET', KEYS[1], unpack(ARGV))
+end
+"""
+
+# KEYS: user queries set, query, intensity updated, intensity value
+# ARGV: now, query duration, decay, query ID
+_RELEASE = """
+redis.call('SREM', KEYS[1], ARGV[4])
+redis.call('DEL', KEYS[2])
+local now = tonumber(ARGV[1])
+local updated = tonumber(redis.call('GET', KEYS[3]) or now)
+local value = tonumber(redis.call('GET', KEYS[4]) or 0)
+value = math.max(0, value - (now - updated) * tonumber(ARGV[3]))
+value = value + math.min(0.2, tonumber(ARGV[2]))
+redis.call('SET', KEYS[3], ARGV[1])
+redis.call('SET', KEYS[4], tostring(value))
+return tostring(value)
+"""
+
+class _Script(redis.client.Script):
+    """
+    A Lua script that isn't tied to a client, so can be created once, and
+    run with any client or pipeline.
+    """
+    def __init__(self, script):
+        self.registered_client, self.script = None, script
+        self.sha = hashlib.sha1(script).hexdigest()
+
+_admit, _update, _release = _Script(_ADMIT), _Script(_UPDATE), _Script(_RELEASE)
+
+def _flatten(data):
+    return [item for pair in sorted(data.iteritems()) for item in pair]
+
+def admit(client, keys, query_key_prefix, query_id, data, minimum_query_intensity, decay, deny_threshold):
+    """
+    Records a new query unless the user's intensity is above deny_threshold.
+
+    keys is a tuple of the user's queries set, intensity updated and
+    intensity value keys, and the new query's key. Returns an
+    (admitted, intensity) pair.
+    """
+    admitted, intensity = _admit(
+        keys=keys,
+        args=[repr(time.time()), minimum_query_intensity, decay, deny_threshold,
+              query_key_prefix, query_id] + _flatten(data),
+        client=client)
+    return bool(admitted), float(intensity)
+
+def update(client, query_key, data):
+    """
+    Updates fields of a query, if it hasn't expired.
+    """
+    _update(keys=[query_key], args=_flatten(data), client=client)
+
+def release(client, keys, query_id, duration, decay):
+    """
+    Forgets a query and adds its duration to the user's intensity, which is
+    returned.
+
+    keys is a tuple of the user's queries set, query, intensity updated and
+    intensity value keys.
+    """
+    return float(_release(
+        keys=keys,
+        args=[repr(time.time()), repr(duration), decay, query_id],
+        client=client))
+
+class Heartbeat(object):
+    """
+    Keeps running queries alive from a single thread.
+
+    Each query's heartbeat is set to twice its frequency in the future, every
+    frequency seconds (or more often, if other queries have shorter
+    frequencies).
+    """
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = self._thread = None
+        self._interval = None
+
+    def get_redis_client(self):
+        return redis.client.Redis(**settings.REDIS_PARAMS)
+
+    def add(self, query_key, frequency):
+        with self._lock:
+            self._queries[query_key] = frequency
+            # Threads don't survive forking, so start one for this process
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='humfrey-sparql-heartbeat')
+                self._thread.daemon = True
+                self._thread.start()
+            # This query needs beating more often than the others
+            if self._interval is not None and frequency < self._interval:
+                self._wake.set()
+
+    def remove(self, query_key):
+        with self._lock:
+            self._queries.pop(query_key, None)
+
+    def beat(self, client):
+        with self._lock:
+            queries = self._queries.items()
+        if not queries:
+            return
+        now = time.time()
+        pipeline = client.pipeline(transaction=False)
+        for query_key, frequency in queries:
+            update(pipeline, query_key, {'heartbeat': repr(now + frequency * 2)})
+        pipeline.execute()
+
+    def _run(self):
+        client = self.get_redis_client()
+        while True:
+            with self._lock:
+                self._interval = min(self._queries.values() or [60])
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                self.beat(client)
+            except redis.RedisError:
+                logger.exception("Couldn't update query heartbeats")
+
+heartbeat = Heartbeat()
@@ -1,36 +1,86 @@
-import types
+import operator
 import weakref
 
 import rdflib
 
-class SparqlResultBinding(dict):
-    def __init__(self, bindings):
-        if isinstance(bindings, (list, tuple, types.GeneratorType)):
-            bindings = dict(zip(self._fields, bindings))
-        for field in self._fields:
-            if field not in bindings:
-                bindings[field] = None
-        super(SparqlResultBinding, self).__init__(bindings)
-    def __iter__(self):
-        return (self[field] for field in self._fields)
-    def __getattr__(self, name):
-        return self[name]
+class SparqlResultBinding(tuple):
+    """
+    A single result from a SPARQL resultset.
+
+    Values are held in a tuple in field order, with None for unbound fields.
+    They can be retrieved by attribute (result.name), by key
+    (result['name']) or by position. Subclasses for each set of fields are
+    created by Result(); the field names are held on the class, not the
+    instance.
+    """
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __new__(cls, bindings):
+        if isinstance(bindings, dict):
+            if not bindings.viewkeys() <= cls._index.viewkeys():
+                # Some fields were bound that weren't declared; keep them.
+                extra = sorted(key for key in bindings if key not in cls._index)
+                return Result(cls._fields + tuple(extra), bindings)
+            return tuple.__new__(cls, map(bindings.get, cls._fields))
+        values = tuple(bindings)
+        if len(values) != len(cls._fields):
+            values = (values + (None,) * len(cls._fields))[:len(cls._fields)]
+        return tuple.__new__(cls, values)
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, default=None):
+        try:
+            return tuple.__getitem__(self, self._index[key])
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._fields)
+    def values(self):
+        return list(self)
+    def items(self):
+        return zip(self._fields, self)
+    def iterkeys(self):
+        return iter(self._fields)
+    def itervalues(self):
+        return iter(self)
+    def iteritems(self):
+        return iter(zip(self._fields, self))
+
     @property
     def fields(self):
         return self._fields
     def __reduce__(self):
-        return (Result, (self._fields, self._asdict()))
+        return (Result, (self._fields, tuple(self)))
     def _asdict(self):
-        return dict(self)
+        return dict(zip(self._fields, self))
+    def __repr__(self):
+        return 'Result(%s)' % ', '.join('%s=%r' % item for item in zip(self._fields, self))
+
+# Fields with these names are only available as result['name'].
+_reserved_names = frozenset(SparqlResultBinding.__dict__)
 
 def Result(fields, bindings=None):
     fields = tuple(fields)
-    if fields in Result._memo:
+    try:
         cls = Result._memo[fields]
-    else:
-        class cls(SparqlResultBinding):
-            _fields = fields
-        Result._memo[fields] = cls
+    except KeyError:
+        namespace = {'__slots__': (),
+                     '_fields': fields,
+                     '_index': dict((field, i) for i, field in enumerate(fields))}
+        for i, field in enumerate(fields):
+            if field not in _reserved_names:
+                namespace[field] = property(operator.itemgetter(i))
+        cls = Result._memo[fields] = type('Result', (SparqlResultBinding,), namespace)
     if bindings is not None:
         return cls(bindings)
     else:
@@ -0,0 +1,183 @@
+"""
+Routing of queries between a store's read replicas.
+
+A Store may have StoreReplicas, which are further query endpoints serving the
+same data, and which it passes to the Endpoints it creates. Queries are sent
+to whichever of the store's query endpoint and its replicas looks best,
+judging by an exponentially-weighted moving average (EWMA) of how long each
+takes to start responding, and by how many queries each already has in
+progress.
+
+If a replica can't be connected to, or says it's unavailable, the query is
+tried on the next best. A replica that fails several times in a row has its
+circuit broken: it isn't sent any queries for a while, after which a single
+query is let through to see whether it has recovered.
+
+Queries are admitted to the chosen endpoint's AdmissionQueue; see
+humfrey.sparql.admission.
+
+Updates and the graph store protocol always use the store's primary
+endpoints; only queries are routed. Queries from the 'batch' admission pool,
+and those made within UPDATE_LAG seconds of the graphs_updated signal, also
+go to the primary, as replicas may not yet have caught up with the latest
+data.
+"""
+
+import httplib
+import logging
+import random
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+from humfrey.utils.statsd import statsd
+
+from . import admission, pool
+
+logger = logging.getLogger(__name__)
+
+# Weighting of the latest latency in the moving average
+EWMA_WEIGHT = getattr(settings, 'SPARQL_REPLICA_EWMA_WEIGHT', 0.2)
+# Consecutive failures after which a replica's circuit is broken
+FAILURE_THRESHOLD = getattr(settings, 'SPARQL_REPLICA_FAILURE_THRESHOLD', 3)
+# Seconds to leave a broken circuit before trying it again
+RECOVERY_TIME = getattr(settings, 'SPARQL_REPLICA_RECOVERY_TIME', 30)
+# Seconds after an update during which queries only go to the primary
+UPDATE_LAG = getattr(settings, 'SPARQL_REPLICA_UPDATE_LAG', 10)
+
+# Statuses that mean a replica couldn't answer, rather than that there was
+# something wrong with the query
+_UNAVAILABLE_STATUSES = frozenset([httplib.BAD_GATEWAY,
+                                   httplib.SERVICE_UNAVAILABLE,
+                                   httplib.GATEWAY_TIMEOUT])
+
+class Replica(object):
+    def __init__(self, url):
+        self.url = url
+        # None until we've heard from it, so that new replicas get tried
+        self.latency = None
+        self.in_progress = 0
+        self.failures = 0
+        self.broken_until = None
+        self.probing = False
+
+    def is_available(self, now):
+        if self.broken_until is None:
+            return True
+        # Half-open; let a single query through to see if it's recovered
+        return now >= self.broken_until and not self.probing
+
+    def get_score(self):
+        return (self.latency or 0) * (self.in_progress + 1)
+
+    def succeeded(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += EWMA_WEIGHT * (latency - self.latency)
+        if self.broken_until is not None:
+            logger.info("Replica %r has recovered", self.url)
+        self.failures, self.broken_until = 0, None
+
+    def failed(self):
+        self.failures += 1
+        if self.broken_until is not None or self.failures >= FAILURE_THRESHOLD:
+            logger.warning("Not using replica %r for %d seconds after %d failures",
+                           self.url, RECOVERY_TIME, self.failures)
+            statsd.incr('humfrey.sparql-replica.circuit-broken')
+            self.broken_until = time.time() + RECOVERY_TIME
+
+class Router(object):
+    """
+    Chooses between the replicas for a query endpoint.
+    """
+    # Replicas may be shared between routers, so they share a lock
+    _lock = threading.Lock()
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+
+    def get_candidates(self):
+        """
+        Returns replicas in the order they should be tried.
+
+        If every replica's circuit is broken, returns them all anyway, as
+        there's nothing to lose.
+        """
+        now = time.time()
+        with self._lock:
+            replicas = list(self.replicas)
+            # Break ties randomly, so that load is spread between equals
+            random.shuffle(replicas)
+            available = [r for r in replicas if r.is_available(now)]
+            return sorted(available or replicas, key=Replica.get_score)
+
+    def urlopen(self, body, headers, admission_pool=None):
+        error = None
+        candidates = self.get_candidates()
+        for i, replica in enumerate(candidates):
+            with self._lock:
+                replica.in_progress += 1
+                probing = replica.broken_until is not None
+                replica.probing = replica.probing or probing
+            start = time.time()
+            try:
+                response = admission.get_queue(replica.url, admission_pool).open(pool.urlopen, replica.url,
+                                                                                  body, headers)
+            except (socket.error, httplib.HTTPException), e:
+                logger.warning("Couldn't query replica %r", replica.url, exc_info=1)
+                response, error = None, e
+            finally:
+                with self._lock:
+                    replica.in_progress -= 1
+                    if probing:
+                        replica.probing = False
+
+            with self._lock:
+                if response is None or response.status in _UNAVAILABLE_STATUSES:
+                    replica.failed()
+                else:
+                    replica.succeeded(time.time() - start)
+            if response is None:
+                statsd.incr('humfrey.sparql-replica.failover')
+                continue
+            elif response.status in _UNAVAILABLE_STATUSES and i < len(candidates) - 1:
+                # Give the next one a go
+                statsd.incr('humfrey.sparql-replica.failover')
+                response.read()
+                continue
+            return response
+        raise error
+
+_routers = {}
+_replicas = {}
+_routers_lock = threading.Lock()
+
+def get_router(url, replica_urls):
+    """
+    Returns the Router for a query endpoint and its replicas, or None if it
+    has none.
+    """
+    key = url, tuple(replica_urls)
+    router = _routers.get(key)
+    if router is None and key not in _routers:
+        urls = [url] + [u for u in replica_urls if u != url]
+        with _routers_lock:
+            # Replicas keep their history between routers
+            replicas = [_replicas.setdefault(u, Replica(u)) for u in urls]
+            router = _routers[key] = Router(replicas) if len(replicas) > 1 else None
+    return router
+
+def urlopen(url, body=None, headers={}, replica_urls=(), admission_pool=None):
+    """
+    Like pool.urlopen, but sends the request to the best of url and its
+    replicas, once admitted to its queue in admission_pool.
+
+    Returns an AdmittedResponse.
+    """
+    router = get_router(url, replica_urls) if replica_urls else None
+    if router is None:
+        return admission.get_queue(url, admission_pool).open(pool.urlopen, url, body, headers)
+    return router.urlopen(body, headers, admission_pool)
@@ -0,0 +1,280 @@
+"""
+Coalescing of identical concurrent SPARQL queries.
+
+When many clients ask for the same page at once (e.g. just after its cached
+results expire, or just after an update), each would otherwise send the same
+query to the store. Instead, the first caller for a query becomes its
+"leader" and the rest wait for it, then share its response.
+
+The leader gets its response back as soon as the store starts sending it. If
+anyone is waiting by the time the leader starts reading, a copy is kept as it
+reads, which waiters get once it has read to the end. Otherwise the query is
+no longer available to join, and nothing is copied. Responses larger than
+MAX_SIZE can't be shared, so if the copy grows beyond that it's dropped, and
+the waiters queue for another query, one of them becoming its leader.
+
+Within a process, waiters block on the leader's thread. Between processes, a
+leader takes out a lease in redis, and others register themselves as waiting
+and poll for the response it publishes there when it's done. If there's no
+response to share (the leader failed, the response was too large, or the
+lease expired), one of the waiting processes takes out a new lease and
+queries the store itself.
+
+Shared responses are raw bodies, so each caller parses its own copy.
+"""
+
+import logging
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from django.conf import settings
+import redis
+
+from humfrey.utils.statsd import statsd
+
+from . import cache as results_cache
+
+logger = logging.getLogger(__name__)
+
+# Set SPARQL_SINGLE_FLIGHT to False to disable coalescing altogether.
+ENABLED = getattr(settings, 'SPARQL_SINGLE_FLIGHT', True)
+# Whether to coalesce between processes as well, using redis
+DISTRIBUTED = getattr(settings, 'SPARQL_SINGLE_FLIGHT_REDIS', False) and bool(getattr(settings, 'REDIS_PARAMS', None))
+# Responses larger than this many bytes aren't shared
+MAX_SIZE = getattr(settings, 'SPARQL_SINGLE_FLIGHT_MAX_SIZE', results_cache.MAX_SIZE)
+# How long a leader may take before we give up waiting
+LEASE_TIME = getattr(settings, 'SPARQL_SINGLE_FLIGHT_LEASE_TIME', 30)
+# How long published responses are kept for waiters to pick up
+RESULT_TIME = 10
+# Seconds between checks for a response from another process
+POLL_INTERVAL = 0.05
+
+_lease_key = 'humfrey:sparql:flight-lease:{0}'
+_result_key = 'humfrey:sparql:flight-result:{0}'
+_waiters_key = 'humfrey:sparql:flight-waiters:{0}'
+
+class _Flight(object):
+    """
+    An in-progress query, for which other threads can wait.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result, self.exc_info = None, None
+        self.client, self.lease = None, None
+
+    def has_waiters(self):
+        if self.waiters:
+            return True
+        if self.lease:
+            try:
+                return bool(int(self.client.get(_waiters_key.format(self.key)) or 0))
+            except redis.RedisError:
+                logger.warning("Couldn't find out whether other processes are waiting for a query", exc_info=1)
+        return False
+
+    def finish(self, result=None):
+        """
+        Stops others joining this flight, and hands result (a (content_type,
+        body) pair, or None if there isn't one to share) to its waiters.
+        """
+        if self.done.is_set():
+            return
+        with _flights_lock:
+            if _flights.get(self.key) is self:
+                del _flights[self.key]
+        if self.lease:
+            try:
+                _release_lease(self.client, self.key, self.lease, result)
+            except redis.RedisError:
+                logger.warning("Couldn't publish query response to other processes", exc_info=1)
+        self.result = result
+        self.done.set()
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+_redis_client = None
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.client.Redis(**settings.REDIS_PARAMS)
+    return _redis_client
+
+def get_key(url, accept, query, timeout=None, generation=None):
+    # Include the generation, so queries made after an update don't wait on
+    # ones made before it.
+    if generation is None:
+        generation = results_cache.get_generation(url)
+    return results_cache._hash(url, generation, accept, timeout, query)
+
+def call(key, fetch):
+    """
+    Returns fetch()'s (content_type, stream) pair, sharing it with any
+    concurrent calls with the same key.
+
+    Only the caller that ended up calling fetch() may receive an unshared
+    stream; all others get a stream over a shared copy of the response.
+    """
+    if not ENABLED:
+        return fetch()
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight(key)
+        else:
+            flight.waiters += 1
+
+    if not leader:
+        statsd.incr('humfrey.sparql-flight.wait')
+        if not flight.done.wait(LEASE_TIME):
+            statsd.incr('humfrey.sparql-flight.timeout')
+            return fetch()
+        if flight.exc_info:
+            raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+        elif flight.result is None:
+            # Nothing to share, so queue for the next flight
+            return call(key, fetch)
+        content_type, body = flight.result
+        return content_type, StringIO(body)
+
+    try:
+        return _lead(flight, fetch)
+    except Exception:
+        flight.exc_info = sys.exc_info()
+        flight.finish()
+        raise
+
+def _lead(flight, fetch):
+    """
+    Calls fetch(), or waits for another process to do so.
+
+    Returns a (content_type, stream) pair. The flight is finished once the
+    stream has been read, or straight away if the response came from another
+    process.
+    """
+    if DISTRIBUTED:
+        try:
+            client = get_redis_client()
+            while True:
+                lease = _acquire_lease(client, flight.key)
+                if lease:
+                    flight.client, flight.lease = client, lease
+                    break
+                shared = _wait_for_result(client, flight.key)
+                if shared:
+                    flight.finish(shared)
+                    return shared[0], StringIO(shared[1])
+                statsd.incr('humfrey.sparql-flight.abandoned')
+        except redis.RedisError:
+            logger.warning("Couldn't coordinate query with other processes", exc_info=1)
+
+    content_type, stream = fetch()
+    return content_type, _TeeStream(flight, content_type, stream)
+
+class _TeeStream(object):
+    """
+    A file-like object that reads from a response, keeping a copy for the
+    flight's waiters if there are any.
+    """
+    def __init__(self, flight, content_type, stream):
+        self._flight, self._content_type, self._stream = flight, content_type, stream
+        self._copy, self._size = [], 0
+
+    def _finish(self, result):
+        self._flight.finish(result)
+        self._flight = self._copy = None
+
+    def _tee(self, data):
+        if self._flight is None:
+            pass
+        elif not data:
+            self._finish((self._content_type, ''.join(self._copy)))
+        elif not (self._copy or self._flight.has_waiters()):
+            # No-one to share with
+            self._finish(None)
+        else:
+            self._copy.append(data)
+            self._size += len(data)
+            if self._size > MAX_SIZE:
+                statsd.incr('humfrey.sparql-flight.too-large')
+                self._finish(None)
+        return data
+
+    def read(self, num=None):
+        if num is None or num < 0:
+            data = self._tee(self._stream.read())
+            self._tee('')
+            return data
+        return self._tee(self._stream.read(num))
+
+    def readline(self):
+        return self._tee(self._stream.readline())
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        if self._flight is not None:
+            self._finish(None)
+        self._stream.close()
+
+    def __del__(self):
+        # If we're discarded without being read to the end, don't leave
+        # anyone waiting.
+        if self._flight is not None:
+            self._finish(None)
+
+def _acquire_lease(client, key):
+    """
+    Returns a token for a new lease on key, or None if another process holds
+    one.
+    """
+    token = uuid.uuid4().hex
+    if client.set(_lease_key.format(key), token, px=int(LEASE_TIME * 1000), nx=True):
+        return token
+
+def _release_lease(client, key, token, shared):
+    pipeline = client.pipeline()
+    if shared:
+        content_type, body = shared
+        pipeline.setex(_result_key.format(key), '%s\n%s' % (content_type, body), RESULT_TIME)
+    pipeline.delete(_waiters_key.format(key))
+    pipeline.get(_lease_key.format(key))
+    if pipeline.execute()[-1] == token:
+        client.delete(_lease_key.format(key))
+
+def _wait_for_result(client, key):
+    """
+    Waits for another process to publish a response, returning it as a
+    (content_type, body) pair, or None if it doesn't.
+    """
+    statsd.incr('humfrey.sparql-flight.remote-wait')
+    # Let the leader know to keep a copy of its response
+    pipeline = client.pipeline()
+    pipeline.incr(_waiters_key.format(key))
+    pipeline.expire(_waiters_key.format(key), LEASE_TIME)
+    pipeline.execute()
+    deadline = time.time() + LEASE_TIME
+    while time.time() < deadline:
+        pipeline = client.pipeline()
+        pipeline.get(_result_key.format(key))
+        pipeline.exists(_lease_key.format(key))
+        result, leased = pipeline.execute()
+        if result is not None:
+            content_type, body = result.split('\n', 1)
+            return content_type, body
+        elif not leased:
+            return None
+        time.sleep(POLL_INTERVAL)
+    return None
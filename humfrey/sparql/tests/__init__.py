@@ -0,0 +1,9 @@
+from .pool import *
+from .cache import *
+from .batch import *
+from .typecache import *
+from .results import *
+from .singleflight import *
+from .admission import *
+from .ratelimit import *
+from .routing import *
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+from django.test.client import RequestFactory
+
+from humfrey.sparql import admission, routing
+from humfrey.sparql.endpoint import Endpoint
+from humfrey.sparql.middleware import StoreBusyMiddleware
+
+from .server import SparqlServer
+
+class AdmissionQueueTestCase(unittest.TestCase):
+    def testConcurrencyLimited(self):
+        queue = admission.AdmissionQueue('http://example.org/', 'test', concurrency=2)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+        def run():
+            with queue.admit():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.05)
+                with lock:
+                    active[0] -= 1
+        threads = [threading.Thread(target=run) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual((queue.active, queue.waiting), (0, 0))
+
+    def testQueueFull(self):
+        queue = admission.AdmissionQueue('http://example.org/', 'test', concurrency=1, queue=0)
+        with queue.admit():
+            with self.assertRaises(admission.StoreBusy) as cm:
+                queue.acquire()
+            self.assertTrue(cm.exception.retry_after >= 1)
+        with queue.admit():
+            pass
+
+    def testTimeout(self):
+        queue = admission.AdmissionQueue('http://example.org/', 'test', concurrency=1, timeout=0.1)
+        with queue.admit():
+            start = time.time()
+            self.assertRaises(admission.StoreBusy, queue.acquire)
+            self.assertTrue(time.time() - start >= 0.1)
+        self.assertEqual((queue.active, queue.waiting), (0, 0))
+
+    def testPoolsSeparate(self):
+        url = 'http://example.org/pools'
+        self.assertIsNot(admission.get_queue(url), admission.get_queue(url, 'batch'))
+        self.assertIs(admission.get_queue(url), admission.get_queue(url, 'interactive'))
+
+    def testEndpointAdmitted(self):
+        with SparqlServer() as server:
+            queue = admission.get_queue(server.url, 'batch')
+            queue.concurrency, queue.queue = 1, 0
+            endpoint = Endpoint(server.url, admission_pool='batch')
+            with queue.admit():
+                self.assertRaises(admission.StoreBusy, endpoint.query, 'SELECT * WHERE { ?s ?p ?o }',
+                                  cache_timeout=0, log_failure=False)
+            endpoint.query('SELECT * WHERE { ?s ?p ?o }', cache_timeout=0)
+            self.assertEqual(server.queries, 1)
+
+    def testHeldUntilRead(self):
+        with SparqlServer() as server:
+            queue = admission.get_queue(server.url, 'batch')
+            endpoint = Endpoint(server.url, admission_pool='batch')
+            results = endpoint.query('SELECT * WHERE { ?s ?p ?o }', cache_timeout=0, defer=True)
+            self.assertEqual(queue.active, 1)
+            self.assertEqual(results.read(), server.response_body)
+            self.assertEqual(queue.active, 0)
+
+    def testReleasedOnClose(self):
+        with SparqlServer() as server:
+            queue = admission.get_queue(server.url, 'batch')
+            response = routing.urlopen(server.url, 'query=ASK+{}', admission_pool='batch')
+            self.assertEqual(queue.active, 1)
+            response.close()
+            self.assertEqual(queue.active, 0)
+
+class StoreBusyMiddlewareTestCase(unittest.TestCase):
+    def testServiceUnavailable(self):
+        request = RequestFactory().get('/')
+        response = StoreBusyMiddleware().process_exception(request, admission.StoreBusy('http://example.org/', 'interactive', 7))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def testOtherExceptions(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(StoreBusyMiddleware().process_exception(request, ValueError()), None)
@@ -0,0 +1,39 @@
+import time
+import unittest
+
+import rdflib
+
+from humfrey.sparql.batch import query_triples
+from humfrey.sparql.endpoint import Endpoint, QueryError
+
+from .server import SparqlServer
+
+class BatchQueryTestCase(unittest.TestCase):
+    queries = ['DESCRIBE <http://example.org/id/%d>' % i for i in range(3)]
+
+    def get_server(self):
+        server = SparqlServer()
+        server.response_content_type = 'text/plain'
+        server.response_body = ''.join('<http://example.org/id/foo> <http://example.org/vocab/p> "%d" .\n' % i
+                                       for i in range(1000))
+        return server
+
+    def testAllTriples(self):
+        with self.get_server() as server:
+            triples = list(query_triples(Endpoint(server.url), self.queries))
+            self.assertEqual(server.queries, 3)
+            self.assertEqual(len(triples), 3000)
+            self.assertIsInstance(triples[0][2], rdflib.Literal)
+
+    def testConcurrent(self):
+        with self.get_server() as server:
+            server.response_delay = 0.2
+            start = time.time()
+            list(query_triples(Endpoint(server.url), self.queries, max_workers=3))
+            self.assertLess(time.time() - start, 0.5)
+
+    def testError(self):
+        with self.get_server() as server:
+            server.response_status = 500
+            with self.assertRaises(QueryError):
+                list(query_triples(Endpoint(server.url), self.queries))
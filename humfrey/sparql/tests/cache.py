@@ -0,0 +1,59 @@
+import mock
+import unittest
+
+from humfrey.signals import graphs_updated
+from humfrey.sparql import cache as results_cache
+from humfrey.sparql.endpoint import Endpoint
+
+from .server import SparqlServer
+
+class ResultCacheTestCase(unittest.TestCase):
+    query = 'SELECT ?s WHERE { ?s ?p ?o }'
+
+    def testCached(self):
+        with SparqlServer() as server:
+            endpoint = Endpoint(server.url)
+            results = [endpoint.query(self.query, cache_timeout=60) for i in range(3)]
+            self.assertEqual(server.queries, 1)
+            self.assertEqual(results[0], results[2])
+
+    def testDisabled(self):
+        with SparqlServer() as server:
+            endpoint = Endpoint(server.url)
+            for i in range(2):
+                endpoint.query(self.query, cache_timeout=0)
+            self.assertEqual(server.queries, 2)
+
+    def testDeferredPassThrough(self):
+        with SparqlServer() as server:
+            endpoint = Endpoint(server.url)
+            for i in range(2):
+                result = endpoint.query(self.query, cache_timeout=60, defer=True)
+                self.assertEqual(result.read(), server.response_body)
+            self.assertEqual(server.queries, 1)
+
+    def testInvalidatedByGraphsUpdated(self):
+        with SparqlServer() as server:
+            endpoint = Endpoint(server.url)
+            endpoint.query(self.query, cache_timeout=60)
+            store = mock.Mock(query_endpoint=server.url)
+            graphs_updated.send(None, store=store, graphs=frozenset(), when=None)
+            endpoint.query(self.query, cache_timeout=60)
+            self.assertEqual(server.queries, 2)
+
+    @mock.patch('humfrey.sparql.cache.MAX_SIZE', 100)
+    def testLargeResponsesNotCached(self):
+        with SparqlServer() as server:
+            endpoint = Endpoint(server.url)
+            for i in range(2):
+                results = endpoint.query(self.query, cache_timeout=60)
+                self.assertEqual(len(results), 1)
+            self.assertEqual(server.queries, 2)
+
+    def testGenerationsKept(self):
+        with mock.patch('humfrey.sparql.cache.cache') as cache:
+            cache.get.return_value = None
+            results_cache.get_generation('http://example.org/sparql')
+            self.assertEqual(cache.add.call_args[0][2], results_cache.GENERATION_TIMEOUT)
+            results_cache.invalidate('http://example.org/sparql')
+            self.assertEqual(cache.set.call_args[0][2], results_cache.GENERATION_TIMEOUT)
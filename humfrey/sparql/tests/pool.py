@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+import rdflib
+
+from humfrey.sparql import pool
+from humfrey.sparql.endpoint import Endpoint, QueryError
+
+from .server import SparqlServer
+
+TEST_URI = rdflib.URIRef('http://example.org/id/foo')
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def testConnectionReused(self):
+        with SparqlServer() as server:
+            endpoint = Endpoint(server.url)
+            for i in range(3):
+                results = endpoint.query('SELECT ?s WHERE { ?s ?p ?o }')
+                self.assertEqual([r.s for r in results], [TEST_URI])
+            self.assertEqual(server.queries, 3)
+            self.assertEqual(server.connections, 1)
+
+    def testSharedBetweenEndpoints(self):
+        with SparqlServer() as server:
+            for i in range(2):
+                Endpoint(server.url).query('SELECT ?s WHERE { ?s ?p ?o }')
+            self.assertEqual(server.connections, 1)
+
+    def testUnreadResponseNotReused(self):
+        with SparqlServer() as server:
+            response = pool.urlopen(server.url, 'query=ASK')
+            response.read(10)
+            response.close()
+            pool.urlopen(server.url, 'query=ASK').read()
+            self.assertEqual(server.connections, 2)
+
+    def testReadline(self):
+        with SparqlServer() as server:
+            response = pool.urlopen(server.url, 'query=ASK')
+            lines = list(response)
+            self.assertEqual(''.join(lines), server.response_body)
+            self.assertTrue(all(line.endswith('\n') for line in lines))
+
+    def testStaleConnectionRetried(self):
+        with SparqlServer() as server:
+            connection_pool = pool.get_pool(server.url)
+            pool.urlopen(server.url, 'query=ASK').read()
+            # Simulate the server having dropped the idle connection.
+            for connection, last_used in connection_pool._idle:
+                connection.sock.close()
+            self.assertEqual(pool.urlopen(server.url, 'query=ASK').read(), server.response_body)
+
+    def testQueryError(self):
+        with SparqlServer() as server:
+            server.response_status = 400
+            with self.assertRaises(QueryError) as cm:
+                Endpoint(server.url).query('SELECT ?s WHERE { ?s ?p ?o }', log_failure=False)
+            self.assertEqual(cm.exception.status_code, 400)
+
+    def testMaxConnections(self):
+        with SparqlServer() as server:
+            connection_pool = pool.ConnectionPool('http', *server.server_address, max_connections=1)
+            first = connection_pool.request('POST', '/', 'query=ASK')
+            second = []
+            thread = threading.Thread(target=lambda: second.append(connection_pool.request('POST', '/', 'query=ASK')))
+            thread.start()
+            thread.join(0.2)
+            # Waiting for the first connection to be handed back
+            self.assertEqual(second, [])
+            first.read()
+            thread.join()
+            self.assertEqual(second[0].read(), server.response_body)
+            self.assertEqual(server.connections, 1)
+
+    def testPoolExhausted(self):
+        with SparqlServer() as server:
+            connection_pool = pool.ConnectionPool('http', *server.server_address, max_connections=1, wait_timeout=0.1)
+            response = connection_pool.request('POST', '/', 'query=ASK')
+            self.assertRaises(pool.PoolExhausted, connection_pool.request, 'POST', '/', 'query=ASK')
+            # Abandoning a response gives up its connection
+            del response
+            connection_pool.request('POST', '/', 'query=ASK').read()
@@ -0,0 +1,112 @@
+import time
+import unittest
+import uuid
+
+from django.conf import settings
+import mock
+import redis
+
+from humfrey.sparql import ratelimit
+
+class HeartbeatTestCase(unittest.TestCase):
+    def setUp(self):
+        self.heartbeat = ratelimit.Heartbeat()
+        self.client = mock.Mock()
+        self.pipeline = self.client.pipeline.return_value
+
+    def testBeatsInOneRoundTrip(self):
+        with mock.patch.object(self.heartbeat, '_run'):
+            self.heartbeat.add('query:a', 4)
+            self.heartbeat.add('query:b', 2)
+        self.heartbeat.beat(self.client)
+        self.assertEqual(sorted(call[0][:3] for call in self.pipeline.evalsha.call_args_list),
+                         [(ratelimit._update.sha, 1, 'query:a'), (ratelimit._update.sha, 1, 'query:b')])
+        self.pipeline.execute.assert_called_once_with()
+
+    def testRemoved(self):
+        with mock.patch.object(self.heartbeat, '_run'):
+            self.heartbeat.add('query:a', 4)
+        self.heartbeat.remove('query:a')
+        self.heartbeat.beat(self.client)
+        self.assertFalse(self.client.pipeline.called)
+
+    def testOneThread(self):
+        with mock.patch('threading.Thread') as thread:
+            for i in range(3):
+                self.heartbeat.add('query:%d' % i, 4)
+            self.assertEqual(thread.call_count, 1)
+
+class ScriptsTestCase(unittest.TestCase):
+    def testAdmit(self):
+        client = mock.Mock()
+        client.evalsha.return_value = [0, '31.5']
+        self.assertEqual(ratelimit.admit(client, ('queries', 'updated', 'value', 'query:a'), 'query:', 'a',
+                                         {'id': 'a', 'query': 'ASK {}'}, 2, 0.05, 30),
+                         (False, 31.5))
+        args = client.evalsha.call_args[0]
+        self.assertEqual(args[:6], (ratelimit._admit.sha, 4, 'queries', 'updated', 'value', 'query:a'))
+        self.assertEqual(args[7:], (2, 0.05, 30, 'query:', 'a', 'id', 'a', 'query', 'ASK {}'))
+
+class RedisScriptsTestCase(unittest.TestCase):
+    """
+    Runs the scripts against a real redis, if there is one.
+    """
+    def setUp(self):
+        self.client = redis.client.Redis(**(getattr(settings, 'REDIS_PARAMS', None) or {}))
+        try:
+            self.client.ping()
+        except redis.RedisError:
+            raise unittest.SkipTest("redis isn't available")
+        self.prefix = 'humfrey:test:%s:' % uuid.uuid4().hex
+        self.addCleanup(lambda: self.client.delete(*self.client.keys(self.prefix + '*') or [self.prefix]))
+        self.queries, self.updated, self.value = self.prefix + 'queries', self.prefix + 'updated', self.prefix + 'value'
+        self.query_prefix = self.prefix + 'query:'
+
+    def admit(self, query_id, deny_threshold=30):
+        return ratelimit.admit(self.client, (self.queries, self.updated, self.value, self.query_prefix + query_id),
+                               self.query_prefix, query_id,
+                               {'id': query_id, 'heartbeat': repr(time.time() + 60)}, 2, 0.05, deny_threshold)
+
+    def testAdmit(self):
+        self.assertEqual(self.admit('a'), (True, 0.0))
+        self.assertEqual(self.client.smembers(self.queries), set(['a']))
+        self.assertEqual(self.client.hget(self.query_prefix + 'a', 'id'), 'a')
+        # The first query hasn't started, so counts for the minimum intensity
+        admitted, intensity = self.admit('b')
+        self.assertTrue(admitted)
+        self.assertAlmostEqual(intensity, 2.0)
+
+    def testDeny(self):
+        self.client.set(self.updated, repr(time.time()))
+        self.client.set(self.value, '40')
+        admitted, intensity = self.admit('a')
+        self.assertFalse(admitted)
+        self.assertTrue(intensity > 30)
+        self.assertFalse(self.client.exists(self.query_prefix + 'a'))
+        self.assertEqual(self.client.smembers(self.queries), set())
+
+    def testDeadQueriesPruned(self):
+        self.client.sadd(self.queries, 'dead')
+        self.client.hmset(self.query_prefix + 'dead', {'id': 'dead', 'heartbeat': repr(time.time() - 1)})
+        self.assertEqual(self.admit('a'), (True, 0.0))
+        self.assertEqual(self.client.smembers(self.queries), set(['a']))
+        self.assertFalse(self.client.exists(self.query_prefix + 'dead'))
+
+    def testUpdate(self):
+        self.admit('a')
+        ratelimit.update(self.client, self.query_prefix + 'a', {'started': '1'})
+        self.assertEqual(self.client.hget(self.query_prefix + 'a', 'started'), '1')
+        # Expired queries aren't brought back to life
+        ratelimit.update(self.client, self.query_prefix + 'b', {'started': '1'})
+        self.assertFalse(self.client.exists(self.query_prefix + 'b'))
+
+    def testReleaseDecays(self):
+        self.admit('a')
+        self.client.set(self.updated, repr(time.time() - 10))
+        self.client.set(self.value, '1.0')
+        intensity = ratelimit.release(self.client, (self.queries, self.query_prefix + 'a', self.updated, self.value),
+                                      'a', 0.1, 0.05)
+        # Decayed by 10 * 0.05, then the query's duration added
+        self.assertAlmostEqual(intensity, 0.6, places=2)
+        self.assertEqual(self.client.smembers(self.queries), set())
+        self.assertFalse(self.client.exists(self.query_prefix + 'a'))
@@ -0,0 +1,46 @@
+import pickle
+import unittest
+
+import rdflib
+
+from humfrey.sparql.results import Result, SparqlResultList
+
+class ResultTestCase(unittest.TestCase):
+    fields = ('s', 'count', 'get')
+    uri = rdflib.URIRef('http://example.org/id/foo')
+
+    def testAccess(self):
+        result = Result(self.fields, {'s': self.uri, 'count': rdflib.Literal(3)})
+        self.assertEqual(result.s, self.uri)
+        self.assertEqual(result['s'], self.uri)
+        self.assertEqual(result[0], self.uri)
+        self.assertEqual(result.count, rdflib.Literal(3))
+        self.assertEqual(result['get'], None)
+        self.assertEqual(result.get('get'), None)
+        self.assertEqual(result.get('missing', 1), 1)
+        self.assertEqual(list(result), [self.uri, rdflib.Literal(3), None])
+        self.assertEqual(result._asdict(), {'s': self.uri, 'count': rdflib.Literal(3), 'get': None})
+        self.assertTrue('s' in result)
+        self.assertRaises(KeyError, result.__getitem__, 'missing')
+        self.assertRaises(AttributeError, getattr, result, 'missing')
+
+    def testSequence(self):
+        self.assertEqual(Result(self.fields, [self.uri]), Result(self.fields, (self.uri, None, None)))
+        self.assertEqual(dict([Result(('a', 'b'), ('x', 'y'))]), {'x': 'y'})
+
+    def testUndeclaredFields(self):
+        result = Result(('s',), {'s': self.uri, 'o': self.uri})
+        self.assertEqual(result.fields, ('s', 'o'))
+        self.assertEqual(dict(result.iteritems()), {'s': self.uri, 'o': self.uri})
+
+    def testPickle(self):
+        results = SparqlResultList(self.fields, [Result(self.fields, (self.uri, None, rdflib.Literal('x')))])
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            unpickled = pickle.loads(pickle.dumps(results[0], protocol))
+            self.assertEqual(unpickled, results[0])
+            self.assertEqual(unpickled.fields, self.fields)
+
+    def testCompact(self):
+        result = Result(self.fields, (self.uri, None, None))
+        self.assertFalse(hasattr(result, '__dict__'))
+        self.assertTrue(type(result) is Result(self.fields))
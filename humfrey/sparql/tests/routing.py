@@ -0,0 +1,123 @@
+import socket
+import time
+
+from django.test import TestCase
+import mock
+
+from humfrey.signals import graphs_updated
+from humfrey.sparql import admission, routing
+from humfrey.sparql.endpoint import Endpoint
+from humfrey.sparql.models import Store, StoreReplica
+
+from .server import SparqlServer
+
+def get_unused_url():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    url = 'http://%s:%d/query' % sock.getsockname()
+    sock.close()
+    return url
+
+class RoutingTestCase(TestCase):
+    sparql = 'SELECT ?s WHERE { ?s ?p ?o }'
+
+    def setUp(self):
+        self.primary, self.replica = SparqlServer(), SparqlServer()
+        self.primary.__enter__()
+        self.replica.__enter__()
+        self.store = Store.objects.create(slug='replicated', name='Replicated',
+                                          query_endpoint=self.primary.url)
+        # There's been no recent update
+        patcher = mock.patch('humfrey.sparql.routing.UPDATE_LAG', -1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.primary.__exit__(None, None, None)
+        self.replica.__exit__(None, None, None)
+
+    def query(self, count=1, **kwargs):
+        endpoint = Endpoint(self.primary.url, replicas=self.store.get_replica_urls(), **kwargs)
+        for i in range(count):
+            self.assertEqual(len(endpoint.query(self.sparql, cache_timeout=0)), 1)
+
+    def testNoReplicas(self):
+        self.assertEqual(self.store.get_replica_urls(), ())
+        self.assertEqual(routing.get_router(self.primary.url, ()), None)
+        self.query(3)
+        self.assertEqual(self.primary.queries, 3)
+
+    def testRouted(self):
+        StoreReplica.objects.create(store=self.store, query_endpoint=self.replica.url)
+        self.query(10)
+        self.assertEqual(self.primary.queries + self.replica.queries, 10)
+        self.assertTrue(self.primary.queries > 0)
+        self.assertTrue(self.replica.queries > 0)
+
+    def testAdmittedToReplica(self):
+        self.primary.response_status = 503
+        StoreReplica.objects.create(store=self.store, query_endpoint=self.replica.url)
+        endpoint = Endpoint(self.primary.url, replicas=self.store.get_replica_urls())
+        with mock.patch('humfrey.sparql.routing.logger'):
+            for i in range(routing.FAILURE_THRESHOLD):
+                endpoint.query(self.sparql, cache_timeout=0)
+        # The primary's circuit is now broken, so we'll go to the replica
+        results = endpoint.query(self.sparql, cache_timeout=0, defer=True)
+        self.assertEqual(admission.get_queue(self.replica.url).active, 1)
+        self.assertEqual(admission.get_queue(self.primary.url).active, 0)
+        results.read()
+        self.assertEqual(admission.get_queue(self.replica.url).active, 0)
+
+    def testBatchUsesPrimary(self):
+        StoreReplica.objects.create(store=self.store, query_endpoint=self.replica.url)
+        self.query(5, admission_pool='batch')
+        self.assertEqual(self.replica.queries, 0)
+
+    def testPrimaryAfterUpdate(self):
+        StoreReplica.objects.create(store=self.store, query_endpoint=self.replica.url)
+        graphs_updated.send(None, store=self.store, graphs=frozenset(), when=None)
+        with mock.patch('humfrey.sparql.routing.UPDATE_LAG', 60):
+            self.query(5)
+        self.assertEqual(self.replica.queries, 0)
+
+    def testDisabledReplica(self):
+        StoreReplica.objects.create(store=self.store, query_endpoint=self.replica.url, enabled=False)
+        self.query(3)
+        self.assertEqual(self.replica.queries, 0)
+
+    def testFailover(self):
+        url = get_unused_url()
+        StoreReplica.objects.create(store=self.store, query_endpoint=url)
+        with mock.patch('humfrey.sparql.routing.logger'):
+            self.query(10)
+        self.assertEqual(self.primary.queries, 10)
+        # Its circuit was broken, so it wasn't tried every time
+        self.assertEqual(routing._replicas[url].failures, routing.FAILURE_THRESHOLD)
+        self.assertTrue(routing._replicas[url].broken_until > time.time())
+
+    def testUnavailable(self):
+        self.replica.response_status = 503
+        StoreReplica.objects.create(store=self.store, query_endpoint=self.replica.url)
+        with mock.patch('humfrey.sparql.routing.logger'):
+            self.query(5)
+        self.assertEqual(self.primary.queries, 5)
+
+class ReplicaTestCase(TestCase):
+    def testCircuitBreaker(self):
+        replica = routing.Replica('http://example.org/query')
+        with mock.patch('humfrey.sparql.routing.logger'):
+            for i in range(routing.FAILURE_THRESHOLD):
+                self.assertTrue(replica.is_available(time.time()))
+                replica.failed()
+            self.assertFalse(replica.is_available(time.time()))
+            # Half-open once it's had time to recover
+            self.assertTrue(replica.is_available(time.time() + routing.RECOVERY_TIME))
+            replica.succeeded(0.5)
+        self.assertTrue(replica.is_available(time.time()))
+        self.assertEqual(replica.failures, 0)
+
+    def testLatency(self):
+        replica = routing.Replica('http://example.org/query')
+        replica.succeeded(1.0)
+        replica.succeeded(2.0)
+        self.assertAlmostEqual(replica.latency, 1.0 + routing.EWMA_WEIGHT)
@@ -0,0 +1,99 @@
+import BaseHTTPServer
+import socket
+import threading
+import time
+import urlparse
+
+from humfrey.sparql import pool
+
+class SparqlRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers every query with the same SPARQL results document.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.queries += 1
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        time.sleep(self.server.response_delay)
+        with self.server.lock:
+            self.server.active -= 1
+        body = self.server.response_body
+        self.send_response(self.server.response_status)
+        self.send_header('Content-Type', self.server.response_content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+        except socket.error:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+class SparqlServer(BaseHTTPServer.HTTPServer):
+    """
+    A minimal keep-alive SPARQL endpoint for tests, served from a thread.
+
+    Counts the number of connections accepted and queries answered, and the
+    most queries answered at once.
+    """
+    response_status = 200
+    response_delay = 0
+    response_content_type = 'application/sparql-results+xml'
+    response_body = """<?xml version="1.0"?>
+<sparql xmlns="http://www.w3.org/2005/sparql-results#">
+  <head>
+    <variable name="s"/>
+  </head>
+  <results>
+    <result>
+      <binding name="s"><uri>http://example.org/id/foo</uri></binding>
+    </result>
+  </results>
+</sparql>
+"""
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), SparqlRequestHandler)
+        self.connections, self.queries = 0, 0
+        self.active, self.max_active = 0, 0
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        self.connections += 1
+        return BaseHTTPServer.HTTPServer.get_request(self)
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self._process_request_thread,
+                                  args=(request, client_address))
+        thread.daemon = True
+        thread.start()
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    @property
+    def url(self):
+        return urlparse.urlunparse(('http', '%s:%d' % self.server_address, '/query', '', '', ''))
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Close our idle keep-alive connections so the handler threads exit.
+        pool.get_pool(self.url).clear()
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,138 @@
+import StringIO
+import threading
+import unittest
+
+import mock
+
+from humfrey.sparql import singleflight
+from humfrey.sparql.endpoint import Endpoint, QueryError
+
+from .server import SparqlServer
+
+class SingleFlightTestCase(unittest.TestCase):
+    query = 'SELECT ?s WHERE { ?s ?p ?o }'
+
+    def run_concurrently(self, func, count=5):
+        results = [None] * count
+        def run(i):
+            try:
+                results[i] = func()
+            except Exception, e:
+                results[i] = e
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def testCoalesced(self):
+        with SparqlServer() as server:
+            server.response_delay = 0.2
+            endpoint = Endpoint(server.url)
+            results = self.run_concurrently(lambda: endpoint.query(self.query, cache_timeout=0))
+            self.assertEqual(server.queries, 1)
+            for result in results:
+                self.assertEqual(result, results[0])
+
+    def testDeferredCoalesced(self):
+        with SparqlServer() as server:
+            server.response_delay = 0.2
+            endpoint = Endpoint(server.url)
+            results = self.run_concurrently(lambda: endpoint.query(self.query, cache_timeout=0, defer=True).read())
+            self.assertEqual(server.queries, 1)
+            self.assertEqual(results, [server.response_body] * 5)
+
+    def testDifferentQueries(self):
+        with SparqlServer() as server:
+            server.response_delay = 0.2
+            endpoint = Endpoint(server.url)
+            queries = iter(['%s LIMIT %d' % (self.query, i) for i in range(5)])
+            lock = threading.Lock()
+            def query():
+                with lock:
+                    q = next(queries)
+                return endpoint.query(q, cache_timeout=0)
+            self.run_concurrently(query)
+            self.assertEqual(server.queries, 5)
+
+    def testErrorsShared(self):
+        with SparqlServer() as server:
+            server.response_delay, server.response_status = 0.2, 500
+            endpoint = Endpoint(server.url)
+            results = self.run_concurrently(lambda: endpoint.query(self.query, cache_timeout=0, log_failure=False))
+            self.assertEqual(server.queries, 1)
+            for result in results:
+                self.assertIsInstance(result, QueryError)
+
+    @mock.patch('humfrey.sparql.singleflight.MAX_SIZE', 100)
+    def testLargeResponsesNotShared(self):
+        with SparqlServer() as server:
+            server.response_delay = 0.2
+            endpoint = Endpoint(server.url)
+            results = self.run_concurrently(lambda: endpoint.query(self.query, cache_timeout=0))
+            self.assertTrue(server.queries > 1)
+            # Waiters queued rather than all querying at once
+            self.assertEqual(server.max_active, 1)
+            for result in results:
+                self.assertEqual(len(result), 1)
+
+    def testNotCopiedWithoutWaiters(self):
+        content_type, stream = singleflight.call('key', lambda: ('text/plain', StringIO.StringIO('body')))
+        self.assertIn('key', singleflight._flights)
+        self.assertEqual(stream.read(1), 'b')
+        # Can't be joined once we've started reading
+        self.assertNotIn('key', singleflight._flights)
+        self.assertEqual(stream._copy, None)
+        self.assertEqual(stream.read(), 'ody')
+
+    def testDiscardedStream(self):
+        flight_stream = singleflight.call('key', lambda: ('text/plain', StringIO.StringIO('body')))
+        self.assertIn('key', singleflight._flights)
+        del flight_stream
+        self.assertNotIn('key', singleflight._flights)
+
+    @mock.patch('humfrey.sparql.singleflight.ENABLED', False)
+    def testDisabled(self):
+        with SparqlServer() as server:
+            server.response_delay = 0.2
+            endpoint = Endpoint(server.url)
+            self.run_concurrently(lambda: endpoint.query(self.query, cache_timeout=0))
+            self.assertEqual(server.queries, 5)
+
+class DistributedSingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.pipeline = self.client.pipeline.return_value
+        self.client.get.return_value = '0'
+        self.fetch = mock.Mock(side_effect=lambda: ('text/plain', StringIO.StringIO('body')))
+
+    def lead(self):
+        with mock.patch('humfrey.sparql.singleflight.DISTRIBUTED', True), \
+             mock.patch('humfrey.sparql.singleflight.get_redis_client', lambda: self.client):
+            flight = singleflight._Flight('key')
+            content_type, stream = singleflight._lead(flight, self.fetch)
+            return content_type, stream.read(), flight.result
+
+    def testLeaderPublishes(self):
+        self.client.set.return_value = True
+        # Another process is waiting
+        self.client.get.return_value = '1'
+        self.pipeline.execute.side_effect = lambda: [True, self.client.set.call_args[0][1]]
+        self.assertEqual(self.lead(), ('text/plain', 'body', ('text/plain', 'body')))
+        self.pipeline.setex.assert_called_once_with(singleflight._result_key.format('key'),
+                                                    'text/plain\nbody', singleflight.RESULT_TIME)
+        self.client.delete.assert_called_once_with(singleflight._lease_key.format('key'))
+
+    def testWaiterUsesPublished(self):
+        self.client.set.return_value = None
+        self.pipeline.execute.side_effect = [[1, True], [None, True], ['text/plain\nshared body', True]]
+        self.assertEqual(self.lead(), ('text/plain', 'shared body', ('text/plain', 'shared body')))
+        self.assertFalse(self.fetch.called)
+
+    def testWaiterFetchesIfLeaderFails(self):
+        # The lease is free once the other process has given up
+        self.client.set.side_effect = [None, True]
+        self.pipeline.execute.return_value = [None, False]
+        self.assertEqual(self.lead(), ('text/plain', 'body', None))
+        self.assertTrue(self.fetch.called)
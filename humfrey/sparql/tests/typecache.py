@@ -0,0 +1,94 @@
+import mock
+import unittest
+
+import rdflib
+
+from humfrey.signals import graphs_updated
+from humfrey.sparql import typecache
+from humfrey.sparql.endpoint import Endpoint
+
+from .server import SparqlServer
+
+TEST_URIS = [rdflib.URIRef('http://example.org/id/%d' % i) for i in range(3)]
+TEST_TYPE = rdflib.URIRef('http://example.org/vocab/Thing')
+
+def srx(fields, results):
+    return """<?xml version="1.0"?>
+<sparql xmlns="http://www.w3.org/2005/sparql-results#">
+  <head>%s</head>
+  <results>%s</results>
+</sparql>""" % (''.join('<variable name="%s"/>' % f for f in fields),
+                ''.join('<result>%s</result>' % ''.join('<binding name="%s"><uri>%s</uri></binding>' % b for b in zip(fields, r))
+                        for r in results))
+
+class TypeCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        typecache._local.clear()
+        typecache._generations.clear()
+        patcher = mock.patch.object(typecache, 'ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testCached(self):
+        with SparqlServer() as server:
+            server.response_body = srx(['type'], [[TEST_TYPE]])
+            endpoint = Endpoint(server.url)
+            for i in range(2):
+                self.assertEqual(typecache.get_types(endpoint, TEST_URIS[:1]),
+                                 {TEST_URIS[0]: set([TEST_TYPE])})
+            # Now from Django's cache
+            typecache._local.clear()
+            self.assertEqual(typecache.get_types(endpoint, TEST_URIS[:1]),
+                             {TEST_URIS[0]: set([TEST_TYPE])})
+            self.assertEqual(server.queries, 1)
+
+    def testNegative(self):
+        with SparqlServer() as server:
+            server.response_body = srx(['type'], [])
+            endpoint = Endpoint(server.url)
+            for i in range(2):
+                self.assertEqual(typecache.get_types(endpoint, TEST_URIS[:1]),
+                                 {TEST_URIS[0]: set()})
+            self.assertEqual(server.queries, 1)
+
+    def testMany(self):
+        with SparqlServer() as server:
+            server.response_body = srx(['s', 'type'], [[TEST_URIS[0], TEST_TYPE],
+                                                        [TEST_URIS[2], TEST_TYPE]])
+            endpoint = Endpoint(server.url)
+            types = typecache.get_types(endpoint, TEST_URIS)
+            self.assertEqual(types, {TEST_URIS[0]: set([TEST_TYPE]),
+                                     TEST_URIS[1]: set(),
+                                     TEST_URIS[2]: set([TEST_TYPE])})
+            self.assertEqual(server.queries, 1)
+
+    def testInvalidatedByGraphsUpdated(self):
+        with SparqlServer() as server:
+            server.response_body = srx(['type'], [[TEST_TYPE]])
+            endpoint = Endpoint(server.url)
+            typecache.get_types(endpoint, TEST_URIS[:1])
+            graphs_updated.send(None, store=mock.Mock(query_endpoint=server.url),
+                                graphs=frozenset(), when=None)
+            typecache.get_types(endpoint, TEST_URIS[:1])
+            self.assertEqual(server.queries, 2)
+
+    def testLocalHitAvoidsDjangoCache(self):
+        with SparqlServer() as server:
+            server.response_body = srx(['type'], [[TEST_TYPE]])
+            endpoint = Endpoint(server.url)
+            typecache.get_types(endpoint, TEST_URIS[:1])
+            with mock.patch('humfrey.sparql.typecache.cache') as cache, \
+                 mock.patch('humfrey.sparql.cache.cache') as results_cache:
+                self.assertEqual(typecache.get_types(endpoint, TEST_URIS[:1]),
+                                 {TEST_URIS[0]: set([TEST_TYPE])})
+                self.assertEqual(cache.method_calls, [])
+                self.assertEqual(results_cache.method_calls, [])
+
+    def testDisabled(self):
+        with SparqlServer() as server, mock.patch.object(typecache, 'ENABLED', False):
+            server.response_body = srx(['type'], [[TEST_TYPE]])
+            endpoint = Endpoint(server.url)
+            for i in range(2):
+                self.assertEqual(typecache.get_types(endpoint, TEST_URIS[:1]),
+                                 {TEST_URIS[0]: set([TEST_TYPE])})
+            self.assertEqual(server.queries, 2)
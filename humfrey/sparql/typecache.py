@@ -0,0 +1,129 @@
+"""
+Caches the rdf:types of resources in a store.
+
+Nearly every linked data request starts by finding the types of the resource
+it's about, so we keep them in two tiers: an in-process LRU cache, and
+Django's cache. Resources without any types are cached too, so that requests
+for unknown URIs don't each result in a query.
+
+Keys include the endpoint's result cache generation, so entries are
+invalidated along with cached query results when the graphs_updated signal is
+sent. Each process only rechecks the generation every GENERATION_INTERVAL
+seconds, so in other processes entries may outlive an update by that long.
+
+The signal is usually sent by a Celery worker, so its generation bump only
+reaches web processes if they share a cache with it. As such the type cache
+is off unless Django's cache is something other than locmem or dummy, or
+SPARQL_TYPE_CACHE is set.
+"""
+
+import hashlib
+import time
+
+import rdflib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.dispatch import receiver
+
+from humfrey.signals import graphs_updated
+from humfrey.utils.lru import LRUCache
+from humfrey.utils.statsd import statsd
+
+from . import cache as results_cache
+
+# Seconds to cache the types of a resource
+TIMEOUT = getattr(settings, 'CACHE_TIMES', {}).get('types', 1800)
+# Seconds to remember that a resource doesn't have any types
+NEGATIVE_TIMEOUT = getattr(settings, 'CACHE_TIMES', {}).get('types-negative', 300)
+# Number of resources to cache types for in each process
+LOCAL_SIZE = getattr(settings, 'SPARQL_TYPE_CACHE_SIZE', 10000)
+# Seconds between each process checking the result cache generation
+GENERATION_INTERVAL = getattr(settings, 'SPARQL_TYPE_CACHE_GENERATION_INTERVAL', 5)
+# Number of URIs to look up in a single query
+BATCH_SIZE = 100
+
+ENABLED = getattr(settings, 'SPARQL_TYPE_CACHE', None)
+if ENABLED is None:
+    ENABLED = not isinstance(cache, (LocMemCache, DummyCache))
+
+_local = LRUCache(LOCAL_SIZE)
+# Endpoint URLs to (time checked, generation)
+_generations = {}
+
+def _get_key(url, generation, uri):
+    return 'types:%s' % hashlib.sha1('%s\0%s\0%s' % (url.encode('utf-8'), generation, uri.encode('utf-8'))).hexdigest()
+
+def _query(endpoint, uris):
+    if len(uris) == 1:
+        uri = uris[0]
+        results = endpoint.query('SELECT ?type WHERE { %s a ?type }' % uri.n3(),
+                                 preferred_media_types=('application/sparql-results+xml',),
+                                 cache_timeout=0)
+        return {uri: set(rdflib.URIRef(r.type) for r in results)}
+    types = dict((uri, set()) for uri in uris)
+    results = endpoint.query('SELECT ?s ?type WHERE { VALUES ?s { %s } ?s a ?type }' % ' '.join(uri.n3() for uri in uris),
+                             preferred_media_types=('application/sparql-results+xml',),
+                             cache_timeout=0)
+    for result in results:
+        if result.s in types:
+            types[result.s].add(rdflib.URIRef(result.type))
+    return types
+
+def _get_generation(url, now):
+    checked, generation = _generations.get(url, (0, None))
+    if checked + GENERATION_INTERVAL <= now:
+        generation = results_cache.get_generation(url)
+        _generations[url] = now, generation
+    return generation
+
+def get_types(endpoint, uris):
+    """
+    Returns a dictionary mapping each of uris to its set of types.
+    """
+    if not ENABLED:
+        types, uris = {}, list(uris)
+        for i in range(0, len(uris), BATCH_SIZE):
+            types.update(_query(endpoint, uris[i:i+BATCH_SIZE]))
+        return types
+
+    url = endpoint._url
+    now = time.time()
+    generation = _get_generation(url, now)
+    types, missing = {}, []
+
+    for uri in uris:
+        expires, uri_types = _local.get((url, generation, uri), (0, None))
+        if expires > now:
+            types[uri] = set(uri_types)
+        else:
+            missing.append(uri)
+    statsd.incr('humfrey.type-cache.local-hit', len(types))
+
+    if missing:
+        keys = dict((_get_key(url, generation, uri), uri) for uri in missing)
+        cached = cache.get_many(keys.keys())
+        statsd.incr('humfrey.type-cache.hit', len(cached))
+        for key, (expires, uri_types) in cached.iteritems():
+            uri = keys[key]
+            types[uri] = set(rdflib.URIRef(t) for t in uri_types)
+            _local[(url, generation, uri)] = expires, frozenset(types[uri])
+        missing = [uri for uri in missing if uri not in types]
+
+    statsd.incr('humfrey.type-cache.miss', len(missing))
+    for i in range(0, len(missing), BATCH_SIZE):
+        for uri, uri_types in _query(endpoint, missing[i:i+BATCH_SIZE]).iteritems():
+            timeout = TIMEOUT if uri_types else NEGATIVE_TIMEOUT
+            expires = now + timeout
+            types[uri] = uri_types
+            _local[(url, generation, uri)] = expires, frozenset(uri_types)
+            cache.set(_get_key(url, generation, uri), (expires, tuple(map(unicode, uri_types))), timeout)
+
+    return types
+
+@receiver(graphs_updated)
+def _graphs_updated(sender, store, **kwargs):
+    # Pick up the new generation straight away in this process
+    _generations.pop(store.query_endpoint, None)
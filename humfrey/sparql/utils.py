@@ -4,6 +4,8 @@ import re
 from django.conf import settings
 from rdflib import URIRef, BNode, ConjunctiveGraph
 
+from humfrey.streaming.base import StreamingParser
+from humfrey.utils.graph import CompactGraph
 from humfrey.utils.namespaces import contract, expand
 from .endpoint import Endpoint
 
@@ -20,7 +22,7 @@ def language_key(value):
 def get_labels(subjects, endpoint=None, mapping=True):
     if not subjects:
         return {}
-    if isinstance(subjects, ConjunctiveGraph):
+    if isinstance(subjects, (ConjunctiveGraph, CompactGraph)):
         subjects = itertools.chain(subjects.subjects(),
                                    subjects.predicates(),
                                    subjects.objects())
@@ -45,8 +47,11 @@ def get_labels(subjects, endpoint=None, mapping=True):
         }}""".format(predicates=u' '.join(p.n3() for p in label_predicates),
                      subjects=u' '.join(s.n3() for s in subjects))
 
-    graph = endpoint.query(query)
-    
+    graph = endpoint.query(query, defer=True)
+    if isinstance(graph, StreamingParser):
+        # Only used to look up labels, so doesn't need a full rdflib graph
+        graph = CompactGraph(graph.get_triples())
+
     if not mapping:
         return graph
 
@@ -1,10 +1,6 @@
-import base64
 import functools
-import hashlib
 import httplib
 import math
-import pickle
-import threading
 import time
 import urllib
 import urllib2
@@ -13,10 +9,8 @@ import uuid
 
 from lxml import etree
 import rdflib
-import redis
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404
 from django.views.generic import View
@@ -31,6 +25,7 @@ from humfrey.results.views.standard import RDFView, ResultSetView
 from humfrey.utils.views import RedisView
 from humfrey.utils.namespaces import NS
 
+from humfrey.sparql import ratelimit, typecache
 from humfrey.sparql.endpoint import Endpoint, QueryError
 from humfrey.sparql.forms import SparqlQueryForm
 from humfrey.sparql.models import Store
@@ -65,7 +60,8 @@ class StoreView(View):
             else:
                 preferred_media_types = ()
             self._endpoint = Endpoint(self.store.query_endpoint,
-                                      preferred_media_types=preferred_media_types)
+                                      preferred_media_types=preferred_media_types,
+                                      replicas=self.store.get_replica_urls())
         return self._endpoint
 
     def dispatch(self, request, *args, **kwargs):
@@ -73,25 +69,24 @@ class StoreView(View):
         response['X-Humfrey-Store-Name'] = self.store.slug
         return response
 
-    def get_types(self, uri):
+    def _is_resolvable(self, uri):
         if ' ' in uri:
-            return set()
+            return False
         parsed = urlparse.urlparse(uri)
         if parsed.scheme == 'mailto':
-            if parsed.netloc or not parsed.path:
-                return set()
-        else:
-            if not (parsed.scheme and parsed.netloc):
-                return set()
-        key_name = 'types:%s' % hashlib.sha1(uri.encode('utf8')).hexdigest()
-        types = cache.get(key_name)
-        if False and types:
-            types = pickle.loads(base64.b64decode(types))
+            return bool(parsed.path and not parsed.netloc)
         else:
-            results = self.endpoint.query('SELECT ?type WHERE { %s a ?type }' % uri.n3(),
-                                          preferred_media_types=('application/sparql-results+xml',))
-            types = set(rdflib.URIRef(r.type) for r in results)
-            cache.set(key_name, base64.b64encode(pickle.dumps(types)), 1800)
+            return bool(parsed.scheme and parsed.netloc)
+
+    def get_types(self, uri):
+        return self.get_types_many([uri])[uri]
+
+    def get_types_many(self, uris):
+        """
+        Returns a dictionary mapping each of uris to its set of rdf:types.
+        """
+        types = dict((uri, set()) for uri in uris if not self._is_resolvable(uri))
+        types.update(typecache.get_types(self.endpoint, [uri for uri in uris if uri not in types]))
         return types
 
     def update_context_for_deferral(self):
@@ -292,73 +287,43 @@ class ProtectedQueryView(QueryView):
         else:
             return request.META['REMOTE_ADDR']
 
-    def get_current_queries(self, client, user_key):
-        uuids = client.smembers(self.user_queries_key.format(user_key))
-        if not uuids:
-            return
-        queries = map(self.unpack, client.mget([self.query_key.format(u) for u in uuids]))
-        for query in queries:
-            if 'started' in query:
-                query['intensity'] = max(self.minimum_query_intensity,
-                                         time.time() - query['started'])
-            else:
-                query['intensity'] = self.minimum_query_intensity
-            if time.time() > query['heartbeat']:
-                user_queries_key = self.user_queries_key.format(user_key)
-                client.srem(user_queries_key, query['id'])
-                client.delete(self.query_key.format(query['id']))
-                continue
-            yield query
-
-    def get_intensity(self, client, user_key, queries):
-        updated_key = self.intensity_updated_key.format(user_key)
-        value_key = self.intensity_value_key.format(user_key)
-
-        updated = float(client.get(updated_key) or time.time())
-        value = float(client.get(value_key) or 0)
-
-        value += sum(query['intensity'] for query in queries)
-        value -= (time.time() - updated) * self.intensity_decay
-        return max(0, value)
-
     def perform_query(self, request, query, common_prefixes):
         client = self.get_redis_client()
         user_key = self.get_user_key(request)
-        queries = self.get_current_queries(client, user_key)
-        intensity = self.get_intensity(client, user_key, queries)
 
         # These might be useful things for a client to know
         self.context['additional_headers'].update({'X-Humfrey-SPARQL-Throttle-Threshold': self.throttle_threshold,
                                                    'X-Humfrey-SPARQL-Deny-Threshold': self.deny_threshold,
                                                    'X-Humfrey-SPARQL-Intensity-Decay': self.intensity_decay})
 
-        if intensity > self.deny_threshold:
-            # Refuse the query outright
-            raise self.ExcessiveQueryException(intensity, self.deny_threshold)
-
         query_id = uuid.uuid4().hex
         query_key = self.query_key.format(query_id)
         user_queries_key = self.user_queries_key.format(user_key)
+        intensity_keys = (self.intensity_updated_key.format(user_key),
+                          self.intensity_value_key.format(user_key))
 
-        # Store details of the query in redis. Don't store 'started' until
-        # we've done any throttling
-        data = {'query': query,
+        # Store details of the query in redis, unless the user's intensity
+        # means it should be refused outright. Don't store 'started' until
+        # we've done any throttling.
+        data = {'query': query.encode('utf-8'),
                 'id': query_id,
-                'common_prefixes': common_prefixes,
+                'common_prefixes': int(common_prefixes),
                 'user_key': user_key,
-                'requested': time.time(),
-                'heartbeat': time.time() + self.heartbeat_frequency * 2}
-        client.set(query_key, self.pack(data))
-        client.sadd(user_queries_key, query_id)
+                'requested': repr(time.time()),
+                'heartbeat': repr(time.time() + self.heartbeat_frequency * 2)}
+        admitted, intensity = ratelimit.admit(client,
+                                              (user_queries_key,) + intensity_keys + (query_key,),
+                                              self.query_key.format(''), query_id, data,
+                                              self.minimum_query_intensity, self.intensity_decay,
+                                              self.deny_threshold)
+        if not admitted:
+            raise self.ExcessiveQueryException(intensity, self.deny_threshold)
 
-        # This thread will update the heartbeat on the query every few seconds.
-        # The query_done event is used to tell it to stop beating and exit.
-        query_done = threading.Event()
-        heartbeat_thread = threading.Thread(target=self._heartbeat, args=(client, query_key, query_done, self.heartbeat_frequency))
+        # The process's heartbeat thread keeps the query alive until it's done.
+        ratelimit.heartbeat.add(query_key, self.heartbeat_frequency)
 
+        started = time.time()
         try:
-            heartbeat_thread.start()
-
             # Throttle if necessary
             if intensity > self.throttle_threshold:
                 throttle_by = intensity - self.throttle_threshold
@@ -367,82 +332,19 @@ class ProtectedQueryView(QueryView):
 
             # Record the started time in redis
             started = time.time()
-            self._update_redis_dict(client, query_key, {'started': started})
+            ratelimit.update(client, query_key, {'started': repr(started)})
 
             return super(ProtectedQueryView, self).perform_query(request, query, common_prefixes)
         finally:
-            # Tell the heatbeat thread that its work is done.
-            query_done.set()
-
-            # Update the query intensity.
-            new_intensity = self._update_intensity(client, user_key, time.time() - started)
-            self.context['additional_headers'].update({'X-Humfrey-SPARQL-Intensity': new_intensity})
+            ratelimit.heartbeat.remove(query_key)
 
             # Remove the record of the query from redis, so that it no longer
-            # counts towards the intensity.
-            client.srem(user_queries_key, query_id)
-            client.delete(query_key)
-
-    def _heartbeat(self, client, query_key, query_done, heartbeat_frequency):
-        while not query_done.wait(self.heartbeat_frequency):
-            # In Py2.6, Event.wait() always returns None, so we need this check
-            if query_done.is_set():
-                break
-            new_data = {'heartbeat': time.time() + heartbeat_frequency * 2}
-            self._update_redis_dict(client, query_key, new_data)
-
-    def _update_redis_dict(self, client, key, new_data):
-        """
-        Updates a packed dictionary in redis in a thread-safe manner.
-        """
-        # This is optimistic concurrency control (optimistic locking)
-        # We watch the key we're going to change, attempt to make the changes,
-        # and abort and try again if the key has been changed in the meantime.
-        # In the vast majority of cases this will succeed first time, but
-        # without doing this we might end up in a permanently inconsistent
-        # state.
-        while True:
-            with client.pipeline() as pipeline:
-                try:
-                    pipeline.watch(key)
-                    data = pipeline.get(key)
-                    if not data:
-                        break
-                    data = self.unpack(data)
-                    data.update(new_data)
-                    pipeline.multi()
-                    pipeline.set(key, self.pack(data))
-                    pipeline.execute()
-                except redis.WatchError:
-                    continue
-                else:
-                    break
-
-    def _update_intensity(self, client, user_key, duration):
-        """
-        Adds duration to the intensity for a given user_key.
-        """
-        # More optimistic locking
-        while True:
-            intensity_updated_key = self.intensity_updated_key.format(user_key)
-            intensity_value_key = self.intensity_value_key.format(user_key)
-            try:
-                with client.pipeline() as pipeline:
-                    pipeline.watch(intensity_updated_key, intensity_value_key)
-                    updated = float(pipeline.get(intensity_updated_key) or time.time())
-                    value = float(pipeline.get(intensity_value_key) or 0)
-                    value -= (time.time() - updated) * self.intensity_decay
-                    value = max(value, 0)
-                    value += min(0.2, duration)
-                    pipeline.multi()
-                    pipeline.set(intensity_updated_key, time.time())
-                    pipeline.set(intensity_value_key, value)
-                    pipeline.execute()
-                    return value
-            except redis.WatchError:
-                continue
-            else:
-                break
+            # counts towards the intensity, and add its duration to the
+            # intensity.
+            new_intensity = ratelimit.release(client,
+                                              (user_queries_key, query_key) + intensity_keys,
+                                              query_id, time.time() - started, self.intensity_decay)
+            self.context['additional_headers'].update({'X-Humfrey-SPARQL-Intensity': new_intensity})
 
     def dispatch(self, request):
         try:
@@ -12,14 +12,11 @@ from .base import StreamingParser, StreamingSerializer
 from .srx import SRXParser, SRXSerializer
 from .srj import SRJParser, SRJSerializer
 from .csv import CSVSerializer
-from .rdfxml import RDFXMLSerializer
+from .rdfxml import RDFXMLParser, RDFXMLSerializer
 from .ntriples import NTriplesParser, NTriplesSerializer
 from .xls import XLSSerializer
 from .wrapper import get_rdflib_parser, get_rdflib_serializer
 
-RDFXMLParser = get_rdflib_parser('RDFXMLParser', 'application/rdf+xml', 'xml',
-                                 parser_kwargs={'preserve_bnode_ids': True})
-
 try: # rdflib 3.x
     TurtleParser = get_rdflib_parser('TurtleParser', 'text/turtle', 'turtle')
 except Exception: # rdflib 2.4
@@ -88,9 +85,9 @@ def parser_by_extension(ext):
 def serializer_by_extension(ext):
     return format_by_extension(ext)['serializer']
 
-def parse(f, extension=None):
+def parse(f, extension=None, base=None):
     parser = parser_by_extension(extension or f.name)
-    return parser(f)
+    return parser(f, base=base)
 
 def serialize(data, f, extension=None):
     serializer = serializer_by_extension(extension or f.name)
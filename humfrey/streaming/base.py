@@ -4,6 +4,7 @@ import types
 import rdflib
 
 from humfrey.sparql.results import SparqlResultList
+from humfrey.utils.graph import CompactGraph
 from humfrey.utils.namespaces import NS
 
 from humfrey.utils.statsd import statsd
@@ -20,8 +21,12 @@ class StreamingParser(object):
     """
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, stream, encoding='utf-8'):
-        self._stream, self._encoding = stream, encoding
+    def __init__(self, stream, encoding='utf-8', base=None):
+        """
+        base is the URI against which to resolve relative references, for
+        formats that have them. It defaults to the stream's filename.
+        """
+        self._stream, self._encoding, self._base = stream, encoding, base
         self._mode, self._cached_get = None, None
 
     @property
@@ -96,6 +101,8 @@ class StreamingParser(object):
 
     def read(self, num=None):
         self.mode = 'stream'
+        if num is None:
+            return self._stream.read()
         return self._stream.read(num)
 
     def readline(self):
@@ -164,7 +171,7 @@ class StreamingSerializer(object):
                 triples = results.get_triples()
                 fields, bindings, boolean = None, None, None
         # Assume iterable-ish things are graphs / lists of triples
-        elif isinstance(results, (list, types.GeneratorType, rdflib.ConjunctiveGraph)):
+        elif isinstance(results, (list, types.GeneratorType, rdflib.ConjunctiveGraph, CompactGraph)):
             sparql_results_type, triples = 'graph', results
         elif hasattr(results, '__iter__'):
             sparql_results_type, triples = 'graph', results
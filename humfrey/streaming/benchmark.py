@@ -0,0 +1,325 @@
+"""
+Benchmarks for the streaming parsers and serializers.
+
+Run as:
+
+    DJANGO_SETTINGS_MODULE=... python -m humfrey.streaming.benchmark [options]
+
+For each parser and serializer in humfrey.streaming.formats this generates a
+synthetic resultset or graph, and measures throughput, time to the first
+result (or first chunk of output) and peak memory use. It also compares
+building and querying request-scoped graphs using rdflib and CompactGraph.
+Each case runs in its own process so that memory used by one doesn't count
+against another.
+
+Results are written as JSON, so that they can be compared over time. Use
+--help for the options controlling the size and shape of the data.
+"""
+
+import argparse
+import datetime
+import os
+import platform
+import resource
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+import rdflib
+
+try: # rdflib 3.0
+    from rdflib.plugins.parsers.ntriples import NTriplesParser as RDFLibNTriplesParser
+except ImportError: # rdflib 2.4.x
+    from rdflib.syntax.parsers.ntriples import NTriplesParser as RDFLibNTriplesParser
+
+from humfrey.sparql.results import Result, SparqlResultList
+from humfrey.utils import json
+from humfrey.utils.graph import CompactGraph
+from humfrey.utils.namespaces import NS
+
+from . import formats
+
+def generate_resultset(rows, fields=4, uri_ratio=0.5, distinct=1000):
+    """
+    Returns a SparqlResultList of rows results.
+
+    uri_ratio is the proportion of fields bound to URIs, rather than literals;
+    the last field is left unbound in every fourth row. URIs are drawn from a
+    pool of the given number of distinct values.
+    """
+    names = tuple('field%d' % i for i in range(fields))
+    uri_fields = int(round(fields * uri_ratio))
+    result = Result(names)
+    results = SparqlResultList(names)
+    for i in xrange(rows):
+        values = []
+        for j in range(fields):
+            if j == fields - 1 and i % 4 == 3:
+                values.append(None)
+            elif j < uri_fields:
+                values.append(rdflib.URIRef('http://example.org/id/%d/%d' % (j, (i * (j + 1)) % distinct)))
+            elif j % 2:
+                values.append(rdflib.Literal(i * j, datatype=NS.xsd.integer))
+            else:
+                values.append(rdflib.Literal('Label "%d" for %d' % (j, i), lang='en'))
+        results.append(result(values))
+    return results
+
+def generate_graph(triples, fanout=10, types=7):
+    """
+    Returns a list of triples, with fanout triples per subject, roughly like a
+    typical store dump.
+    """
+    graph = []
+    for i in xrange(triples):
+        subject = rdflib.URIRef('http://example.org/id/%d' % (i // fanout))
+        kind = i % 10
+        if kind == 0:
+            graph.append((subject, NS.rdf.type, rdflib.URIRef('http://example.org/vocab/Type%d' % (i % types))))
+        elif kind < 4:
+            graph.append((subject, NS.rdfs.label, rdflib.Literal('Label "%d"' % i, lang='en')))
+        elif kind < 6:
+            graph.append((subject, rdflib.URIRef('http://example.org/vocab/value'), rdflib.Literal(i, datatype=NS.xsd.integer)))
+        elif kind < 8:
+            graph.append((subject, rdflib.URIRef('http://example.org/vocab/related'),
+                          rdflib.URIRef('http://example.org/id/%d' % (i * 7 % triples // fanout))))
+        else:
+            graph.append((subject, rdflib.URIRef('http://example.org/vocab/node'), rdflib.BNode('b%d' % i)))
+    return graph
+
+def _rdflib_ntriples(stream):
+    # How NTriplesParser used to work, for comparison
+    class Sink(object):
+        def triple(self, s, p, o):
+            triples.append((s, p, o))
+    triples = []
+    parser = RDFLibNTriplesParser(Sink())
+    while True:
+        parser.line = stream.readline().strip().decode('utf-8')
+        if not parser.line:
+            break
+        parser.parseline()
+        for triple in triples:
+            yield triple
+        del triples[:]
+
+def _generate(results_type, options):
+    if results_type == 'resultset':
+        return generate_resultset(options['rows'], options['fields'], options['uri_ratio'])
+    else:
+        return generate_graph(options['triples'], options['fanout'])
+
+def _peak_memory():
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _measure(get_items):
+    """
+    Calls get_items and consumes the iterator it returns, returning (count,
+    size, first_item, total) times.
+    """
+    start = time.time()
+    count, size, first = 0, 0, None
+    for item in get_items():
+        if first is None:
+            first = time.time() - start
+        count += 1
+        if isinstance(item, basestring):
+            size += len(item)
+    return count, size, first, time.time() - start
+
+def _get_parser_items(format_spec, data):
+    parser = format_spec['parser'](StringIO.StringIO(data))
+    if parser.get_sparql_results_type() == 'resultset':
+        return parser.get_bindings()
+    else:
+        return parser.get_triples()
+
+def prepare_parser_input(format_spec, results_type, options, filename):
+    with open(filename, 'wb') as f:
+        format_spec['serializer'](_generate(results_type, options)).serialize(f)
+
+def run_parser(format_spec, results_type, options, filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    # Only count memory used while parsing
+    baseline = _peak_memory()
+    if format_spec.get('reference'):
+        get_items = lambda: format_spec['reference'](StringIO.StringIO(data))
+    else:
+        get_items = lambda: _get_parser_items(format_spec, data)
+    count, _, first, total = _measure(get_items)
+    return {'items': count,
+            'bytes': len(data),
+            'seconds': total,
+            'first_item_seconds': first,
+            'items_per_second': count / total if total else None,
+            'peak_memory_kb': _peak_memory() - baseline}
+
+def run_serializer(format_spec, results_type, options, filename=None):
+    data = _generate(results_type, options)
+    baseline = _peak_memory()
+    _, size, first, total = _measure(lambda: iter(format_spec['serializer'](data)))
+    return {'items': len(data),
+            'bytes': size,
+            'seconds': total,
+            'first_item_seconds': first,
+            'items_per_second': len(data) / total if total else None,
+            'peak_memory_kb': _peak_memory() - baseline}
+
+def run_graph(graph_spec, results_type, options, filename=None):
+    """
+    Builds a graph, and then looks up each subject's label and properties,
+    roughly as a page listing each subject would.
+    """
+    triples = generate_graph(options['triples'], options['fanout'])
+    subjects = sorted(set(s for s, p, o in triples))
+    label = NS.rdfs.label
+    baseline = _peak_memory()
+    start = time.time()
+    graph = graph_spec['graph']()
+    graph += triples
+    build = time.time() - start
+    start = time.time()
+    for subject in subjects:
+        list(graph.objects(subject, label))
+        list(graph.predicate_objects(subject))
+    lookup = time.time() - start
+    return {'items': len(triples),
+            'bytes': None,
+            'seconds': build + lookup,
+            'build_seconds': build,
+            'lookup_seconds': lookup,
+            'first_item_seconds': None,
+            'items_per_second': len(triples) / build if build else None,
+            'peak_memory_kb': _peak_memory() - baseline}
+
+def run_case(operation, format_spec, results_type, options, filename=None):
+    """
+    Runs a benchmark case in a fresh interpreter, returning its results.
+
+    We don't fork, as the peak memory use of the child would then start off
+    at whatever the parent's was.
+    """
+    case = {'operation': operation,
+            'format': format_spec['format'],
+            'results_type': results_type,
+            'options': options,
+            'filename': filename}
+    process = subprocess.Popen([sys.executable, '-m', 'humfrey.streaming.benchmark', '--run-case', json.dumps(case)],
+                               stdout=subprocess.PIPE)
+    stdout, _ = process.communicate()
+    try:
+        return json.loads(stdout.splitlines()[-1])
+    except (ValueError, IndexError):
+        return {'error': "Benchmark process exited with code %d" % process.returncode}
+
+def _run_case(case):
+    format_spec = get_formats()[case['format']]
+    func = {'parse': run_parser,
+            'serialize': run_serializer,
+            'build': run_graph}[case['operation']]
+    try:
+        result = func(format_spec, case['results_type'], case['options'], case['filename'])
+    except Exception:
+        result = {'error': traceback.format_exc()}
+    sys.stdout.write(json.dumps(result) + '\n')
+
+def get_formats():
+    """
+    Returns format specifications by name, including the previous,
+    rdflib-based, N-Triples parser for comparison.
+    """
+    specs = dict((f['format'], f) for f in formats)
+    specs['nt-rdflib'] = dict(specs['nt'], format='nt-rdflib', name='NTriples (rdflib)',
+                              reference=_rdflib_ntriples)
+    for name, graph in (('rdflib', rdflib.ConjunctiveGraph), ('compact', CompactGraph)):
+        specs['graph-' + name] = {'format': 'graph-' + name,
+                                  'name': graph.__name__,
+                                  'media_type': None,
+                                  'supported_results_types': ('graph',),
+                                  'graph': graph}
+    return specs
+
+def get_cases(format_names=None):
+    """
+    Yields (operation, format_spec, results_type) for each benchmark case.
+    """
+    for name, format_spec in sorted(get_formats().items()):
+        if format_names and name not in format_names:
+            continue
+        for results_type in ('resultset', 'graph'):
+            if results_type not in format_spec['supported_results_types']:
+                continue
+            if format_spec.get('graph'):
+                yield 'build', format_spec, results_type
+            if format_spec.get('parser'):
+                yield 'parse', format_spec, results_type
+            if format_spec.get('serializer') and not format_spec.get('reference'):
+                yield 'serialize', format_spec, results_type
+
+def _format_result(result):
+    line = '%(operation)-9s %(format)-13s %(results_type)-9s ' % result
+    if 'error' in result:
+        return line + 'failed\n' + result['error']
+    return line + '%8.3fs %10s/s  first %s  %8dkB' % (result['seconds'],
+                                                     '%.0f' % result['items_per_second'] if result['items_per_second'] else '-',
+                                                     '%.4fs' % result['first_item_seconds'] if result['first_item_seconds'] is not None else '-',
+                                                     result['peak_memory_kb'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark humfrey.streaming parsers and serializers.")
+    parser.add_argument('--rows', type=int, default=50000, help="number of rows in resultsets")
+    parser.add_argument('--fields', type=int, default=4, help="number of fields in resultsets")
+    parser.add_argument('--uri-ratio', type=float, default=0.5, help="proportion of resultset fields bound to URIs")
+    parser.add_argument('--triples', type=int, default=50000, help="number of triples in graphs")
+    parser.add_argument('--fanout', type=int, default=10, help="number of triples per subject in graphs")
+    parser.add_argument('--format', action='append', dest='formats', metavar='FORMAT',
+                        help="only benchmark this format (e.g. srx, nt, graph-compact); may be repeated")
+    parser.add_argument('--output', '-o', help="file to write JSON results to (default: stdout)")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        _run_case(json.loads(args.run_case))
+        return
+
+    options = {'rows': args.rows, 'fields': args.fields, 'uri_ratio': args.uri_ratio,
+               'triples': args.triples, 'fanout': args.fanout}
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for operation, format_spec, results_type in get_cases(args.formats):
+            filename = None
+            if operation == 'parse':
+                filename = os.path.join(directory, '%s.%s' % (format_spec['format'], results_type))
+                prepare_parser_input(format_spec, results_type, options, filename)
+            result = run_case(operation, format_spec, results_type, options, filename)
+            result.update({'operation': operation,
+                           'format': format_spec['format'],
+                           'name': format_spec['name'],
+                           'media_type': format_spec['media_type'],
+                           'results_type': results_type})
+            results.append(result)
+            sys.stderr.write(_format_result(result) + '\n')
+    finally:
+        shutil.rmtree(directory)
+
+    report = {'date': datetime.datetime.utcnow().isoformat() + 'Z',
+              'python': platform.python_version(),
+              'rdflib': rdflib.__version__,
+              'options': options,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -9,29 +9,36 @@ import re
 
 from rdflib import URIRef
 
+from . import interning
+
 def encode(char):
     return '%%%02X' % ord(char.group(0))
 
 characters_needing_encoding = re.compile(ur'[\^<>"{}|`\\\x00-\x20]', re.M)
-subn_characters = characters_needing_encoding.subn
+
+# Coerced IRIs by their original value. Repeated IRIs don't need to be run
+# through the regular expression again, and end up sharing a single URIRef.
+_coerced = interning.InternTable('coerced-uri', lambda iri: interning.uris(characters_needing_encoding.sub(encode, iri)))
 
 def coerce_triple_iris(triples):
     """
     Replaces forbidden characters with their percent-encoded equivalents
     """
-    # This is a bit verbose in order to be speedy. We use subn so we only
-    # construct a new URIRef iff characters were actually replaced.
+    # This is a bit verbose in order to be speedy. Looking things up in a local
+    # dictionary is much quicker than calling into the shared table.
+    coerced = {}
+    def coerce(iri):
+        iri = unicode(iri)
+        if len(coerced) >= interning.SIZE:
+            coerced.clear()
+        term = coerced[iri] = _coerced(iri)
+        return term
+
     for s, p, o in triples:
         if isinstance(s, URIRef):
-            new, n = subn_characters(encode, s)
-            if n > 0:
-                s = URIRef(new)
+            s = coerced.get(unicode(s)) or coerce(s)
         if isinstance(p, URIRef):
-            new, n = subn_characters(encode, p)
-            if n > 0:
-                p = URIRef(new)
+            p = coerced.get(unicode(p)) or coerce(p)
         if isinstance(o, URIRef):
-            new, n = subn_characters(encode, o)
-            if n > 0:
-                o = URIRef(new)
+            o = coerced.get(unicode(o)) or coerce(o)
         yield s, p, o
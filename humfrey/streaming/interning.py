@@ -0,0 +1,110 @@
+"""
+Shared tables of rdflib terms, so that parsers can reuse term objects.
+
+The same predicates, types and datatypes turn up over and over again in query
+results and dumps; looking them up here means we only construct (and hold in
+memory) one object for each.
+
+Each table is bounded. Once it reaches its maximum size it is demoted to a
+second generation and a new, empty table is started; entries found in the
+second generation are promoted back. This keeps frequently-used terms around
+without the bookkeeping of a true LRU.
+
+Tables are shared between threads. Dictionary operations are atomic, so the
+worst that can happen is that two equal term objects get created; hit and miss
+counts are approximate for the same reason.
+"""
+
+import rdflib
+from django.conf import settings
+
+from humfrey.utils.statsd import statsd
+
+# Number of entries in each generation of each table
+SIZE = getattr(settings, 'STREAMING_INTERN_SIZE', 100000)
+# Only typed literals (numbers, dates, booleans, etc.) shorter than this are
+# interned; others are unlikely to repeat often enough to be worth it.
+MAX_LITERAL_LENGTH = 64
+# Report hit and miss counts to statsd after this many misses
+REPORT_INTERVAL = 100000
+
+_tables = []
+
+class InternTable(object):
+    def __init__(self, name, factory=None, maxsize=SIZE):
+        self.name, self.factory, self.maxsize = name, factory, maxsize
+        self._current, self._previous = {}, {}
+        self.hits, self.misses = 0, 0
+        self._reported_hits, self._reported_misses = 0, 0
+        _tables.append(self)
+
+    def __call__(self, key):
+        """
+        Returns the term for key, creating it with factory if necessary.
+        """
+        term = self._current.get(key)
+        if term is not None:
+            self.hits += 1
+            return term
+        term = self.get(key)
+        if term is None:
+            term = self.factory(key)
+            self.add(key, term)
+        return term
+
+    def get(self, key):
+        """
+        Returns the term for key, or None.
+        """
+        term = self._current.get(key)
+        if term is None:
+            term = self._previous.get(key)
+            if term is None:
+                self.misses += 1
+                if self.misses % REPORT_INTERVAL == 0:
+                    self.report()
+                return None
+            self.add(key, term)
+        self.hits += 1
+        return term
+
+    def add(self, key, term):
+        current = self._current
+        if len(current) >= self.maxsize:
+            self._previous, self._current = current, {}
+        self._current[key] = term
+
+    def clear(self):
+        self._current, self._previous = {}, {}
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def report(self):
+        hits, misses = self.hits, self.misses
+        statsd.incr('humfrey.streaming.intern.%s.hit' % self.name, hits - self._reported_hits)
+        statsd.incr('humfrey.streaming.intern.%s.miss' % self.name, misses - self._reported_misses)
+        self._reported_hits, self._reported_misses = hits, misses
+
+uris = InternTable('uri', rdflib.URIRef)
+literals = InternTable('literal', lambda key: rdflib.Literal(key[0], lang=key[1], datatype=key[2]))
+
+def literal(value, lang=None, datatype=None):
+    if datatype is None or len(value) > MAX_LITERAL_LENGTH:
+        return rdflib.Literal(value, lang=lang, datatype=datatype)
+    return literals((value, lang, datatype))
+
+def stats():
+    """
+    Returns a dictionary of table names to (hits, misses, hit_rate) tuples.
+    """
+    return dict((table.name, (table.hits, table.misses, table.hit_rate)) for table in _tables)
+
+def report():
+    """
+    Sends hit and miss counts since the last report to statsd.
+    """
+    for table in _tables:
+        table.report()
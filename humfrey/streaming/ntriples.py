@@ -1,16 +1,51 @@
+import re
+
+import rdflib
+
 try: # rdflib 3.0
-    from rdflib.plugins.parsers.ntriples import NTriplesParser as NTriplesParser_, ParseError
+    from rdflib.plugins.parsers.ntriples import ParseError
 except ImportError: # rdflib 2.4.x
-    from rdflib.syntax.parsers.ntriples import NTriplesParser as NTriplesParser_, ParseError
+    from rdflib.syntax.parsers.ntriples import ParseError
 
+from . import interning
 from .base import StreamingParser, StreamingSerializer
 
 __all__ = ['NTriplesParser', 'NTriplesSerializer']
 
+# Matches an entire triple on a line. The groups are: subject URI, subject
+# bnode, predicate URI, object URI, object bnode, literal, language, datatype.
+_bnode = r'_:([A-Za-z0-9_\-]+(?:\.+[A-Za-z0-9_\-]+)*)'
+_triple_re = re.compile(r'[ \t]*(?:<([^>]*)>|' + _bnode + r')'
+                        r'[ \t]*<([^>]*)>'
+                        r'[ \t]*(?:<([^>]*)>|' + _bnode + r'|'
+                        r'"((?:[^"\\]|\\.)*)"(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^<([^>]*)>)?)'
+                        r'[ \t]*\.[ \t\r]*(?:#.*)?$')
+_escape_re = re.compile(r'\\(?:u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+_escapes = {u't': u'\t', u'n': u'\n', u'r': u'\r', u'b': u'\b', u'f': u'\f',
+            u'"': u'"', u"'": u"'", u'\\': u'\\'}
+
+def _unescape_match(match):
+    escape = match.group(0)
+    if escape[1] in 'uU':
+        return escape.decode('unicode-escape')
+    try:
+        return _escapes[escape[1]]
+    except KeyError:
+        raise ParseError("Invalid escape: %r" % escape)
+
+def _unescape(value):
+    value = value.decode('utf-8')
+    if '\\' in value:
+        value = _escape_re.sub(_unescape_match, value)
+    return value
+
 class NTriplesParser(StreamingParser):
     media_type = 'text/plain'
     format_type = 'graph'
 
+    # Bytes to read from the stream at a time
+    chunk_size = 64 * 1024
+
     def get_sparql_results_type(self):
         self.mode = 'parse'
         return 'graph'
@@ -24,28 +59,72 @@ class NTriplesParser(StreamingParser):
     def get_boolean(self):
         raise TypeError("This is a graph parser")
 
-    def get_triples(self):
-        self.mode = 'parse'
-        parser = NTriplesParser_()
-        parser.sink = self.Sink(self)
-        self.triple = None
+    def _get_lines(self):
+        read, remainder = self._stream.read, ''
         while True:
-            parser.line = self._stream.readline().strip().decode('utf-8')
-            if not parser.line:
+            chunk = read(self.chunk_size)
+            if not chunk:
                 break
+            lines = (remainder + chunk).split('\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line
+        if remainder:
+            yield remainder
+
+    def get_triples(self):
+        self.mode = 'parse'
+        match, unescape, Literal = _triple_re.match, _unescape, rdflib.Literal
+        intern_uri, BNode = interning.uris, rdflib.BNode
+
+        # Terms by their N-Triples representation, so that we only need to
+        # unescape and look up each in the shared tables once per parse.
+        # Blank node labels are only meaningful within a document, so as
+        # rdflib does, each gets a fresh BNode for this parse. That table
+        # can't be bounded without splitting a node in two.
+        uris, bnodes, literals = {}, {}, {}
+        def uri(value):
+            try:
+                return uris[value]
+            except KeyError:
+                if len(uris) >= interning.SIZE:
+                    uris.clear()
+                term = uris[value] = intern_uri(unescape(value))
+                return term
+        def bnode(value):
             try:
-                parser.parseline()
-            except ParseError:
-                raise ParseError("Invalid line: %r" % parser.line)
-            if self.triple:
-                yield self.triple
-                self.triple = None
-
-    class Sink(object):
-        def __init__(self, source):
-            self.source = source
-        def triple(self, subject, predicate, object):
-            self.source.triple = subject, predicate, object
+                return bnodes[value]
+            except KeyError:
+                term = bnodes[value] = BNode()
+                return term
+        def literal(value, language, datatype):
+            # As interning.literal(), only intern short typed literals
+            if datatype is None or len(value) > interning.MAX_LITERAL_LENGTH:
+                return Literal(unescape(value), lang=language)
+            key = value, datatype
+            term = literals.get(key)
+            if term is None:
+                if len(literals) >= interning.SIZE:
+                    literals.clear()
+                term = literals[key] = Literal(unescape(value), datatype=uri(datatype))
+            return term
+
+        for line in self._get_lines():
+            m = match(line)
+            if m is None:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                raise ParseError("Invalid line: %r" % line)
+            s, s_bnode, p, o, o_bnode, value, language, datatype = m.groups()
+            subject = uri(s) if s is not None else bnode(s_bnode)
+            if o is not None:
+                object = uri(o)
+            elif o_bnode is not None:
+                object = bnode(o_bnode)
+            else:
+                object = literal(value, language, datatype)
+            yield subject, uri(p), object
 
 
 class NTriplesSerializer(StreamingSerializer):
@@ -2,18 +2,54 @@ import Queue
 import re
 import sys
 import threading
+from xml.sax.expatreader import ExpatLocator
 from xml.sax.saxutils import quoteattr, escape
 
 try: # rdflib 3.0
-    from rdflib.plugins.parsers.rdfxml import RDFXMLParser as RDFXMLParser_
+    from rdflib.plugins.parsers.rdfxml import RDFXMLParser as RDFXMLParser_, create_parser
 except ImportError: # rdflib 2.4.x
-    from rdflib.syntax.parsers.RDFXMLParser import RDFXMLParser as RDFXMLParser_
+    from rdflib.syntax.parsers.RDFXMLParser import RDFXMLParser as RDFXMLParser_, create_parser
 from rdflib import Graph, URIRef, Literal, BNode
 
-from humfrey.utils.namespaces import NS
+from humfrey.utils.namespaces import NS, get_namespace_index
 
 from .base import StreamingParser, StreamingSerializer
-from .wrapper import get_rdflib_parser
+from .wrapper import get_rdflib_parser, RDFLibParser
+
+class RDFXMLParser(RDFLibParser):
+    """
+    Parses RDF/XML by feeding rdflib's SAX handler a chunk at a time, so
+    that triples can be handed back as they're found without needing a
+    separate parsing thread.
+    """
+    plugin_name = 'xml'
+    media_type = 'application/rdf+xml'
+    rdflib_parser = RDFXMLParser_
+    parser_args = ()
+    parser_kwargs = {'preserve_bnode_ids': True}
+
+    # Bytes to feed to the parser at a time
+    chunk_size = 64 * 1024
+
+    def _parse(self, graph):
+        source = self._get_input_source()
+        parser = create_parser(source, graph)
+        parser.getContentHandler().preserve_bnode_ids = self.parser_kwargs.get('preserve_bnode_ids')
+        # As ExpatParser.parse() would, so that errors report line numbers
+        # and relative references are resolved against the system ID. The
+        # expat parser itself is created by the first call to feed().
+        parser._source = source
+        parser.getContentHandler().setDocumentLocator(ExpatLocator(parser))
+
+        stream = source.getByteStream()
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield
+        parser.close()
+        yield
 
 class RDFXMLSerializer(StreamingSerializer):
     localpart = re.compile(ur'[A-Za-z_][A-Za-z_\d\-]+$')
@@ -21,9 +57,25 @@ class RDFXMLSerializer(StreamingSerializer):
     media_type = 'application/rdf+xml'
     format_type = 'graph'
 
+    def _get_start_tag(self, p):
+        """
+        Returns the start of the element for a predicate, and its tag name.
+        """
+        for uri, prefix in get_namespace_index().matches(p):
+            if self.localpart.match(p[len(uri):]):
+                tag_name = '%s:%s' % (prefix, p[len(uri):])
+                return '    <%s' % tag_name.encode('utf-8'), tag_name.encode('utf-8')
+        match = self.localpart.search(p)
+        tag_name = p[match.start():]
+        return ('    <%s xmlns=%s' % (tag_name.encode('utf-8'),
+                                     quoteattr(p[:match.start()]).encode('utf-8')),
+                tag_name.encode('utf-8'))
+
     def _iter(self, sparql_results_type, fields, bindings, boolean, triples):
         namespaces = sorted((NS).items())
         last_subject = None
+        # Start tags by predicate, as there are usually only a few
+        start_tags = {}
 
         # XML declaration, root element and namespaces
         yield '<?xml version="1.0" encoding="utf-8"?>\n'
@@ -47,23 +99,19 @@ class RDFXMLSerializer(StreamingSerializer):
 
             if not isinstance(p, URIRef):
                 raise AssertionError("Unexpected predicate term: %r (%r)" % (type(p), p))
-            for prefix, uri in namespaces:
-                if p.startswith(uri) and self.localpart.match(p[len(uri):]):
-                    tag_name = '%s:%s' % (prefix, p[len(uri):])
-                    yield '    <%s' % tag_name.encode('utf-8')
-                    break
-            else:
-                match = self.localpart.search(p)
-                tag_name = p[match.start():]
-                yield '    <%s xmlns=%s' % (tag_name.encode('utf-8'),
-                                             quoteattr(p[:match.start()]).encode('utf-8'))
+            key = unicode(p)
+            start_tag = start_tags.get(key)
+            if start_tag is None:
+                start_tag = start_tags[key] = self._get_start_tag(p)
+            start_tag, tag_name = start_tag
+            yield start_tag
 
             if isinstance(o, Literal):
                 if o.language:
                     yield ' xml:lang=%s' % quoteattr(o.language).encode('utf-8')
                 if o.datatype:
                     yield ' rdf:datatype=%s' % quoteattr(o.datatype).encode('utf-8')
-                yield '>%s</%s>\n' % (escape(o).encode('utf-8'), tag_name.encode('utf-8'))
+                yield '>%s</%s>\n' % (escape(o).encode('utf-8'), tag_name)
             elif isinstance(o, BNode):
                 yield ' rdf:nodeID=%s/>\n' % quoteattr(o).encode('utf-8')
             elif isinstance(o, URIRef):
@@ -3,50 +3,222 @@ try:
 except ImportError:
     from StringIO import StringIO
 
+from json import JSONDecoder
+from json.decoder import scanstring
+import re
+
 import rdflib
 
 from humfrey.sparql.results import Result
 from humfrey.utils import json
 
+from . import interning
 from .base import StreamingParser, StreamingSerializer
 
-_type_mapping = {'uri': lambda v: rdflib.URIRef(v['value']),
+def _literal(value):
+    # SPARQL 1.1 uses 'literal' with a datatype; SPARQL 1.0 used 'typed-literal'.
+    return interning.literal(value['value'],
+                             lang=value.get('xml:lang'),
+                             datatype=value.get('datatype'))
+
+_type_mapping = {'uri': lambda v: interning.uris(v['value']),
                  'bnode': lambda v: rdflib.BNode(v['value']),
-                 'literal': lambda v: rdflib.Literal(v['value'], datatype=v.get('xml:lang')),
-                 'typed-literal': lambda v: rdflib.Literal(v['value'], language=v['datatype'])}
+                 'literal': _literal,
+                 'typed-literal': _literal}
+
+_whitespace_re = re.compile(r'[ \t\n\r]*')
+# Matches the end of an array element, up to the start of the next one. We
+# don't accept the end of the buffer, as there may be more whitespace to come.
+_separator_re = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*(?=[^ \t\n\r])')
 
 class SRJParser(StreamingParser):
+    """
+    Parses SPARQL Results JSON incrementally.
+
+    Rather than loading the whole document, we walk the outer structure
+    ourselves and use the json module to decode each binding as it arrives, so
+    memory use doesn't grow with the size of the resultset.
+    """
     media_type = 'application/sparql-results+json'
     format_type = 'sparql-results'
 
+    # Bytes to read from the stream at a time
+    chunk_size = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super(SRJParser, self).__init__(*args, **kwargs)
+        self._buffer, self._pos, self._eof = '', 0, False
+        self._decoder = JSONDecoder(encoding=self._encoding)
+
+    def _fill(self):
+        """
+        Reads more of the stream into the buffer, returning False at the end.
+        """
+        if self._eof:
+            return False
+        chunk = self._stream.read(self.chunk_size)
+        self._buffer, self._pos = self._buffer[self._pos:] + chunk, 0
+        self._eof = not chunk
+        return not self._eof
+
+    def _peek(self):
+        while True:
+            self._pos = _whitespace_re.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of SPARQL results JSON")
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError("Expected %r at %r" % (char, self._buffer[self._pos:self._pos+20]))
+        self._pos += 1
+
+    def _string(self):
+        self._expect('"')
+        while True:
+            try:
+                value, end = scanstring(self._buffer, self._pos, self._encoding)
+            except ValueError:
+                if not self._fill():
+                    raise
+            else:
+                self._pos = end
+                return value
+
+    def _value(self):
+        self._peek()
+        scan_once = self._decoder.scan_once
+        while True:
+            try:
+                value, end = scan_once(self._buffer, self._pos)
+            except (StopIteration, ValueError):
+                if not self._fill():
+                    raise ValueError("Invalid SPARQL results JSON at %r" % self._buffer[self._pos:self._pos+20])
+            else:
+                # A number could carry on into the next chunk.
+                if end == len(self._buffer) and self._fill():
+                    continue
+                self._pos = end
+                return value
+
+    def _members(self):
+        """
+        Yields the keys of an object, leaving the caller to consume each value.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._string()
+            self._expect(':')
+            yield key
+            if self._peek() == ',':
+                self._pos += 1
+            else:
+                self._expect('}')
+                return
+
+    def _array(self):
+        """
+        Yields each value in an array.
+        """
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        scan_once, separator = self._decoder.scan_once, _separator_re.match
+        while True:
+            # Fast path: decode the next value and its trailing separator
+            # straight from the buffer.
+            buffer, pos = self._buffer, self._pos
+            try:
+                value, end = scan_once(buffer, pos)
+            except (StopIteration, ValueError):
+                match = None
+            else:
+                match = separator(buffer, end)
+            if match:
+                self._pos = match.end()
+                yield value
+                if match.group(1) == ']':
+                    return
+                continue
+
+            # Otherwise we've reached the end of the buffer.
+            yield self._value()
+            if self._peek() == ',':
+                self._pos += 1
+                self._peek()
+            else:
+                self._expect(']')
+                return
+
+    def _events(self):
+        """
+        Yields ('head', ...), ('boolean', ...) and ('bindings', iterator)
+        events. 'head' always comes before 'bindings', even if it appears later
+        in the document. The bindings iterator must be exhausted before asking
+        for the next event.
+        """
+        head, pending = None, None
+        for key in self._members():
+            if key == 'head':
+                head = self._value()
+                yield 'head', head
+            elif key == 'boolean':
+                yield 'boolean', self._value()
+            elif key == 'results' and head is None:
+                # We can't construct Results without knowing the fields, so
+                # we'll have to hold on to them until the head turns up.
+                pending = self._value().get('bindings', [])
+            elif key == 'results':
+                for key in self._members():
+                    if key == 'bindings':
+                        yield 'bindings', self._array()
+                    else:
+                        self._value()
+            else:
+                self._value()
+        if pending is not None:
+            yield 'bindings', iter(pending)
+
     def get_sparql_results_type(self):
         if hasattr(self, '_sparql_results_type'):
             return self._sparql_results_type
         self.mode = 'parse'
-        self._data = json.load(self._stream, self._encoding)
-        if 'boolean' in self._data:
-            self._sparql_results_type = 'boolean'
+        self._head = {}
+        for event, value in self._events():
+            if event == 'head':
+                self._head = value
+            elif event == 'boolean':
+                self._sparql_results_type, self._boolean = 'boolean', value
+                break
+            elif event == 'bindings':
+                self._sparql_results_type, self._bindings = 'resultset', value
+                break
         else:
-            self._sparql_results_type = 'resultset'
+            raise ValueError("Neither a boolean nor a resultset")
         return self._sparql_results_type
 
     def get_fields(self):
         if self.get_sparql_results_type() == 'resultset':
-            return self._data['head']['vars']
+            return self._head.get('vars', ())
         else:
             raise TypeError("This isn't a resultset.")
 
     def get_bindings(self):
-        fields = self.get_fields()
+        result, type_mapping = Result(self.get_fields()), _type_mapping
 
-        for binding in self._data['results']['bindings']:
+        for binding in self._bindings:
             for name, value in binding.iteritems():
-                binding[name] = _type_mapping[value['type']](value)
-            yield Result(fields, binding)
+                binding[name] = type_mapping[value['type']](value)
+            yield result(binding)
 
     def get_boolean(self):
         if self.get_sparql_results_type() == 'boolean':
-            return self._data['boolean']
+            return self._boolean
         else:
             raise TypeError("This isn't a boolean result.")
 
@@ -1,20 +1,20 @@
+import collections
 import logging
-import Queue
-import threading
 from xml.sax.saxutils import escape
 from xml.parsers import expat
 
 import rdflib
 
 from humfrey.sparql.results import Result
+from . import interning
 from .base import StreamingParser, StreamingSerializer
 
 logger = logging.getLogger(__name__)
 
 class SRXParser(StreamingParser):
     class SRXContentHandler(object):
-        def __init__(self, queue):
-            self.queue = queue
+        def __init__(self, events):
+            self.events = events
             self.fields = []
             self.result = None
             self.srx_ns = 'http://www.w3.org/2005/sparql-results#'
@@ -23,10 +23,10 @@ class SRXParser(StreamingParser):
 
         def start_element(self, name, attrs):
             if name == (self.srx_ns + ' results'):
-                self.queue.put('resultset')
-                self.queue.put(tuple(self.fields))
+                self.events.append('resultset')
+                self.events.append(tuple(self.fields))
             elif name == (self.srx_ns + ' boolean'):
-                self.queue.put('boolean')
+                self.events.append('boolean')
             elif name == (self.srx_ns + ' variable'):
                 self.fields.append(attrs['name'])
             elif name == (self.srx_ns + ' result'):
@@ -34,7 +34,6 @@ class SRXParser(StreamingParser):
             elif name == (self.srx_ns + ' binding'):
                 self.binding_name = attrs['name']
             elif name == (self.srx_ns + ' literal'):
-                # rdflib will turn the datatype into a URIRef for us
                 self.literal_kwargs = {'lang': attrs.get(self.xml_ns + ' lang'),
                                        'datatype': attrs.get('datatype')}
 
@@ -43,19 +42,19 @@ class SRXParser(StreamingParser):
         def end_element(self, name):
             content = ''.join(self.content)
             if name == (self.srx_ns + ' result'):
-                self.queue.put(self.result)
+                self.events.append(self.result)
                 self.result = None
             elif name == (self.srx_ns + ' binding'):
                 self.result[self.binding_name] = self.binding
                 self.binding_name, self.binding = None, None
             elif name == (self.srx_ns + ' boolean'):
-                self.queue.put(content == u'true')
+                self.events.append(content == u'true')
             elif name == (self.srx_ns + ' uri'):
-                self.binding = rdflib.URIRef(content)
+                self.binding = interning.uris(content)
             elif name == (self.srx_ns + ' bnode'):
                 self.binding = rdflib.BNode(content)
             elif name == (self.srx_ns + ' literal'):
-                self.binding = rdflib.Literal(content, **self.literal_kwargs)
+                self.binding = interning.literal(content, **self.literal_kwargs)
 
         def char_data(self, data):
             self.content.append(data)
@@ -63,40 +62,51 @@ class SRXParser(StreamingParser):
     media_type = 'application/sparql-results+xml'
     format_type = 'sparql-results'
 
+    # Bytes to feed to expat at a time
+    chunk_size = 64 * 1024
+
+    def _feed(self):
+        """
+        Feeds the next chunk of the stream to expat, returning False once the
+        whole stream has been parsed.
+        """
+        if self._finished:
+            return False
+        chunk = self._stream.read(self.chunk_size)
+        self._parser.Parse(chunk, not chunk)
+        self._finished = not chunk
+        return True
+
+    def _next_event(self):
+        while not self._events:
+            if not self._feed():
+                raise ValueError("Unexpected end of SPARQL results XML")
+        return self._events.popleft()
+
     def get_sparql_results_type(self):
         if hasattr(self, '_sparql_results_type'):
             return self._sparql_results_type
         self.mode = 'parse'
 
+        # Parsing happens in this thread as results are asked for; the
+        # handler leaves events in this deque for us to pick up.
         self._finished = False
-
-        self._queue = Queue.Queue(maxsize=128)
-        self._thread = threading.Thread(target=self._parse)
-        self._thread.start()
-
-        self._sparql_results_type = self._queue.get()
+        self._events = collections.deque()
+        handler = self.SRXContentHandler(self._events)
+        self._parser = expat.ParserCreate(namespace_separator=' ')
+        self._parser.StartElementHandler = handler.start_element
+        self._parser.EndElementHandler = handler.end_element
+        self._parser.CharacterDataHandler = handler.char_data
+
+        self._sparql_results_type = self._next_event()
         if self._sparql_results_type == 'resultset':
-            self._fields = self._queue.get()
+            self._fields = self._next_event()
         elif self._sparql_results_type == 'boolean':
-            self._boolean = self._queue.get()
+            self._boolean = self._next_event()
         else:
             raise AssertionError("Unexpected result type: {0}".format(self._sparql_results_type))
         return self._sparql_results_type
 
-    def _parse(self):
-        handler = self.SRXContentHandler(self._queue)
-        parser = expat.ParserCreate(namespace_separator=' ')
-        parser.StartElementHandler = handler.start_element
-        parser.EndElementHandler = handler.end_element
-        parser.CharacterDataHandler = handler.char_data
-
-        try:
-            parser.ParseFile(self._stream)
-        except Exception:
-            logger.exception("Failed to parse stream")
-        finally:
-            self._queue.put(None)
-
     def get_fields(self):
         if self.get_sparql_results_type() != 'resultset':
             raise TypeError("This isn't a resultset.")
@@ -104,15 +114,15 @@ class SRXParser(StreamingParser):
 
     def get_bindings(self):
         fields = self.get_fields()
-        if self._finished:
+        if getattr(self, '_get_bindings_called', False):
             raise AssertionError("This method can only be called once.")
-        while not self._finished:
-            value = self._queue.get()
-            if value is None:
-                self._finished = True
-            else:
-                yield Result(fields, value)
-        self._thread.join()
+        self._get_bindings_called = True
+        events, feed, result = self._events, self._feed, Result(fields)
+        while True:
+            while events:
+                yield result(events.popleft())
+            if not feed():
+                break
 
     def get_boolean(self):
         if self.get_sparql_results_type() != 'boolean':
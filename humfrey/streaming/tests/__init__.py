@@ -1,4 +1,8 @@
+from .benchmark import *
 from .csv import *
+from .interning import *
+from .ntriples import *
+from .rdfxml import *
 from .srj import *
 from .srx import *
 
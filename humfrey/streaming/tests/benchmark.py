@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+
+from .. import benchmark
+
+class BenchmarkTestCase(unittest.TestCase):
+    options = {'rows': 20, 'fields': 3, 'uri_ratio': 0.5, 'triples': 30, 'fanout': 10}
+
+    def testGenerate(self):
+        results = benchmark.generate_resultset(20, 3)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results.fields, ('field0', 'field1', 'field2'))
+        self.assertEqual(results[3].field2, None)
+        self.assertEqual(len(benchmark.generate_graph(30)), 30)
+
+    def testCases(self):
+        for operation, format_spec, results_type in benchmark.get_cases(['srx', 'nt', 'graph-compact']):
+            fd, filename = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                if operation == 'build':
+                    result = benchmark.run_graph(format_spec, results_type, self.options)
+                elif operation == 'parse':
+                    benchmark.prepare_parser_input(format_spec, results_type, self.options, filename)
+                    result = benchmark.run_parser(format_spec, results_type, self.options, filename)
+                else:
+                    result = benchmark.run_serializer(format_spec, results_type, self.options)
+            finally:
+                os.unlink(filename)
+            expected = self.options['rows' if results_type == 'resultset' else 'triples']
+            self.assertEqual(result['items'], expected)
+            if operation != 'build':
+                self.assertTrue(result['bytes'] > 0)
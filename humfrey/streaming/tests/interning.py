@@ -0,0 +1,45 @@
+import StringIO
+import unittest
+
+import rdflib
+
+from humfrey.utils.namespaces import NS
+
+from .. import interning, NTriplesParser
+from ..encoding import coerce_triple_iris
+
+class InternTableTestCase(unittest.TestCase):
+    def testInterned(self):
+        table = interning.InternTable('test', rdflib.URIRef)
+        a, b = table(u'http://example.org/'), table(u'http://example.org/')
+        self.assertTrue(a is b)
+        self.assertEqual((table.hits, table.misses), (1, 1))
+        self.assertEqual(table.hit_rate, 0.5)
+
+    def testBounded(self):
+        table = interning.InternTable('test', rdflib.URIRef, maxsize=2)
+        first = table(u'http://example.org/0')
+        for i in range(1, 5):
+            table(u'http://example.org/%d' % i)
+        self.assertTrue(len(table._current) <= 2 and len(table._previous) <= 2)
+        self.assertFalse(table(u'http://example.org/0') is first)
+        # Recently used terms survive being demoted.
+        self.assertTrue(table(u'http://example.org/4') is table(u'http://example.org/4'))
+
+    def testLiterals(self):
+        a = interning.literal(u'1', datatype=NS.xsd.integer)
+        self.assertTrue(a is interning.literal(u'1', datatype=NS.xsd.integer))
+        self.assertEqual(a, rdflib.Literal(1))
+        self.assertEqual(interning.literal(u'foo', lang='en'), rdflib.Literal('foo', lang='en'))
+
+    def testSharedBetweenParses(self):
+        data = '<http://example.org/a> <http://example.org/p> "foo" .\n'
+        first = list(NTriplesParser(StringIO.StringIO(data)).get_triples())
+        second = list(NTriplesParser(StringIO.StringIO(data)).get_triples())
+        self.assertTrue(first[0][1] is second[0][1])
+
+    def testCoercedIRIsShared(self):
+        triples = [(rdflib.URIRef('http://example.org/a b'), NS.rdf.type, rdflib.URIRef('http://example.org/a b'))] * 2
+        triples = list(coerce_triple_iris(triples))
+        self.assertEqual(triples[0][0], rdflib.URIRef('http://example.org/a%20b'))
+        self.assertTrue(triples[0][0] is triples[1][2])
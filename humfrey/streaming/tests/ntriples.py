@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import StringIO
+import unittest
+
+import rdflib
+from rdflib.compare import isomorphic
+
+from humfrey.utils.namespaces import NS
+
+from .. import NTriplesParser, NTriplesSerializer
+
+class NTriplesParserTestCase(unittest.TestCase):
+    def parse(self, data):
+        parser = NTriplesParser(StringIO.StringIO(data))
+        parser.chunk_size = 16 # Make sure lines get split across chunks
+        return list(parser.get_triples())
+
+    def testTerms(self):
+        triples = self.parse('\n'.join([
+            '<http://example.org/a> <http://example.org/p> <http://example.org/b> .',
+            '_:b1 <http://example.org/p> _:b.2 .',
+            '_:b1 <http://example.org/p> _:b1 .',
+            '<http://example.org/a> <http://example.org/p> "foo"@en-GB .',
+            '<http://example.org/a> <http://example.org/p> "1"^^<http://www.w3.org/2001/XMLSchema#integer>.',
+            '<http://example.org/a>\t<http://example.org/p>\t"foo \\"bar\\"\\n\\u00E9\\U0001F600" .  # comment',
+        ]))
+        b1, b2 = triples[1][0], triples[1][2]
+        self.assertTrue(isinstance(b1, rdflib.BNode) and isinstance(b2, rdflib.BNode))
+        self.assertNotEqual(b1, b2)
+        self.assertEqual(triples, [
+            (rdflib.URIRef('http://example.org/a'), rdflib.URIRef('http://example.org/p'), rdflib.URIRef('http://example.org/b')),
+            (b1, rdflib.URIRef('http://example.org/p'), b2),
+            (b1, rdflib.URIRef('http://example.org/p'), b1),
+            (rdflib.URIRef('http://example.org/a'), rdflib.URIRef('http://example.org/p'), rdflib.Literal('foo', lang='en-GB')),
+            (rdflib.URIRef('http://example.org/a'), rdflib.URIRef('http://example.org/p'), rdflib.Literal('1', datatype=NS.xsd.integer)),
+            (rdflib.URIRef('http://example.org/a'), rdflib.URIRef('http://example.org/p'), rdflib.Literal(u'foo "bar"\n\xe9\U0001F600')),
+        ])
+
+    def testUTF8(self):
+        triples = self.parse(u'<http://example.org/café> <http://example.org/p> "café" .\n'.encode('utf-8'))
+        self.assertEqual(triples, [(rdflib.URIRef(u'http://example.org/café'),
+                                    rdflib.URIRef('http://example.org/p'),
+                                    rdflib.Literal(u'café'))])
+
+    def testBlankLinesAndComments(self):
+        triples = self.parse('# A comment\n\n  \r\n'
+                             '<http://example.org/a> <http://example.org/p> <http://example.org/b> .\r\n'
+                             '\n'
+                             '<http://example.org/a> <http://example.org/p> <http://example.org/c> .')
+        self.assertEqual(len(triples), 2)
+
+    def testInterning(self):
+        triples = self.parse('<http://example.org/a> <http://example.org/p> <http://example.org/b> .\n' * 3)
+        self.assertTrue(all(t[1] is triples[0][1] for t in triples))
+
+    def testBNodesNotSharedBetweenParses(self):
+        data = '_:b1 <http://example.org/p> "foo" .\n'
+        self.assertNotEqual(self.parse(data)[0][0], self.parse(data)[0][0])
+
+    def testGet(self):
+        graph = NTriplesParser(StringIO.StringIO('<http://example.org/a> <http://example.org/p> "foo" .\n')).get()
+        self.assertIsInstance(graph, rdflib.ConjunctiveGraph)
+        self.assertEqual(len(graph), 1)
+
+    def testInvalid(self):
+        self.assertRaises(rdflib.plugins.parsers.ntriples.ParseError,
+                          self.parse, '<http://example.org/a> <http://example.org/p> .\n')
+
+    def testRoundTrip(self):
+        graph = rdflib.ConjunctiveGraph()
+        graph.add((rdflib.URIRef('http://example.org/a'), NS.rdfs.label, rdflib.Literal(u'tab\there "quotes" \xe9', lang='en')))
+        graph.add((rdflib.URIRef('http://example.org/a'), NS.rdf.value, rdflib.Literal('2', datatype=NS.xsd.integer)))
+        graph.add((rdflib.BNode('foo'), NS.rdf.type, NS.foaf.Person))
+        data = ''.join(NTriplesSerializer(graph))
+        parsed = rdflib.ConjunctiveGraph()
+        for triple in self.parse(data):
+            parsed.add(triple)
+        self.assertTrue(isomorphic(parsed, graph))
@@ -0,0 +1,36 @@
+import StringIO
+import unittest
+
+import rdflib
+
+from humfrey.utils.namespaces import NS
+
+from .. import RDFXMLParser, RDFXMLSerializer
+
+class RDFXMLParserTestCase(unittest.TestCase):
+    def testChunked(self):
+        graph = rdflib.ConjunctiveGraph()
+        for i in range(50):
+            uri = rdflib.URIRef('http://example.org/id/%d' % i)
+            graph.add((uri, NS.rdf.type, NS.foaf.Person))
+            graph.add((uri, NS.rdfs.label, rdflib.Literal('Person %d' % i, lang='en')))
+            graph.add((uri, NS.foaf.knows, rdflib.BNode('b%d' % i)))
+        data = ''.join(RDFXMLSerializer(graph))
+
+        parser = RDFXMLParser(StringIO.StringIO(data))
+        parser.chunk_size = 64
+        triples = parser.get_triples()
+        # Triples should be available before the whole document is read.
+        triples.next()
+        self.assertTrue(parser._stream.tell() < len(data))
+        self.assertEqual(len(list(triples)) + 1, len(graph))
+
+    def testBase(self):
+        data = ('<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xml:base="http://example.org/">'
+                '<rdf:Description rdf:about="foo"><rdf:value>bar</rdf:value></rdf:Description></rdf:RDF>')
+        triples = list(RDFXMLParser(StringIO.StringIO(data)).get_triples())
+        self.assertEqual(triples, [(rdflib.URIRef('http://example.org/foo'), NS.rdf.value, rdflib.Literal('bar'))])
+
+    def testInvalid(self):
+        parser = RDFXMLParser(StringIO.StringIO('<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'))
+        self.assertRaises(Exception, list, parser.get_triples())
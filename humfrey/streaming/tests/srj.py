@@ -1,12 +1,69 @@
 import imp
+import itertools
 import os
+import StringIO
 import unittest
 
+import rdflib
+
+from humfrey.sparql.results import Result
 from humfrey.utils import json
+from humfrey.utils.namespaces import NS
 
-from .. import SRJSerializer
+from .. import SRJParser, SRJSerializer
 from .data import TEST_RESULTSET
 
+class SRJParserTestCase(unittest.TestCase):
+    def parse(self, data):
+        parser = SRJParser(StringIO.StringIO(data))
+        parser.chunk_size = 7 # Make sure tokens get split across chunks
+        return parser
+
+    def testSRJResultSet(self):
+        filename = os.path.join(imp.find_module('humfrey')[1], 'tests', 'data', 'linkeddata', 'srj_resultset.json')
+        with open(filename, 'rb') as f:
+            parser = self.parse(f.read())
+
+        def map_result(r, d):
+            return Result(r._fields, (d.setdefault(b, len(d)) if isinstance(b, rdflib.BNode) else b for b in r))
+
+        self.assertEqual(parser.get_sparql_results_type(), 'resultset')
+        self.assertEqual(parser.get_fields(), ['one', 'two'])
+        actual_mapping, expected_mapping = {}, {}
+        for actual, expected in itertools.izip_longest(parser.get_bindings(), TEST_RESULTSET):
+            self.assertEqual(map_result(actual, actual_mapping), map_result(expected, expected_mapping))
+
+    def testTypedLiterals(self):
+        parser = self.parse(json.dumps({
+            'head': {'vars': ['a', 'b']},
+            'results': {'bindings': [{
+                'a': {'type': 'typed-literal', 'datatype': NS.xsd.integer, 'value': '1'},
+                'b': {'type': 'literal', 'datatype': NS.xsd.integer, 'value': '2'},
+            }]}}))
+        result = list(parser.get_bindings())[0]
+        self.assertEqual(result.a, rdflib.Literal(1))
+        self.assertEqual(result.b, rdflib.Literal(2))
+
+    def testHeadAfterResults(self):
+        parser = self.parse('{"results": {"bindings": [{"a": {"type": "uri", "value": "http://example.org/"}}]},'
+                            ' "head": {"vars": ["a"]}}')
+        self.assertEqual(parser.get_fields(), ['a'])
+        self.assertEqual([r.a for r in parser.get_bindings()], [rdflib.URIRef('http://example.org/')])
+
+    def testBoolean(self):
+        for value in (True, False):
+            parser = self.parse(json.dumps({'head': {}, 'boolean': value}))
+            self.assertEqual(parser.get_sparql_results_type(), 'boolean')
+            self.assertEqual(parser.get_boolean(), value)
+
+    def testRoundTrip(self):
+        results = list(self.parse(''.join(SRJSerializer(TEST_RESULTSET))).get_bindings())
+        self.assertEqual(len(results), len(TEST_RESULTSET))
+
+    def testTruncated(self):
+        parser = self.parse('{"head": {"vars": ["a"]}, "results": {"bindings": [{"a": {"type": "uri", "val')
+        self.assertRaises(ValueError, list, parser.get_bindings())
+
 class SRJSerializerTestCase(unittest.TestCase):
 
     def testValidSRJResultSet(self):
@@ -1,5 +1,6 @@
 import itertools
 import os
+import StringIO
 import unittest
 
 import rdflib
@@ -7,7 +8,7 @@ import rdflib
 from humfrey.sparql.results import Result, SparqlResultList
 from humfrey.utils.namespaces import NS
 
-from .. import SRXParser
+from .. import SRXParser, SRXSerializer
 from .data import TEST_RESULTSET
 
 class SRXParserTestCase(unittest.TestCase):
@@ -39,3 +40,20 @@ class SRXParserTestCase(unittest.TestCase):
         finally:
             for result in results: pass
             f.close()
+
+    def testSRXChunked(self):
+        import humfrey.tests
+        filename = os.path.join(os.path.dirname(humfrey.tests.__file__),
+                                'data', 'linkeddata', 'xml_resultset.xml')
+        with open(filename, 'r') as f:
+            parser = SRXParser(f)
+            parser.chunk_size = 16
+            self.assertEqual(parser.get_fields(), ('one', 'two'))
+            self.assertEqual(len(list(parser.get_bindings())), len(TEST_RESULTSET))
+
+    def testSRXBoolean(self):
+        for value in (True, False):
+            data = ''.join(SRXSerializer(value))
+            parser = SRXParser(StringIO.StringIO(data))
+            self.assertEqual(parser.get_sparql_results_type(), 'boolean')
+            self.assertEqual(parser.get_boolean(), value)
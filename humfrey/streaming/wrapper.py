@@ -3,6 +3,7 @@ Contains wrappers around rdflib parsers and serializers.
 """
 
 import abc
+import collections
 import Queue
 import sys
 import threading
@@ -23,13 +24,13 @@ from humfrey.utils.statsd import statsd
 from .base import StreamingParser, StreamingSerializer
 from .encoding import coerce_triple_iris
 
-class _QueueGraph(Graph):
-    def __init__(self, queue, *args, **kwargs):
-        self._queue = queue
-        super(_QueueGraph, self).__init__(*args, **kwargs)
+class _DequeGraph(Graph):
+    def __init__(self, triples, *args, **kwargs):
+        self._triples = triples
+        super(_DequeGraph, self).__init__(*args, **kwargs)
 
     def add(self, triple):
-        self._queue.put(('triple', triple))
+        self._triples.append(triple)
 
 class _QueueStream(object):
     def __init__(self, queue):
@@ -52,17 +53,25 @@ class RDFLibParser(StreamingParser):
     def parser_kwargs(self):
         pass
 
-    def _parse_to_queue(self, stream, queue):
+    def _get_input_source(self):
+        source = prepare_input_source(self._stream)
+        if self._base:
+            source.setSystemId(self._base)
+        return source
+
+    def _parse(self, graph):
+        """
+        Parses the stream into graph, yielding whenever there may be new
+        triples to pick up.
+
+        rdflib parsers generally read the whole stream before doing anything,
+        so by default we parse it in one go. Subclasses wrapping parsers that
+        can be fed incrementally should override this.
+        """
         parser = self.rdflib_parser()
-        store = _QueueGraph(queue)
-        source = prepare_input_source(stream)
-        try:
-            parser.parse(source, store,
-                         *self.parser_args, **self.parser_kwargs)
-        except:
-            queue.put(('exception', sys.exc_info()))
-        else:
-            queue.put(('sentinel', None)) # Sentinel
+        parser.parse(self._get_input_source(), graph,
+                     *self.parser_args, **self.parser_kwargs)
+        yield
 
     def get_sparql_results_type(self):
         self.mode = 'parse'
@@ -82,21 +91,13 @@ class RDFLibParser(StreamingParser):
             raise AssertionError("Can only call get_triples once")
         self._get_triples_called = True
         self.mode = 'parse'
-        queue = Queue.Queue()
-        parser_thread = threading.Thread(target=self._parse_to_queue,
-                                         args=(self._stream, queue))
+        triples = collections.deque()
+        graph = _DequeGraph(triples)
 
         with statsd.timer('humfrey.streaming.rdflib-parser.' + self.plugin_name):
-            parser_thread.start()
-            while True:
-                type, value = queue.get()
-                if type == 'triple':
-                    yield value
-                elif type == 'sentinel':
-                    break
-                elif type == 'exception':
-                    raise value[0], value[1], value[2]
-            parser_thread.join()
+            for _ in self._parse(graph):
+                while triples:
+                    yield triples.popleft()
 
     def get_triples(self):
         return coerce_triple_iris(self._get_triples())
@@ -3,42 +3,55 @@ from celery.task import task
 import collections
 import contextlib
 import datetime
+import itertools
 import logging
 import os
 import pickle
 import shutil
+import sys
 import tempfile
 import thread
+import threading
 import traceback
 
 import pytz
 
 from django.conf import settings
+from django.db import connection
 
 from humfrey.update.models import UpdateDefinition, UpdateLogRecord
-from humfrey.update.transform.base import NotChanged, TransformException
-from humfrey.update.utils import evaluate_pipeline
+from humfrey.update.transform.base import NotChanged, TransformException, get_memo_key
+from humfrey.update.transform.output_cache import get_output_cache
+from humfrey.update.transform.scheduler import Scheduler
+from humfrey.update.transform import streams
+from humfrey.update.utils import compile_pipeline, evaluate_pipeline
 from humfrey.signals import graphs_updated, update_completed
 
 logger = logging.getLogger(__name__)
 
 class _SameThreadFilter(logging.Filter):
+    """
+    Only lets through records from the thread that created it, and from
+    threads added using add_thread().
+    """
     def __init__(self):
-        self.thread_ident = thread.get_ident()
+        self.thread_idents = set([thread.get_ident()])
+    def add_thread(self):
+        self.thread_idents.add(thread.get_ident())
     def filter(self, record):
-        return record.thread == self.thread_ident
+        return record.thread in self.thread_idents
 
 class _TransformHandler(logging.Handler):
     ignore_loggers = frozenset(['django.db.backends'])
 
     def __init__(self, update_log):
-        self.ignore = False
+        self._local = threading.local()
         self.update_log = update_log
         logging.Handler.__init__(self)
         self.setLevel(0)
 
     def emit(self, record):
-        if self.ignore or record.name in self.ignore_loggers:
+        if getattr(self._local, 'ignore', False) or record.name in self.ignore_loggers:
             return
         record = dict(record.__dict__)
         if record.get('exc_info'):
@@ -59,34 +72,89 @@ class _TransformHandler(logging.Handler):
                     del record[key]
 
         # Ignore all log messages while attempting to save.
-        self.ignore = True
+        self._local.ignore = True
         try:
             update_log_record = UpdateLogRecord(update_log = self.update_log)
             update_log_record.record = record
             update_log_record.save()
         finally:
-            self.ignore = False
+            self._local.ignore = False
+
+class TransformMemo(object):
+    """
+    Results of transforms that don't depend on the store, shared between the
+    runs of a pipeline for each of its stores.
+
+    Exceptions are remembered too, so a transform that fails (or finds that
+    nothing has changed) does so for every store. If a transform is being
+    executed for one store, the others wait for it.
+    """
+    def __init__(self):
+        self._results = {}
+        self._locks = collections.defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def get(self, transform, args, func):
+        try:
+            key = get_memo_key((transform, args))
+        except TypeError:
+            # Something unhashable, so we can't tell whether it's the same
+            return func()
+        with self._lock:
+            lock = self._locks[key]
+        with lock:
+            if key not in self._results:
+                try:
+                    self._results[key] = True, func()
+                except Exception:
+                    self._results[key] = False, sys.exc_info()
+            else:
+                logger.debug("Reusing output of %r", transform)
+            succeeded, result = self._results[key]
+        if succeeded:
+            return result
+        raise result[0], result[1], result[2]
 
 class TransformManager(object):
-    def __init__(self, update_log, output_directory, parameters, force, store_graphs, store):
+    def __init__(self, update_log, output_directory, parameters, force, store_graphs, store, memo=None, counter=None, scheduler=None, output_cache=None, streaming=False):
         self.update_log = update_log
         self.owner = update_log.update_definition.owner
         self.output_directory = output_directory
         self.parameters = parameters
         self.force = force
 
-        self.counter = 0
+        # Shared with the managers for other stores, if any, so that output
+        # filenames don't clash.
+        self.counter = counter if counter is not None else itertools.count()
+        self.memo = memo
+        # Runs independent branches of the pipeline concurrently
+        self.scheduler = scheduler
+        # Outputs of deterministic transforms from previous updates
+        self.output_cache = output_cache
+        # Whether transforms may hand triples on without writing them to a file
+        self.streaming = streaming
         self.transforms = []
+        # (transform, start, end) for each transform executed
+        self.timings = []
+        self._local = threading.local()
         self.store_graphs = store_graphs
         self.store = store
 
     def __call__(self, extension=None, name=None):
         if not name:
-            name = '%s.%s' % (self.counter, extension)
-            self.counter += 1
+            name = '%s.%s' % (next(self.counter), extension)
         filename = os.path.join(self.output_directory, name)
         return filename
 
+    # Transforms may be executing in several threads at once
+    current = property(lambda self: self._local.current)
+    @current.setter
+    def current(self, value):
+        self._local.current = value
+    @current.deleter
+    def current(self):
+        del self._local.current
+
     def start(self, transform, inputs, type='generic'):
         self.current = {'transform': transform,
                         'inputs': inputs,
@@ -97,6 +165,8 @@ class TransformManager(object):
         self.current['outputs'] = outputs
         self.transforms.append(self.current)
         del self.current
+    def record_timing(self, transform, start, end):
+        self.timings.append((transform, start, end))
     def touched_graph(self, graph_name):
         self.store_graphs[self.store].add(graph_name)
     def not_changed(self):
@@ -112,7 +182,8 @@ def logged(update_log):
 
     logger = logging.getLogger()
     handler = _TransformHandler(update_log)
-    handler.addFilter(_SameThreadFilter())
+    thread_filter = _SameThreadFilter()
+    handler.addFilter(thread_filter)
 
     UpdateDefinition.objects \
                     .filter(slug=update_log.update_definition.slug) \
@@ -120,7 +191,7 @@ def logged(update_log):
 
     logger.addHandler(handler)
     try:
-        yield
+        yield thread_filter
     finally:
         logger.removeHandler(handler)
         update_log.completed = datetime.datetime.now()
@@ -130,6 +201,36 @@ def logged(update_log):
                         .filter(slug=update_log.update_definition.slug) \
                         .update(status='idle', last_completed=update_log.completed)
 
+def _run_pipeline(transform, transform_manager):
+    try:
+        transform(transform_manager)
+    except NotChanged:
+        logger.info("Aborted update as data hasn't changed")
+    except TransformException:
+        logger.exception("Transform failed.")
+    except Exception:
+        logger.exception("Transform failed, perhaps ungracefully.")
+    finally:
+        _log_timings(transform_manager)
+
+def _log_timings(transform_manager):
+    if not transform_manager.timings:
+        return
+    started = min(start for transform, start, end in transform_manager.timings)
+    for transform, start, end in sorted(transform_manager.timings, key=lambda timing: timing[1]):
+        logger.info("%r took %.2fs (from %.2fs to %.2fs)",
+                    transform, end - start, start - started, end - started)
+
+def _run_pipeline_in_thread(transform, transform_manager, thread_filter):
+    thread_filter.add_thread()
+    try:
+        _run_pipeline(transform, transform_manager)
+    except Exception:
+        logger.exception("Couldn't run pipeline for store %r", transform_manager.store.slug)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
 @task(name='humfrey.update.update', ignore_result=True)
 def update(update_log=None, slug=None, trigger=None):
     if slug:
@@ -145,32 +246,59 @@ def update(update_log=None, slug=None, trigger=None):
     variables = update_log.update_definition.variables.all()
     variables = dict((v.name, v.value) for v in variables)
 
-    with logged(update_log):
+    output_cache = get_output_cache()
+
+    with logged(update_log) as thread_filter:
         for pipeline in update_log.update_definition.pipelines.all():
-            for store in pipeline.stores.all():
-                output_directory = tempfile.mkdtemp()
-                transform_manager = TransformManager(update_log,
-                                                     output_directory,
-                                                     variables,
-                                                     force=update_log.forced,
-                                                     store_graphs=store_graphs,
-                                                     store=store)
-    
-                try:
-                    transform = evaluate_pipeline(pipeline.value.strip())
-                except SyntaxError:
-                    raise ValueError("Couldn't parse the given pipeline: %r" % pipeline.value.strip())
-        
-                try:
-                    transform(transform_manager)
-                except NotChanged:
-                    logger.info("Aborted update as data hasn't changed")
-                except TransformException:
-                    logger.exception("Transform failed.")
-                except Exception:
-                    logger.exception("Transform failed, perhaps ungracefully.")
-                finally:
-                    shutil.rmtree(output_directory)
+            stores = list(pipeline.stores.all())
+
+            # Parse it up front, so that a broken pipeline fails the update
+            try:
+                code = compile_pipeline(pipeline.value.strip())
+            except SyntaxError:
+                raise ValueError("Couldn't parse the given pipeline: %r" % pipeline.value.strip())
+
+            # The pipeline is run for each store in parallel. Transforms that
+            # don't depend on the store are only executed once, with their
+            # results shared using the memo. Independent branches within the
+            # pipeline are run in parallel too, using the scheduler.
+            output_directory = tempfile.mkdtemp()
+            # There's nothing to share with only one store, and memoized
+            # outputs have to be written to files rather than streamed
+            memo = TransformMemo() if len(stores) > 1 else None
+            counter = itertools.count()
+            scheduler = Scheduler(initializer=thread_filter.add_thread)
+            threads = []
+            try:
+                for store in stores:
+                    # Evaluated afresh for each store, as some transforms keep
+                    # state
+                    transform = evaluate_pipeline(code)
+                    transform_manager = TransformManager(update_log,
+                                                         output_directory,
+                                                         variables,
+                                                         force=update_log.forced,
+                                                         store_graphs=store_graphs,
+                                                         store=store,
+                                                         memo=memo,
+                                                         counter=counter,
+                                                         scheduler=scheduler,
+                                                         output_cache=output_cache,
+                                                         streaming=streams.ENABLED)
+                    if len(stores) == 1:
+                        _run_pipeline(transform, transform_manager)
+                    else:
+                        threads.append(threading.Thread(target=_run_pipeline_in_thread,
+                                                        args=(transform, transform_manager, thread_filter)))
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            finally:
+                shutil.rmtree(output_directory)
+
+        if output_cache:
+            output_cache.prune()
 
     updated = _time_zone.localize(datetime.datetime.now())
     
@@ -1,2 +1,7 @@
 from .spreadsheet import *
-from .notation_normalization import *
\ No newline at end of file
+from .notation_normalization import *
+from .pipeline import *
+from .scheduler import *
+from .output_cache import *
+from .streams import *
+from .upload import *
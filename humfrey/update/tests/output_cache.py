@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from humfrey.update.tasks.update import TransformManager
+from humfrey.update.transform.base import Transform
+from humfrey.update.transform.output_cache import OutputCache
+from humfrey.update.transform.xslt import XSLT
+
+class Upper(Transform):
+    cacheable = True
+    executions = 0
+
+    def __init__(self, store_dependent=False):
+        self.store_dependent = store_dependent
+
+    def execute(self, transform_manager, input):
+        Upper.executions += 1
+        with open(input) as source:
+            with open(transform_manager('txt'), 'w') as output:
+                output.write(source.read().upper())
+                return output.name
+
+class OutputCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        Upper.executions = 0
+        self.directory = tempfile.mkdtemp()
+        self.output_cache = OutputCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_transform_manager(self, store='public'):
+        output_directory = tempfile.mkdtemp(dir=self.directory)
+        store = mock.Mock(slug=store)
+        return TransformManager(mock.Mock(), output_directory, {}, False, {}, store,
+                                output_cache=self.output_cache)
+
+    def write(self, content):
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.txt', delete=False) as f:
+            f.write(content)
+        return f.name
+
+    def run_transform(self, content, transform=None, store='public'):
+        transform = transform or Upper()
+        with open(transform(self.get_transform_manager(store), self.write(content))) as f:
+            return f.read()
+
+    def testReused(self):
+        self.assertEqual(self.run_transform('abc'), 'ABC')
+        self.assertEqual(self.run_transform('abc'), 'ABC')
+        self.assertEqual(Upper.executions, 1)
+
+    def testInputChanged(self):
+        self.run_transform('abc')
+        self.assertEqual(self.run_transform('def'), 'DEF')
+        self.assertEqual(Upper.executions, 2)
+
+    def testStoreDependent(self):
+        for store in ('public', 'staging', 'public'):
+            self.run_transform('abc', Upper(store_dependent=True), store)
+        self.assertEqual(Upper.executions, 2)
+
+    def testNotCacheable(self):
+        transform = Upper()
+        transform.cacheable = False
+        self.run_transform('abc', transform)
+        self.run_transform('abc', transform)
+        self.assertEqual(Upper.executions, 2)
+
+    def testPrune(self):
+        self.run_transform('abc')
+        self.output_cache.prune()
+        self.run_transform('abc')
+        self.assertEqual(Upper.executions, 1)
+
+        self.output_cache.max_age = -1
+        self.output_cache.prune()
+        self.run_transform('abc')
+        self.assertEqual(Upper.executions, 2)
+
+    def testPayloads(self):
+        store = mock.Mock(slug='public')
+        graph_name = 'http://example.org/graph'
+        first, second = self.write('abc'), self.write('def')
+        self.assertFalse(self.output_cache.payload_unchanged(store, graph_name, 'PUT', first, 'then'))
+        self.output_cache.payload_uploaded(store, graph_name, 'PUT', first, 'then')
+        self.assertTrue(self.output_cache.payload_unchanged(store, graph_name, 'PUT', first, 'then'))
+        self.assertFalse(self.output_cache.payload_unchanged(store, graph_name, 'PUT', second, 'then'))
+        self.assertFalse(self.output_cache.payload_unchanged(mock.Mock(slug='staging'), graph_name, 'PUT', first, 'then'))
+        # Someone else has since replaced the graph
+        self.assertFalse(self.output_cache.payload_unchanged(store, graph_name, 'PUT', first, 'later'))
+        self.assertFalse(self.output_cache.payload_unchanged(store, graph_name, 'PUT', first, None))
+
+    def testXSLTStylesheets(self):
+        included = self.write('<xsl:stylesheet version="2.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"/>')
+        template = self.write('<xsl:stylesheet version="2.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">'
+                              '<xsl:include href="%s"/></xsl:stylesheet>' % os.path.basename(included))
+        transform_manager = self.get_transform_manager()
+        self.assertEqual(XSLT(template).get_cache_files(transform_manager, 'input.xml'),
+                         ['input.xml', template, included])
+        self.assertEqual(XSLT('http://example.org/template.xsl').get_cache_files(transform_manager, 'input.xml'),
+                         None)
+
+    def testXSLTNondeterministic(self):
+        transform_manager = self.get_transform_manager()
+        for expression in ('document(\'other.xml\')', 'unparsed-text("other.txt")', 'current-dateTime()'):
+            template = self.write('<xsl:stylesheet version="2.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">'
+                                  '<xsl:template match="/"><xsl:value-of select="%s"/></xsl:template>'
+                                  '</xsl:stylesheet>' % expression.replace('"', '&quot;'))
+            self.assertEqual(XSLT(template).get_cache_files(transform_manager, 'input.xml'), None)
@@ -0,0 +1,118 @@
+import contextlib
+import sys
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from humfrey.update.tasks.update import TransformManager, TransformMemo, update
+from humfrey.update.transform.base import NotChanged, Transform, get_memo_key
+from humfrey.update.transform.shell import Shell
+from humfrey.update.transform.upload import Upload
+from humfrey.update.transform.xslt import XSLT
+
+class Counting(Transform):
+    executions = []
+
+    def __init__(self, name, store_dependent=False):
+        self.name, self.store_dependent = name, store_dependent
+
+    def execute(self, transform_manager, input=None):
+        self.executions.append((self.name, transform_manager.store))
+        if self.name == 'unchanged':
+            transform_manager.not_changed()
+        return '%s(%s)' % (self.name, input)
+
+class TransformMemoTestCase(unittest.TestCase):
+    def setUp(self):
+        Counting.executions = []
+        self.memo = TransformMemo()
+
+    def get_transform_manager(self, store):
+        update_log = mock.Mock()
+        return TransformManager(update_log, '/tmp', {}, False, {}, store, memo=self.memo)
+
+    def pipeline(self):
+        return Counting('retrieve') | Counting('xslt') | Counting('upload', store_dependent=True)
+
+    def testSharedBetweenStores(self):
+        for store in ('public', 'staging'):
+            self.assertEqual(self.pipeline()(self.get_transform_manager(store)),
+                             'upload(xslt(retrieve(None)))')
+        self.assertEqual(Counting.executions, [('retrieve', 'public'),
+                                               ('xslt', 'public'),
+                                               ('upload', 'public'),
+                                               ('upload', 'staging')])
+
+    def testConcurrent(self):
+        threads = [threading.Thread(target=self.pipeline(), args=(self.get_transform_manager(store),))
+                   for store in ('public', 'staging', 'test')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        names = [name for name, store in Counting.executions]
+        self.assertEqual(names.count('retrieve'), 1)
+        self.assertEqual(names.count('xslt'), 1)
+        self.assertEqual(names.count('upload'), 3)
+
+    def testExceptionsShared(self):
+        pipeline = Counting('unchanged') | Counting('upload', store_dependent=True)
+        for store in ('public', 'staging'):
+            self.assertRaises(NotChanged, pipeline, self.get_transform_manager(store))
+        self.assertEqual(Counting.executions, [('unchanged', 'public')])
+
+    def testWithoutMemo(self):
+        transform_manager = self.get_transform_manager('public')
+        transform_manager.memo = None
+        for i in range(2):
+            self.pipeline()(transform_manager)
+        self.assertEqual(len(Counting.executions), 6)
+
+class StoreDependenceTestCase(unittest.TestCase):
+    def testChain(self):
+        self.assertFalse((Counting('a') | Counting('b')).depends_on_store())
+        self.assertTrue((Counting('a') | Upload('http://example.org/graph')).depends_on_store())
+
+    def testShell(self):
+        with mock.patch.dict('humfrey.update.transform.shell.SHELL_TRANSFORMS', {'cat': ['cat', None]}):
+            self.assertTrue(Shell('cat', 'txt').depends_on_store())
+            self.assertFalse(Shell('cat', 'txt', params={'store': 'public'}).depends_on_store())
+
+    def testXSLT(self):
+        with tempfile.NamedTemporaryFile(suffix='.xsl') as without_param:
+            without_param.write('<xsl:stylesheet version="2.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"/>')
+            without_param.flush()
+            with tempfile.NamedTemporaryFile(suffix='.xsl') as with_param:
+                with_param.write('<xsl:stylesheet version="2.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">'
+                                 '<xsl:include href="%s"/><xsl:param name="store"/></xsl:stylesheet>' % without_param.name)
+                with_param.flush()
+                self.assertFalse(XSLT(without_param.name).depends_on_store())
+                self.assertTrue(XSLT(with_param.name).depends_on_store())
+                self.assertFalse(XSLT(with_param.name, params={'store': 'public'}).depends_on_store())
+        self.assertTrue(XSLT('http://example.org/template.xsl').depends_on_store())
+
+    def testMemoKeys(self):
+        self.assertEqual(get_memo_key(Counting('a') | Counting('b')),
+                         get_memo_key(Counting('a') | Counting('b')))
+        self.assertNotEqual(get_memo_key(Counting('a') | Counting('b')),
+                            get_memo_key(Counting('a') | Counting('c')))
+
+@contextlib.contextmanager
+def not_logged(update_log):
+    yield mock.Mock()
+
+class UpdateTaskTestCase(unittest.TestCase):
+    def testInvalidPipelineFails(self):
+        update_log = mock.Mock()
+        update_log.update_definition.variables.all.return_value = []
+        pipeline = mock.Mock(value='Counting(')
+        pipeline.stores.all.return_value = ['public', 'staging']
+        update_log.update_definition.pipelines.all.return_value = [pipeline]
+        # humfrey.update.tasks.update is shadowed by the task of the same name
+        update_module = sys.modules['humfrey.update.tasks.update']
+        with mock.patch.object(update_module, 'logged', not_logged), \
+             mock.patch.object(update_module.threading, 'Thread') as thread:
+            self.assertRaises(ValueError, update, update_log=update_log)
+        self.assertFalse(thread.called)
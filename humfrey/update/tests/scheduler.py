@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+
+import mock
+
+from humfrey.update.tasks.update import TransformManager
+from humfrey.update.transform.base import Requires, Transform
+from humfrey.update.transform.scheduler import Scheduler
+
+class Sleep(Transform):
+    def __init__(self, name, duration=0.2):
+        self.name, self.duration = name, duration
+
+    def execute(self, transform_manager, input=None):
+        time.sleep(self.duration)
+        if self.name == 'fail':
+            raise ValueError(self.name)
+        return self.name
+
+class Collect(Transform):
+    def execute(self, transform_manager, input=None):
+        return input
+
+class SchedulerTestCase(unittest.TestCase):
+    def testConcurrent(self):
+        scheduler = Scheduler(workers=4)
+        start = time.time()
+        results = scheduler.map([lambda i=i: time.sleep(0.2) or i for i in range(4)])
+        self.assertEqual(results, [0, 1, 2, 3])
+        self.assertTrue(time.time() - start < 0.6)
+
+    def testWorkerLimit(self):
+        scheduler = Scheduler(workers=2)
+        active, peak, lock = [0], [0], threading.Lock()
+        def func():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.1)
+            with lock:
+                active[0] -= 1
+        scheduler.map([func] * 6)
+        self.assertEqual(peak[0], 2)
+
+    def testNested(self):
+        scheduler = Scheduler(workers=2)
+        results = scheduler.map([lambda: scheduler.map([lambda: 1, lambda: 2]),
+                                 lambda: scheduler.map([lambda: 3, lambda: 4])])
+        self.assertEqual(results, [[1, 2], [3, 4]])
+
+    def testExceptionRaised(self):
+        scheduler = Scheduler(workers=4)
+        finished = []
+        def fail():
+            raise ValueError
+        def succeed():
+            time.sleep(0.1)
+            finished.append(True)
+        self.assertRaises(ValueError, scheduler.map, [fail, succeed])
+        # Everything else is left to finish first
+        self.assertEqual(finished, [True])
+
+    def testInitializer(self):
+        initializer = mock.Mock()
+        Scheduler(workers=3, initializer=initializer).map([lambda: None] * 3)
+        self.assertEqual(initializer.call_count, 2)
+
+class PipelineSchedulingTestCase(unittest.TestCase):
+    def get_transform_manager(self, scheduler=None):
+        return TransformManager(mock.Mock(), '/tmp', {}, False, {}, 'public',
+                                scheduler=scheduler)
+
+    def testRequirementsConcurrent(self):
+        transform_manager = self.get_transform_manager(Scheduler(workers=4))
+        pipeline = Requires(Sleep('first'), [Sleep('a'), Sleep('b'), Sleep('c')])
+        start = time.time()
+        self.assertEqual(pipeline(transform_manager), 'first')
+        self.assertTrue(time.time() - start < 0.6)
+
+    def testWithoutScheduler(self):
+        transform_manager = self.get_transform_manager()
+        pipeline = Requires(Sleep('first', 0), [Sleep('a', 0), Sleep('b', 0)])
+        self.assertEqual(pipeline(transform_manager), 'first')
+
+    def testFailedRequirement(self):
+        transform_manager = self.get_transform_manager(Scheduler(workers=4))
+        pipeline = Requires(Sleep('first'), [Sleep('a'), Sleep('fail')])
+        self.assertRaises(ValueError, pipeline, transform_manager)
+
+    def testTimings(self):
+        transform_manager = self.get_transform_manager(Scheduler(workers=4))
+        pipeline = Requires(Sleep('first', 0.1), [Sleep('a', 0.1), Sleep('b', 0.1)]) | Collect()
+        pipeline(transform_manager)
+        timings = dict((transform.name if isinstance(transform, Sleep) else 'collect', (start, end))
+                       for transform, start, end in transform_manager.timings)
+        # Composite transforms aren't timed themselves
+        self.assertEqual(sorted(timings), ['a', 'b', 'collect', 'first'])
+        for name in ('a', 'b'):
+            start, end = timings[name]
+            self.assertTrue(end - start >= 0.1)
+            self.assertTrue(end <= timings['first'][0])
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import rdflib
+
+from humfrey.update.tasks.update import TransformManager, TransformMemo
+from humfrey.update.transform.base import Transform
+from humfrey.update.transform.streams import TripleStream, get_filename, get_triples
+from humfrey.update.transform.union import Union
+
+EX = rdflib.Namespace('http://example.org/')
+
+class Triples(Transform):
+    def __init__(self, name):
+        self.name = name
+
+    def execute(self, transform_manager):
+        triples = [(EX[self.name], EX.p, rdflib.Literal(self.name))]
+        if transform_manager.streaming:
+            return TripleStream(triples)
+        with open(transform_manager('nt'), 'w') as output:
+            output.write('<%s> <%s> "%s" .\n' % triples[0])
+            return output.name
+
+class StreamsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_transform_manager(self, streaming, memo=None):
+        return TransformManager(mock.Mock(), self.directory, {}, False, {}, 'public',
+                                memo=memo, streaming=streaming)
+
+    def testUnionStreamed(self):
+        output = Union(Triples('a'), Triples('b'))(self.get_transform_manager(True))
+        self.assertIsInstance(output, TripleStream)
+        self.assertEqual(set(output), set([(EX.a, EX.p, rdflib.Literal('a')),
+                                           (EX.b, EX.p, rdflib.Literal('b'))]))
+        # Nothing was written out
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def testUnionNotStreamed(self):
+        output = Union(Triples('a'), Triples('b'))(self.get_transform_manager(False))
+        self.assertTrue(os.path.isfile(output))
+        self.assertEqual(set(get_triples(output)), set([(EX.a, EX.p, rdflib.Literal('a')),
+                                                        (EX.b, EX.p, rdflib.Literal('b'))]))
+
+    def testReadOnce(self):
+        stream = TripleStream([(EX.a, EX.p, EX.o)])
+        list(stream)
+        self.assertRaises(ValueError, list, stream)
+
+    def testGetFilename(self):
+        transform_manager = self.get_transform_manager(True)
+        filename = get_filename(transform_manager, TripleStream([(EX.a, EX.p, EX.o)]))
+        self.assertTrue(filename.endswith('.nt'))
+        self.assertEqual(list(get_triples(filename)), [(EX.a, EX.p, EX.o)])
+        self.assertEqual(get_filename(transform_manager, filename), filename)
+
+    def testMemoizedWrittenOut(self):
+        transform_manager = self.get_transform_manager(True, memo=TransformMemo())
+        output = Union(Triples('a'))(transform_manager)
+        self.assertTrue(os.path.isfile(output))
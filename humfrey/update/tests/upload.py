@@ -0,0 +1,172 @@
+import BaseHTTPServer
+import datetime
+import gzip
+import os
+import shutil
+import StringIO
+import tempfile
+import threading
+import unittest
+
+import mock
+import rdflib
+
+from humfrey.streaming import NTriplesParser
+from humfrey.update.transform.output_cache import OutputCache
+from humfrey.update.transform.streams import TripleStream
+from humfrey.update.transform.upload import Upload
+from humfrey.update.uploader import Uploader
+from humfrey.utils.namespaces import NS
+
+EX = rdflib.Namespace('http://example.org/')
+
+class GraphStoreRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Records each request and its (de-chunked, decompressed) body.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                body.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    break
+            body = ''.join(body)
+        else:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=StringIO.StringIO(body)).read()
+        self.server.requests.append((self.path, dict(self.headers), body))
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class GraphStoreServer(BaseHTTPServer.HTTPServer):
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), GraphStoreRequestHandler)
+        self.requests = []
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def store(self):
+        return mock.Mock(spec=['graph_store_endpoint'],
+                         graph_store_endpoint='http://%s:%d/data' % self.server_address)
+
+class UploaderTestCase(unittest.TestCase):
+    def upload(self, **kwargs):
+        with GraphStoreServer() as server:
+            with mock.patch('humfrey.update.uploader.Store', mock.Mock):
+                Uploader.upload([server.store], 'http://example.org/graph', **kwargs)
+        self.assertEqual(len(server.requests), 1)
+        return server.requests[0]
+
+    def testStream(self):
+        path, headers, body = self.upload(stream=('line %d\n' % i for i in xrange(10000)))
+        self.assertEqual(headers['transfer-encoding'], 'chunked')
+        self.assertNotIn('content-encoding', headers)
+        self.assertEqual(body, ''.join('line %d\n' % i for i in xrange(10000)))
+
+    def testCompressedStream(self):
+        path, headers, body = self.upload(stream=('line %d\n' % i for i in xrange(10000)), compress=True)
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(body, ''.join('line %d\n' % i for i in xrange(10000)))
+
+    def testData(self):
+        path, headers, body = self.upload(data='some data')
+        self.assertEqual(headers['content-length'], '9')
+        self.assertEqual(body, 'some data')
+
+class UploadTestCase(unittest.TestCase):
+    graph_name = EX.graph
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_metadata(self, triples, created=None):
+        graph = rdflib.Graph()
+        for triple in Upload(self.graph_name).add_metadata(iter(triples), created):
+            graph.add(triple)
+        return graph
+
+    def testMetadataAdded(self):
+        graph = self.get_metadata([(EX.a, EX.p, EX.b)], created=rdflib.Literal('then'))
+        self.assertIn((self.graph_name, NS.rdf.type, NS.sd.Graph), graph)
+        self.assertEqual(graph.value(self.graph_name, NS.dcterms.created), rdflib.Literal('then'))
+        self.assertIsInstance(graph.value(self.graph_name, NS.dcterms.modified).toPython(), datetime.datetime)
+
+    def testMetadataFromInput(self):
+        graph = self.get_metadata([(self.graph_name, NS.dcterms.modified, rdflib.Literal('modified')),
+                                   (self.graph_name, NS.dcterms.created, rdflib.Literal('created'))],
+                                  created=rdflib.Literal('then'))
+        self.assertEqual(list(graph.objects(self.graph_name, NS.dcterms.modified)), [rdflib.Literal('modified')])
+        self.assertEqual(list(graph.objects(self.graph_name, NS.dcterms.created)), [rdflib.Literal('created')])
+
+    def testCreatedDefaultsToModified(self):
+        graph = self.get_metadata([])
+        self.assertEqual(graph.value(self.graph_name, NS.dcterms.created),
+                         graph.value(self.graph_name, NS.dcterms.modified))
+
+    def testRelativeToGraph(self):
+        filename = os.path.join(self.directory, 'input.rdf')
+        with open(filename, 'w') as f:
+            f.write('<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+                    'xmlns:ex="http://example.org/"><rdf:Description rdf:about="#a">'
+                    '<ex:p rdf:resource="b"/></rdf:Description></rdf:RDF>')
+        self.assertEqual(list(Upload(self.graph_name).get_triples(filename)),
+                         [(rdflib.URIRef(self.graph_name + '#a'), EX.p, EX.b)])
+
+    def testExecute(self):
+        transform_manager = mock.Mock(output_cache=None)
+        with GraphStoreServer() as server:
+            transform_manager.store = server.store
+            upload = Upload(self.graph_name)
+            with mock.patch('humfrey.update.uploader.Store', mock.Mock), \
+                 mock.patch.object(upload, 'get_created', return_value=None):
+                upload.execute(transform_manager, TripleStream([(EX.a, EX.p, EX.b)]))
+        path, headers, body = server.requests[0]
+        self.assertEqual(headers['content-type'], 'text/plain')
+        graph = rdflib.Graph()
+        for triple in NTriplesParser(StringIO.StringIO(body)).get_triples():
+            graph.add(triple)
+        self.assertIn((EX.a, EX.p, EX.b), graph)
+        self.assertIn((self.graph_name, NS.rdf.type, NS.sd.Graph), graph)
+        transform_manager.touched_graph.assert_called_once_with(self.graph_name)
+
+    def testUnchangedPayload(self):
+        filename = os.path.join(self.directory, 'input.nt')
+        with open(filename, 'w') as f:
+            f.write('<http://example.org/a> <http://example.org/p> <http://example.org/b> .\n')
+        transform_manager = mock.Mock(output_cache=OutputCache(os.path.join(self.directory, 'cache')), force=False)
+        modified = ['then']
+        with GraphStoreServer() as server:
+            transform_manager.store = mock.Mock(slug='public', graph_store_endpoint=server.store.graph_store_endpoint)
+            upload = Upload(self.graph_name)
+            with mock.patch('humfrey.update.uploader.Store', mock.Mock), \
+                 mock.patch.object(upload, 'get_created', return_value=None), \
+                 mock.patch.object(upload, 'get_modified', side_effect=lambda tm: modified[0]):
+                upload.execute(transform_manager, filename)
+                upload.execute(transform_manager, filename)
+                self.assertEqual(len(server.requests), 1)
+                # The graph has been replaced since, so is uploaded again
+                modified[0] = 'later'
+                upload.execute(transform_manager, filename)
+                self.assertEqual(len(server.requests), 2)
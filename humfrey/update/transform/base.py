@@ -1,12 +1,16 @@
 import base64
 import datetime
+import functools
 import os
 import pickle
+import time
 
 import redis
 from django.conf import settings
 
 from humfrey.sparql.models import Store
+from humfrey.update.transform.scheduler import run_all
+from humfrey.update.transform.streams import get_filename
 
 class TransformException(Exception):
     pass
@@ -19,7 +23,39 @@ class NoSuchStore(TransformException):
 class PermissionDeniedToStore(TransformException):
     pass
 
+def get_memo_key(value):
+    """
+    Returns a hashable key for a transform, its arguments, or the results of
+    other transforms, that's equal for equal values.
+
+    Pipelines are evaluated afresh for each store, so transforms can't be
+    compared by identity.
+    """
+    if isinstance(value, Transform):
+        return type(value), get_memo_key(vars(value))
+    elif isinstance(value, dict):
+        return dict, tuple(sorted((k, get_memo_key(v)) for k, v in value.iteritems()))
+    elif isinstance(value, (list, tuple)):
+        return type(value), tuple(get_memo_key(v) for v in value)
+    hash(value)
+    return value
+
 class Transform(object):
+    # Whether the output depends on the store being updated. Pipelines are
+    # run once for each of their stores, and the results of transforms that
+    # don't depend on the store are shared between those runs.
+    store_dependent = False
+    # Whether to record how long the transform takes. Off for those that
+    # only combine other transforms, as they're timed separately.
+    timed = True
+    # Whether the output only depends on the transform's parameters, the
+    # store (if store_dependent) and the files returned by get_cache_files(),
+    # so can be cached between updates. See output_cache.
+    cacheable = False
+
+    def depends_on_store(self):
+        return self.store_dependent
+
     def get_redis_client(self):
         return redis.client.Redis(**settings.REDIS_PARAMS)
     def pack(self, value):
@@ -54,22 +90,58 @@ class Transform(object):
 
         return Chain(self, other)
 
-    def __call__(self, transform_manager):
-        return self.execute(transform_manager)
+    def __call__(self, transform_manager, *args):
+        memo = getattr(transform_manager, 'memo', None)
+        if memo is None or self.depends_on_store():
+            return self._execute_timed(transform_manager, *args)
+        # Memoized outputs may be read more than once, so can't be streams
+        return memo.get(self, args, lambda: get_filename(transform_manager,
+                                                         self._execute_timed(transform_manager, *args)))
+
+    def _execute_timed(self, transform_manager, *args):
+        record_timing = getattr(transform_manager, 'record_timing', None)
+        if not (self.timed and record_timing):
+            return self._execute_cached(transform_manager, *args)
+        start = time.time()
+        try:
+            return self._execute_cached(transform_manager, *args)
+        finally:
+            record_timing(self, start, time.time())
+
+    def _execute_cached(self, transform_manager, *args):
+        output_cache = getattr(transform_manager, 'output_cache', None)
+        if output_cache is None or not self.cacheable:
+            return self.execute(transform_manager, *args)
+        return output_cache.get(self, transform_manager, args,
+                                lambda: self.execute(transform_manager, *args))
+
+    def get_cache_files(self, transform_manager, *args):
+        """
+        Returns the files the output of a cacheable transform depends on, or
+        None if it can't be cached this time.
+        """
+        return list(args)
 
     def execute(self, update_manager):
         raise NotImplementedError
 
 
 class Chain(Transform):
+    timed = False
+
     def __init__(self, first, second):
         self._first, self._second = first, second
 
+    def depends_on_store(self):
+        return self._first.depends_on_store() or self._second.depends_on_store()
+
     def execute(self, transform_manager, *args):
-        return self._second.execute(transform_manager,
-                                    self._first.execute(transform_manager, *args))
+        return self._second(transform_manager,
+                            self._first(transform_manager, *args))
 
 class Requires(Transform):
+    timed = False
+
     def __init__(self, first, requirements):
         try:
             iter(requirements)
@@ -77,7 +149,12 @@ class Requires(Transform):
             requirements = (requirements,)
         self._first, self._requirements = first, requirements
 
+    def depends_on_store(self):
+        return self._first.depends_on_store() \
+            or any(requirement.depends_on_store() for requirement in self._requirements)
+
     def execute(self, transform_manager, *args):
-        for requirement in self._requirements:
-            requirement.execute(transform_manager)
-        return self._first.execute(transform_manager, *args)
+        # Requirements don't depend on each other, so can be run at once
+        run_all(transform_manager, [functools.partial(requirement, transform_manager)
+                                    for requirement in self._requirements])
+        return self._first(transform_manager, *args)
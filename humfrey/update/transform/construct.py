@@ -3,24 +3,33 @@ from __future__ import with_statement
 from django.conf import settings
 
 from humfrey.update.transform.base import Transform, TransformException
+from humfrey.update.transform.streams import TripleStream, is_streaming
 
 from humfrey.sparql.endpoint import Endpoint
 from humfrey.streaming import serialize
 
 class Construct(Transform):
+    store_dependent = True
+
     def __init__(self, query):
         self.query = query
     def execute(self, transform_manager):
 
-        endpoint = Endpoint(transform_manager.store.query_endpoint, preferred_media_types=('text/plain',))
+        endpoint = Endpoint(transform_manager.store.query_endpoint, preferred_media_types=('text/plain',),
+                            admission_pool='batch')
 
         if isinstance(self.query, basestring):
             query = self.query
         else:
-            query_filename = self.query.execute(transform_manager)
+            query_filename = self.query(transform_manager)
             with open(query_filename, 'r') as query_file:
                 query = query_file.read()
 
+        if is_streaming(transform_manager):
+            transform_manager.start(self, [])
+            transform_manager.end([])
+            return TripleStream(endpoint.query(query, defer=True).get_triples())
+
         with open(transform_manager('nt'), 'w') as output:
             transform_manager.start(self, [])
             serialize(endpoint.query(query, defer=True), output)
@@ -6,6 +6,8 @@ import subprocess
 from humfrey.update.transform.base import Transform
 
 class HTMLToXML(Transform):
+    cacheable = True
+
     def execute(self, transform_manager, input):
         with open(transform_manager('xml'), 'w') as output:
             stderr_filename = output.name[:-3] + 'stderr'
@@ -16,7 +16,8 @@ import pytz
 from rdflib import Literal, BNode, URIRef
 
 from humfrey.update.transform.base import Transform
-from humfrey.streaming import parse, serialize
+from humfrey.update.transform.streams import get_triples
+from humfrey.streaming import serialize
 from humfrey.utils.namespaces import NS, expand, HUMFREY
 from humfrey.sparql.endpoint import Endpoint
 
@@ -228,6 +229,8 @@ class NotationNormalization(Normalization):
             self.done = True
 
 class Normalize(Transform):
+    store_dependent = True
+
     available_normalizations = {'timezones': TimezoneNormalization,
                                 'notations': NotationNormalization,
                                 'search': SearchNormalization}
@@ -241,19 +244,20 @@ class Normalize(Transform):
     def execute(self, transform_manager, input):
         transform_manager.start(self, [])
 
-        endpoint = Endpoint(transform_manager.store.query_endpoint)
+        endpoint = Endpoint(transform_manager.store.query_endpoint, admission_pool='batch')
 
         for normalization in self.normalizations:
             normalization.endpoint = endpoint
             normalization.store = transform_manager.store
 
+        # Some normalizations take more than one pass, so we need a file
+        # for all but the first to read from
         while self.normalizations:
-            with open(input, 'r') as source:
-                pipeline = parse(source).get_triples()
-                for normalization in self.normalizations:
-                    pipeline = normalization(pipeline)
-                with open(transform_manager('rdf'), 'w') as target:
-                    serialize(pipeline, target)
+            pipeline = get_triples(input)
+            for normalization in self.normalizations:
+                pipeline = normalization(pipeline)
+            with open(transform_manager('rdf'), 'w') as target:
+                serialize(pipeline, target)
 
             input = target.name
             self.normalizations = [n for n in self.normalizations if not n.done]
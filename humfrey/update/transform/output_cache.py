@@ -0,0 +1,208 @@
+"""
+A content-addressed cache of the outputs of deterministic transforms.
+
+Most updates find that their sources haven't changed, but without this would
+still convert them afresh. A transform that sets cacheable has its output
+stored under UPDATE_CACHE_DIRECTORY, keyed on its class, its parameters, the
+store (if it depends on it) and the SHA-1 hashes of the files it reads. Those
+are its inputs, plus whatever get_cache_files() returns (e.g. an XSLT
+transform's stylesheets). When the key is seen again the output is copied
+from the cache instead, and Upload can then tell that its payload hasn't
+changed and leave the graph alone, so long as the graph's dcterms:modified in
+the store is still what it was after the last upload.
+
+Transforms whose output depends on something we can't hash, such as the
+contents of a store or a remote resource, mustn't set cacheable.
+
+Entries that haven't been used for UPDATE_OUTPUT_CACHE_AGE days are removed
+at the end of each update. Set UPDATE_OUTPUT_CACHE to False to disable it.
+"""
+
+import errno
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from humfrey.update.transform.base import get_memo_key
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'UPDATE_OUTPUT_CACHE', True)
+DIRECTORY = getattr(settings, 'UPDATE_OUTPUT_CACHE_DIRECTORY', None) \
+         or (getattr(settings, 'UPDATE_CACHE_DIRECTORY', None)
+             and os.path.join(settings.UPDATE_CACHE_DIRECTORY, 'outputs'))
+MAX_AGE = getattr(settings, 'UPDATE_OUTPUT_CACHE_AGE', 7) * 86400
+
+# Change this to invalidate everything that's been cached
+_VERSION = 1
+
+def hash_file(filename, copy_to=None):
+    """
+    Returns the SHA-1 hash of a file's contents, optionally copying it to
+    another file as it goes.
+    """
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        chunk = f.read(65536)
+        while chunk:
+            h.update(chunk)
+            if copy_to:
+                copy_to.write(chunk)
+            chunk = f.read(65536)
+    return h.hexdigest()
+
+class OutputCache(object):
+    def __init__(self, directory=None, max_age=None):
+        self.directory = directory or DIRECTORY
+        self.max_age = max_age or MAX_AGE
+        # Files in an update's output directory aren't changed once written,
+        # so we only need to hash each once.
+        self._hashes = {}
+
+    def get_hash(self, filename):
+        filename = os.path.abspath(filename)
+        try:
+            return self._hashes[filename]
+        except KeyError:
+            self._hashes[filename] = file_hash = hash_file(filename)
+            return file_hash
+
+    def get_key(self, transform, transform_manager, args):
+        """
+        Returns the key for a transform given args, or None if it can't be
+        cached.
+        """
+        filenames = transform.get_cache_files(transform_manager, *args)
+        if filenames is None:
+            return None
+        h = hashlib.sha1()
+        try:
+            h.update(repr((_VERSION, get_memo_key(transform))))
+        except TypeError:
+            return None
+        if transform.depends_on_store():
+            h.update(repr(transform_manager.store.slug))
+        for filename in filenames:
+            if not isinstance(filename, basestring) or not os.path.isfile(filename):
+                return None
+            h.update(self.get_hash(filename))
+        return h.hexdigest()
+
+    def _get_filename(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, transform, transform_manager, args, func):
+        """
+        Returns the cached output of transform for args, or calls func and
+        caches what it returns.
+        """
+        key = self.get_key(transform, transform_manager, args)
+        if key is None:
+            return func()
+
+        filename = self._get_filename(key)
+        for cached in glob.glob(filename + '.*'):
+            return self._restore(transform, transform_manager, args, cached)
+
+        output = func()
+        if isinstance(output, basestring) and os.path.isfile(output):
+            self._store(filename, output)
+        return output
+
+    def _restore(self, transform, transform_manager, args, cached):
+        transform_manager.start(transform, list(args), type='cached')
+        with open(transform_manager(cached.rsplit('.', 1)[1]), 'wb') as output:
+            self._hashes[os.path.abspath(output.name)] = hash_file(cached, output)
+        # Keep it from being pruned
+        os.utime(cached, None)
+        logger.info("Reusing cached output of %r", transform)
+        transform_manager.end([output.name])
+        return output.name
+
+    def _makedirs(self, filename):
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _store(self, filename, output):
+        extension = output.rsplit('.', 1)[-1] if '.' in os.path.basename(output) else 'unknown'
+        temp_filename = None
+        try:
+            self._makedirs(filename)
+            # Write somewhere else first, so no-one sees a partial file
+            fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename))
+            with os.fdopen(fd, 'wb') as f:
+                self._hashes[os.path.abspath(output)] = hash_file(output, f)
+            os.rename(temp_filename, '%s.%s' % (filename, extension))
+        except (IOError, OSError):
+            logger.exception("Couldn't cache output %r", output)
+            if temp_filename and os.path.exists(temp_filename):
+                os.unlink(temp_filename)
+
+    def _get_payload_filename(self, store, graph_name, method):
+        key = hashlib.sha1(repr((store.slug, unicode(graph_name), method))).hexdigest()
+        return os.path.join(self.directory, 'payloads', key)
+
+    def _get_payload_record(self, filename, modified):
+        return repr((self.get_hash(filename), unicode(modified)))
+
+    def payload_unchanged(self, store, graph_name, method, filename, modified):
+        """
+        Returns whether filename is the same as was last uploaded to a graph,
+        and the graph's modification date in the store (modified) is the same
+        as it was just after.
+        """
+        if modified is None:
+            return False
+        try:
+            with open(self._get_payload_filename(store, graph_name, method)) as f:
+                previous = f.read()
+        except IOError:
+            return False
+        return previous == self._get_payload_record(filename, modified)
+
+    def payload_uploaded(self, store, graph_name, method, filename, modified):
+        """
+        Records that filename has been uploaded to a graph, giving it the
+        modification date modified.
+        """
+        if modified is None:
+            return
+        payload_filename = self._get_payload_filename(store, graph_name, method)
+        try:
+            self._makedirs(payload_filename)
+            with open(payload_filename, 'w') as f:
+                f.write(self._get_payload_record(filename, modified))
+        except (IOError, OSError):
+            logger.exception("Couldn't record upload of %r", filename)
+
+    def prune(self):
+        """
+        Removes entries that haven't been used for max_age seconds.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        oldest = time.time() - self.max_age
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for name in filenames:
+                filename = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(filename) < oldest:
+                        os.unlink(filename)
+                except OSError:
+                    pass
+
+def get_output_cache():
+    """
+    Returns an OutputCache, or None if it's disabled or there's nowhere to
+    put it.
+    """
+    if ENABLED and DIRECTORY:
+        return OutputCache()
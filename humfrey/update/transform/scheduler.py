@@ -0,0 +1,95 @@
+"""
+Concurrent execution of the independent branches of a pipeline.
+
+A pipeline is a DAG of transforms: the second transform in a Chain depends on
+the first, a Requires on its requirements, and a Union on the transforms it
+combines. The requirements of a Requires don't depend on each other, and nor
+do the transforms combined by a Union, so those hand their branches to the
+TransformManager's Scheduler to be run at the same time. This matters most
+for pipelines that retrieve from many sources, as they spend most of their
+time waiting on the network.
+
+Transforms are run in threads rather than processes, as they share the
+TransformManager and its database connection. A Scheduler limits the number
+of extra threads running at once across the whole pipeline. When they're all
+busy, branches are run in the calling thread instead, so nested branches
+can't deadlock waiting for each other.
+"""
+
+import logging
+import sys
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# The number of branches to run at once for each pipeline, including the
+# pipeline's own thread.
+WORKERS = getattr(settings, 'UPDATE_TRANSFORM_WORKERS', 4)
+
+class Scheduler(object):
+    def __init__(self, workers=None, initializer=None):
+        """
+        initializer is called at the start of each new thread.
+        """
+        self.workers = workers or WORKERS
+        self.initializer = initializer
+        self._available = threading.Semaphore(max(self.workers - 1, 0))
+
+    def _run(self, func, results, i):
+        try:
+            if self.initializer:
+                self.initializer()
+            results[i] = True, func()
+        except Exception:
+            results[i] = False, sys.exc_info()
+        finally:
+            # Each thread has its own database connection
+            connection.close()
+            self._available.release()
+
+    def map(self, funcs):
+        """
+        Calls each of funcs, concurrently if there are workers free, and
+        returns a list of their results.
+
+        If any raise an exception, the first (in the order of funcs) is
+        re-raised once they've all finished.
+        """
+        funcs = list(funcs)
+        results, threads, inline = [None] * len(funcs), [], []
+        # The last is always run in this thread, as it'd otherwise be idle
+        for i, func in enumerate(funcs[:-1]):
+            if self._available.acquire(False):
+                thread = threading.Thread(target=self._run, args=(func, results, i))
+                thread.start()
+                threads.append(thread)
+            else:
+                inline.append(i)
+        if funcs:
+            inline.append(len(funcs) - 1)
+
+        for i in inline:
+            try:
+                results[i] = True, funcs[i]()
+            except Exception:
+                results[i] = False, sys.exc_info()
+        for thread in threads:
+            thread.join()
+
+        for succeeded, result in results:
+            if not succeeded:
+                raise result[0], result[1], result[2]
+        return [result for succeeded, result in results]
+
+def run_all(transform_manager, funcs):
+    """
+    Runs funcs using transform_manager's Scheduler if it has one, or one
+    after another if not.
+    """
+    scheduler = getattr(transform_manager, 'scheduler', None)
+    if scheduler is None:
+        return [func() for func in funcs]
+    return scheduler.map(funcs)
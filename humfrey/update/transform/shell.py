@@ -5,18 +5,27 @@ import tempfile
 from django.conf import settings
 
 from .base import Transform, TransformException
+from .streams import get_filename
 
 SHELL_TRANSFORMS = getattr(settings, 'SHELL_TRANSFORMS', {})
 
 logger = logging.getLogger(__name__)
 
 class Shell(Transform):
-    def __init__(self, name, extension, params=None):
+    def __init__(self, name, extension, params=None, cache=False):
         self.shell = SHELL_TRANSFORMS[name]
         self.extension = extension
         self.params = params or {}
+        # We can't tell what a command reads, so only pass cache=True for
+        # those whose output depends on nothing but their input and
+        # parameters.
+        self.cacheable = cache
+
+    def depends_on_store(self):
+        return 'store' not in self.params
 
     def execute(self, transform_manager, input):
+        input = get_filename(transform_manager, input)
         params = self.params.copy()
         if 'store' not in params:
             params['store'] = transform_manager.store.slug
@@ -31,6 +31,8 @@ class Percentage(decimal.Decimal):
         return "Percentage(%r, %r)" % (decimal.Decimal.__str__(self), self.rendered)
 
 class SpreadsheetToTEI(Transform):
+    cacheable = True
+
     class Sheet(object): pass
     class Row(object): pass
 
@@ -0,0 +1,61 @@
+"""
+Triples handed directly from one transform to the next.
+
+Ordinarily each transform writes its output to a file in the update's output
+directory, which the next transform then parses again. When UPDATE_STREAMING
+is on, transforms that produce triples (Construct and Union) instead return a
+TripleStream, which the next transform iterates over. Transforms that need a
+file, such as to pass to saxon or xmllint, write one using get_filename().
+
+Triples are produced lazily as they're consumed, so a TripleStream can only
+be read once.
+"""
+
+from django.conf import settings
+
+from humfrey.streaming import parse, serialize
+
+ENABLED = getattr(settings, 'UPDATE_STREAMING', False)
+
+class TripleStream(object):
+    def __init__(self, triples, extension='nt'):
+        """
+        extension is the format to use should the triples need to be
+        written to a file.
+        """
+        self._triples = triples
+        self.extension = extension
+        self._read = False
+
+    def __iter__(self):
+        if self._read:
+            raise ValueError("This stream has already been read.")
+        self._read = True
+        return iter(self._triples)
+
+def is_streaming(transform_manager):
+    return getattr(transform_manager, 'streaming', False)
+
+def _parse_file(filename):
+    with open(filename, 'r') as f:
+        for triple in parse(f).get_triples():
+            yield triple
+
+def get_triples(input):
+    """
+    Returns an iterator over the triples in a filename or TripleStream.
+    """
+    if isinstance(input, TripleStream):
+        return iter(input)
+    return _parse_file(input)
+
+def get_filename(transform_manager, input):
+    """
+    Returns the name of a file containing input, writing it out first if
+    it's a TripleStream.
+    """
+    if not isinstance(input, TripleStream):
+        return input
+    with open(transform_manager(input.extension), 'w') as output:
+        serialize(input, output)
+    return output.name
@@ -1,26 +1,34 @@
 from __future__ import with_statement
 
+import functools
 import itertools
-import os
-
-import rdflib
 
 from humfrey.update.transform.base import Transform
-from humfrey.streaming import parse, serialize
+from humfrey.update.transform.scheduler import run_all
+from humfrey.update.transform.streams import TripleStream, get_triples, is_streaming
+from humfrey.streaming import serialize
 
 class Union(Transform):
     def __init__(self, *others):
         self.others = others
 
+    def depends_on_store(self):
+        return any(other.depends_on_store() for other in self.others)
+
     def execute(self, transform_manager, input=None):
         inputs = [input] if input else []
-        inputs += [other(transform_manager) for other in self.others]
+        inputs += run_all(transform_manager, [functools.partial(other, transform_manager)
+                                              for other in self.others])
 
         transform_manager.start(self, inputs)
 
-        inputs = [parse(open(fn)) for fn in inputs]
-        triples = itertools.chain(*inputs)
+        triples = itertools.chain.from_iterable(get_triples(input) for input in inputs)
+
+        if is_streaming(transform_manager):
+            transform_manager.end([])
+            return TripleStream(triples)
 
-        with transform_manager('nt') as output:
+        with open(transform_manager('nt'), 'w') as output:
             serialize(triples, output)
+            transform_manager.end([output.name])
             return output.name
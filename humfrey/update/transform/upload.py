@@ -9,24 +9,28 @@ import rdflib
 from django.conf import settings
 
 from humfrey.update.transform.base import Transform
+from humfrey.update.transform.streams import TripleStream
 from humfrey.update.uploader import Uploader
 from humfrey.sparql.endpoint import Endpoint
+from humfrey.streaming import NTriplesSerializer, parse, parser_by_extension
 from humfrey.utils.namespaces import NS
 
 logger = logging.getLogger(__name__)
 
 class Upload(Transform):
-    formats = {
-        'rdf': 'xml',
-        'n3': 'n3',
-        'ttl': 'n3',
-        'nt': 'nt',
-    }
-
-    created_query = """
+    """
+    Replaces (or with method='POST', adds to) a graph in the store.
+
+    The input is streamed to the store as N-Triples, with triples added to
+    say when the graph was created and last modified, unless the input
+    already does.
+    """
+    store_dependent = True
+
+    date_query = """
         SELECT ?date WHERE {
           GRAPH %(graph)s {
-            %(graph)s dcterms:created ?date
+            %(graph)s %(predicate)s ?date
           }
         }
     """
@@ -37,60 +41,100 @@ class Upload(Transform):
         self.graph_name = rdflib.URIRef(graph_name)
         self.method = method
 
-    def execute(self, transform_manager, input):
-        transform_manager.start(self, [input])
-
-        logger.debug("Starting upload of %r", input)
-
-        extension = input.rsplit('.', 1)[-1]
+    def get_triples(self, input):
+        if isinstance(input, TripleStream):
+            return iter(input)
         try:
-            serializer = self.formats[extension]
+            parser_by_extension(input)
         except KeyError:
-            logger.exception("Unrecognized RDF extension: %r", extension)
+            logger.exception("Unrecognized RDF extension: %r", input.rsplit('.', 1)[-1])
             raise
+        return self._parse(input)
+
+    def _parse(self, filename):
+        with open(filename, 'r') as f:
+            # Relative references are relative to the graph
+            for triple in parse(f, base=self.graph_name).get_triples():
+                yield triple
+
+    def _get_date(self, transform_manager, predicate):
+        logger.debug("Getting %s from %r", predicate, transform_manager.store.query_endpoint)
+        endpoint = Endpoint(transform_manager.store.query_endpoint, admission_pool='batch')
+        results = list(endpoint.query(self.date_query % {'graph': self.graph_name.n3(),
+                                                         'predicate': predicate.n3()}))
+        if results:
+            return results[0].date
+
+    def get_created(self, transform_manager):
+        """
+        Returns when the graph was created according to the store, or None.
+        """
+        return self._get_date(transform_manager, NS.dcterms.created)
+
+    def get_modified(self, transform_manager):
+        """
+        Returns when the graph was last modified according to the store, or
+        None.
+        """
+        return self._get_date(transform_manager, NS.dcterms.modified)
+
+    def add_metadata(self, triples, created):
+        """
+        Yields triples, followed by those describing the graph.
+        """
+        graph_name = self.graph_name
+        dcterms_modified, dcterms_created = NS.dcterms.modified, NS.dcterms.created
+        modified = None
+        for triple in triples:
+            if triple[0] == graph_name:
+                if triple[1] == dcterms_modified:
+                    modified = triple[2]
+                elif triple[1] == dcterms_created:
+                    created = triple[2]
+            yield triple
+
+        if modified is None:
+            modified = rdflib.Literal(self.site_timezone.localize(datetime.datetime.now().replace(microsecond=0)))
+        # Duplicates of triples already in the input are harmless
+        yield (graph_name, NS.rdf.type, NS.sd.Graph)
+        yield (graph_name, dcterms_modified, modified)
+        yield (graph_name, dcterms_created, created or modified)
 
-        graph = rdflib.ConjunctiveGraph()
-        graph.parse(open(input, 'r'),
-                    format=serializer,
-                    publicID=self.graph_name)
-
-        logger.debug("Parsed graph")
-
-        datetime_now = self.site_timezone.localize(datetime.datetime.now().replace(microsecond=0))
-        modified = graph.value(self.graph_name, NS['dcterms'].modified,
-                               default=rdflib.Literal(datetime_now))
-        created = graph.value(self.graph_name, NS['dcterms'].created)
-        if not created:
-            logger.debug("Getting created date from %r", transform_manager.store.query_endpoint)
-            endpoint = Endpoint(transform_manager.store.query_endpoint)
-            results = list(endpoint.query(self.created_query % {'graph': self.graph_name.n3()}))
-            if results:
-                created = results[0].date
-            else:
-                created = modified
+    def execute(self, transform_manager, input):
+        transform_manager.start(self, [input])
 
-        graph += (
-            (self.graph_name, NS.rdf.type, NS.sd.Graph),
-            (self.graph_name, NS.dcterms.modified, modified),
-            (self.graph_name, NS.dcterms.created, created),
-        )
+        # Replacing a graph with what we put there last time won't change it,
+        # as long as no-one else has replaced it since. We can tell that by
+        # its modification date, which we add to everything we upload.
+        output_cache = getattr(transform_manager, 'output_cache', None)
+        use_output_cache = output_cache and self.method == 'PUT' and not isinstance(input, TripleStream)
+        if use_output_cache and not transform_manager.force \
+           and output_cache.payload_unchanged(transform_manager.store, self.graph_name, self.method, input,
+                                              self.get_modified(transform_manager)):
+            logger.info("Not uploading %s to %s as it hasn't changed",
+                        self.graph_name, transform_manager.store.slug)
+            transform_manager.end([])
+            return
 
-        logger.debug("About to serialize")
+        triples = self.get_triples(input)
 
-        output = transform_manager('rdf')
-        with open(output, 'w') as f:
-            graph.serialize(f)
+        # Ask before we start replacing the graph
+        created = self.get_created(transform_manager)
 
-        logger.debug("Serialization done; about to upload")
+        logger.debug("Starting upload of %r", input)
 
         uploader = Uploader()
         uploader.upload(stores=(transform_manager.store,),
                         graph_name=self.graph_name,
-                        filename=output,
+                        stream=NTriplesSerializer(self.add_metadata(triples, created)),
                         method=self.method,
-                        mimetype='application/rdf+xml')
+                        mimetype=NTriplesSerializer.media_type)
 
         logger.debug("Upload complete")
 
+        if use_output_cache:
+            output_cache.payload_uploaded(transform_manager.store, self.graph_name, self.method, input,
+                                          self.get_modified(transform_manager))
+
         transform_manager.end([self.graph_name])
         transform_manager.touched_graph(self.graph_name)
@@ -15,6 +15,8 @@ from humfrey.update.tasks import retrieve
 logger = logging.getLogger(__name__)
 
 class VocabularyLoader(Transform):
+    store_dependent = True
+
     def execute(self, transform_manager):
 
         for prefix, uri in NS.iteritems():
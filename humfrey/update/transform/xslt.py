@@ -2,16 +2,83 @@ from __future__ import with_statement
 
 import logging
 import os
+import re
 import subprocess
 import tempfile
+import urlparse
 from xml.sax.saxutils import quoteattr
 
 from django.core.exceptions import ImproperlyConfigured
+from lxml import etree
 
 from humfrey.update.transform.base import Transform, TransformException
+from humfrey.update.transform.streams import get_filename
 
 logger = logging.getLogger(__name__)
 
+_XSL_NAMESPACES = {'xsl': 'http://www.w3.org/1999/XSL/Transform'}
+
+# Functions whose results depend on more than a stylesheet and its input, so
+# whose output we can't cache.
+_nondeterministic_re = re.compile(r'(?<![\w.-])(?:fn:)?(?:document|doc|doc-available|collection|'
+                                  r'unparsed-text|unparsed-text-available|unparsed-text-lines|'
+                                  r'current-dateTime|current-date|current-time)\s*\(')
+
+def _iter_stylesheets(filename, seen=None):
+    """
+    Yields (filename, stylesheet) for a stylesheet and those it includes or
+    imports. stylesheet is None if it's remote or can't be parsed.
+    """
+    seen = seen if seen is not None else set()
+    if filename in seen:
+        return
+    seen.add(filename)
+    if urlparse.urlparse(filename).scheme not in ('', 'file'):
+        yield filename, None
+        return
+    try:
+        stylesheet = etree.parse(urlparse.urlparse(filename).path)
+    except (IOError, etree.XMLSyntaxError):
+        yield filename, None
+        return
+    yield filename, stylesheet
+    for href in stylesheet.xpath('/*/xsl:include/@href | /*/xsl:import/@href', namespaces=_XSL_NAMESPACES):
+        for item in _iter_stylesheets(urlparse.urljoin(filename, href), seen):
+            yield item
+
+def _uses_store_param(filename):
+    """
+    Returns whether a stylesheet, or one it includes or imports, declares a
+    'store' parameter. If we can't tell, we assume it does.
+    """
+    for filename, stylesheet in _iter_stylesheets(filename):
+        if stylesheet is None or stylesheet.xpath("/*/xsl:param[@name='store']", namespaces=_XSL_NAMESPACES):
+            return True
+    return False
+
+def _is_deterministic(stylesheet):
+    """
+    Returns whether a stylesheet avoids functions that read other documents
+    or the clock. We look for them in every attribute, which may be
+    overcautious.
+    """
+    for value in stylesheet.xpath('//@*'):
+        if _nondeterministic_re.search(value):
+            return False
+    return True
+
+def _get_stylesheet_files(filename):
+    """
+    Returns the local files making up a stylesheet, or None if some are
+    remote, can't be parsed, or mean its output can't be cached.
+    """
+    filenames = []
+    for filename, stylesheet in _iter_stylesheets(filename):
+        if stylesheet is None or not _is_deterministic(stylesheet):
+            return None
+        filenames.append(urlparse.urlparse(filename).path)
+    return filenames
+
 class XSLT(Transform):
     _xsl_shim = """\
 <?xml version="1.0" encoding="UTF-8"?>
@@ -21,10 +88,28 @@ class XSLT(Transform):
 </xsl:stylesheet>
 """
 
-    def __init__(self, template, extension='xml', params=None):
+    def __init__(self, template, extension='xml', params=None, cache=True):
         self.template = template
         self.extension = extension
         self.params = params or {}
+        # Stylesheets that call document(), current-dateTime() and the like
+        # are never cached. Pass cache=False for any that otherwise depend
+        # on more than their input and parameters.
+        self.cacheable = cache
+
+    def depends_on_store(self):
+        if not isinstance(self.template, basestring):
+            return True
+        # The store is passed to the template unless given as a parameter
+        return 'store' not in self.params and _uses_store_param(self.template)
+
+    def get_cache_files(self, transform_manager, input):
+        if not isinstance(self.template, basestring):
+            return None
+        stylesheet_files = _get_stylesheet_files(self.template)
+        if stylesheet_files is None:
+            return None
+        return [input] + stylesheet_files
 
     @property
     def saxon_path(self):
@@ -35,12 +120,13 @@ class XSLT(Transform):
         raise ImproperlyConfigured("Couldn't find saxon.")
 
     def execute(self, transform_manager, input):
+        input = get_filename(transform_manager, input)
         if isinstance(self.template, basestring):
             with open(transform_manager('xsl'), 'w') as xsl_shim:
                 xsl_shim.write(self._xsl_shim.format(quoteattr(self.template)))
             template_filename = xsl_shim.name
         else:
-            template_filename = self.template.execute(transform_manager)
+            template_filename = self.template(transform_manager)
 
         with open(transform_manager(self.extension), 'w') as output:
             with open(transform_manager('stderr'), 'w+b') as stderr:
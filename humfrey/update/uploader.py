@@ -5,6 +5,7 @@ import tempfile
 import urllib
 import urllib2
 import urlparse
+import zlib
 
 from django.conf import settings
 
@@ -12,13 +13,36 @@ from humfrey.sparql.models import Store
 
 logger = logging.getLogger(__name__)
 
+# Whether to gzip request bodies sent with chunked transfer encoding. Not all
+# graph stores accept compressed requests, so this is off by default.
+COMPRESS = getattr(settings, 'UPDATE_UPLOAD_GZIP', False)
+# Bytes to collect before sending a chunk
+CHUNK_SIZE = 64 * 1024
+
 class Uploader(object):
     @classmethod
     def upload(cls, stores, graph_name,
-               filename=None, graph=None, data=None,
-               delete_after=False, method='PUT', mimetype='text/plain'):
+               filename=None, graph=None, data=None, stream=None,
+               delete_after=False, method='PUT', mimetype='text/plain',
+               compress=None):
+        """
+        Uploads to a graph in each of stores.
+
+        The payload is one of the filename, an rdflib graph, a string of
+        data, or a stream, which is an iterable of strings. Streams are sent
+        using chunked transfer encoding, gzipped if compress is true.
+        """
+        stores = set(stores)
         if filename:
             pass
+        elif stream is not None:
+            if len(stores) > 1:
+                # A stream can only be read once, so keep a copy
+                with tempfile.NamedTemporaryFile(delete=False) as f:
+                    for chunk in stream:
+                        f.write(chunk)
+                filename, stream = f.name, None
+                delete_after = True
         elif graph:
             with tempfile.NamedTemporaryFile(delete=False) as f:
                 graph.serialize(f, format='nt')
@@ -30,14 +54,16 @@ class Uploader(object):
             filename = f.name
             delete_after = True
 
-        for store in set(stores):
-            cls.upload_to_store(store, graph_name, method, filename, mimetype)
-
-        if delete_after:
-            os.unlink(filename)
+        try:
+            for store in stores:
+                cls.upload_to_store(store, graph_name, method, filename, mimetype,
+                                    stream=stream, compress=compress)
+        finally:
+            if delete_after:
+                os.unlink(filename)
 
     @classmethod
-    def upload_to_store(cls, store, graph_name, method, filename, mimetype):
+    def upload_to_store(cls, store, graph_name, method, filename, mimetype, stream=None, compress=None):
         if isinstance(store, Store):
             graph_store_endpoint = store.graph_store_endpoint
         elif isinstance(store, basestring):
@@ -45,6 +71,9 @@ class Uploader(object):
         else:
             raise TypeError("store must be Store or basestring, not %r", type(store))
 
+        if compress is None:
+            compress = COMPRESS
+
         graph_url = '%s?%s' % (graph_store_endpoint,
                                urllib.urlencode({'graph': graph_name}))
         graph_url = urlparse.urlparse(graph_url)
@@ -56,22 +85,32 @@ class Uploader(object):
         if graph_url.query:
             path += '?' + graph_url.query
 
-        with open(filename, 'r') as f:
-
-            logger.debug("Opening connection to %s:%d", host, port)
+        logger.debug("Opening connection to %s:%d", host, port)
 
-            conn = httplib.HTTPConnection(host=host, port=port)
-            conn.connect()
+        conn = httplib.HTTPConnection(host=host, port=port)
+        conn.connect()
 
-            logger.debug("Connected")
+        logger.debug("Connected")
 
+        try:
             conn.putrequest(method, path)
             conn.putheader("User-Agent", "humfrey")
-            conn.putheader("Content-Length", str(os.stat(filename).st_size))
             conn.putheader('Content-type', mimetype)
-            conn.endheaders()
 
-            conn.send(f)
+            if stream is None:
+                with open(filename, 'r') as f:
+                    conn.putheader("Content-Length", str(os.stat(filename).st_size))
+                    conn.endheaders()
+                    conn.send(f)
+            else:
+                conn.putheader("Transfer-Encoding", "chunked")
+                if compress:
+                    conn.putheader("Content-Encoding", "gzip")
+                conn.endheaders()
+                # If the stream raises an exception we never send the last
+                # chunk, so the store sees an incomplete request and ought
+                # to leave the graph alone.
+                cls._send_chunked(conn, stream, compress)
 
             logger.debug("Request sent; getting response")
 
@@ -86,6 +125,24 @@ class Uploader(object):
                                         "",
                                         response.getheaders(),
                                         response.fp)
-
+        finally:
             conn.close()
 
+    @classmethod
+    def _send_chunk(cls, conn, data):
+        if data:
+            conn.send('%x\r\n%s\r\n' % (len(data), data))
+
+    @classmethod
+    def _send_chunked(cls, conn, stream, compress):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+        buffer, size = [], 0
+        for data in stream:
+            buffer.append(data)
+            size += len(data)
+            if size >= CHUNK_SIZE:
+                data, buffer, size = ''.join(buffer), [], 0
+                cls._send_chunk(conn, compressor.compress(data) if compressor else data)
+        data = ''.join(buffer)
+        cls._send_chunk(conn, compressor.compress(data) + compressor.flush() if compressor else data)
+        conn.send('0\r\n\r\n')
@@ -19,5 +19,15 @@ def get_transforms():
     get_transforms._cache = transforms
     return transforms
 
+def compile_pipeline(pipeline):
+    """
+    Parses a pipeline, raising SyntaxError if it's invalid.
+
+    The result can be passed to evaluate_pipeline() as often as needed.
+    """
+    return compile('(%s)' % pipeline, '<pipeline>', 'eval')
+
 def evaluate_pipeline(pipeline):
-    return eval('(%s)' % pipeline, get_transforms())
+    if isinstance(pipeline, basestring):
+        pipeline = compile_pipeline(pipeline)
+    return eval(pipeline, get_transforms())
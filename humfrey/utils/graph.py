@@ -0,0 +1,242 @@
+"""
+A compact, read-optimised in-memory graph.
+
+Views build a graph for each request from the results of a few queries, and
+then do nothing but look things up in it. rdflib's general-purpose stores are
+comparatively heavy for this, so CompactGraph gives each term an integer id
+and keeps SPO, POS and OSP indexes of ids.
+
+Only the parts of rdflib's Graph API used by BaseResource, the views and the
+templates are implemented. Use to_rdflib() if you need the rest.
+"""
+
+import rdflib
+
+__all__ = ['CompactGraph']
+
+# Each index maps a first id to the second and third ids of its triples. Most
+# entries only have one triple, so we save memory by storing those as a
+# (second, third) tuple, and only using a dict of seconds once there's more
+# than one. Likewise, thirds are stored as an int until there's more than one,
+# and then as a set.
+
+def _insert(index, a, b, c):
+    """
+    Adds (a, b, c) to index, returning False if it was already present.
+    """
+    entry = index.get(a)
+    if entry is None:
+        index[a] = (b, c)
+        return True
+    if type(entry) is tuple:
+        if entry[0] != b:
+            index[a] = {entry[0]: entry[1], b: c}
+        elif entry[1] != c:
+            index[a] = {b: set(entry[1:]) | set([c])}
+        else:
+            return False
+        return True
+    leaf = entry.get(b)
+    if leaf is None:
+        entry[b] = c
+    elif type(leaf) is set:
+        if c in leaf:
+            return False
+        leaf.add(c)
+    elif leaf != c:
+        entry[b] = set([leaf, c])
+    else:
+        return False
+    return True
+
+def _pairs(index, a):
+    entry = index.get(a)
+    if entry is None:
+        return
+    if type(entry) is tuple:
+        yield entry
+        return
+    for b, leaf in entry.iteritems():
+        if type(leaf) is set:
+            for c in leaf:
+                yield b, c
+        else:
+            yield b, leaf
+
+def _leaves(index, a, b):
+    entry = index.get(a)
+    if entry is None:
+        return ()
+    if type(entry) is tuple:
+        return entry[1:] if entry[0] == b else ()
+    leaf = entry.get(b)
+    if leaf is None:
+        return ()
+    return leaf if type(leaf) is set else (leaf,)
+
+class CompactGraph(object):
+    def __init__(self, triples=None):
+        # Term ids by unicode representation (and language and datatype, for
+        # literals). We don't use the terms themselves as keys, as hashing
+        # rdflib terms is comparatively slow.
+        self._uris, self._bnodes, self._literals = {}, {}, {}
+        self._terms = []
+        self._spo, self._pos, self._osp = {}, {}, {}
+        self._len = 0
+        if triples is not None:
+            self += triples
+
+    def _get_id(self, term, create=False):
+        if isinstance(term, rdflib.Literal):
+            ids = self._literals
+            datatype = term.datatype
+            key = unicode(term), term.language, unicode(datatype) if datatype is not None else None
+        elif isinstance(term, rdflib.BNode):
+            ids, key = self._bnodes, unicode(term)
+        else:
+            ids, key = self._uris, unicode(term)
+        term_id = ids.get(key)
+        if term_id is None and create:
+            if not isinstance(term, rdflib.term.Identifier):
+                term = rdflib.URIRef(term)
+            term_id = ids[key] = len(self._terms)
+            self._terms.append(term)
+        return term_id
+
+    def add(self, triple):
+        get_id = self._get_id
+        s, p, o = get_id(triple[0], True), get_id(triple[1], True), get_id(triple[2], True)
+        if _insert(self._spo, s, p, o):
+            _insert(self._pos, p, o, s)
+            _insert(self._osp, o, s, p)
+            self._len += 1
+
+    def __iadd__(self, triples):
+        add = self.add
+        for triple in triples:
+            add(triple)
+        return self
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return self.triples((None, None, None))
+
+    def __contains__(self, triple):
+        for _ in self.triples(triple):
+            return True
+        return False
+
+    def _triple_ids(self, (s, p, o)):
+        if s is None:
+            if p is None:
+                if o is None:
+                    for s in self._spo:
+                        for p, o in _pairs(self._spo, s):
+                            yield s, p, o
+                else:
+                    for s, p in _pairs(self._osp, o):
+                        yield s, p, o
+            elif o is None:
+                for o, s in _pairs(self._pos, p):
+                    yield s, p, o
+            else:
+                for s in _leaves(self._pos, p, o):
+                    yield s, p, o
+        elif p is None:
+            if o is None:
+                for p, o in _pairs(self._spo, s):
+                    yield s, p, o
+            else:
+                for p in _leaves(self._osp, o, s):
+                    yield s, p, o
+        elif o is None:
+            for o in _leaves(self._spo, s, p):
+                yield s, p, o
+        elif o in _leaves(self._spo, s, p):
+            yield s, p, o
+
+    def _resolve(self, pattern):
+        """
+        Returns the ids for a pattern, or None if any term isn't in the graph.
+        """
+        ids = []
+        for term in pattern:
+            if term is None:
+                ids.append(None)
+            else:
+                term_id = self._get_id(term)
+                if term_id is None:
+                    return None
+                ids.append(term_id)
+        return ids
+
+    def triples(self, pattern):
+        ids = self._resolve(pattern)
+        if ids is None:
+            return
+        terms = self._terms
+        for s, p, o in self._triple_ids(ids):
+            yield terms[s], terms[p], terms[o]
+
+    def subjects(self, predicate=None, object=None):
+        ids = self._resolve((None, predicate, object))
+        if ids is None:
+            return
+        terms = self._terms
+        for s, p, o in self._triple_ids(ids):
+            yield terms[s]
+
+    def predicates(self, subject=None, object=None):
+        ids = self._resolve((subject, None, object))
+        if ids is None:
+            return
+        terms = self._terms
+        for s, p, o in self._triple_ids(ids):
+            yield terms[p]
+
+    def objects(self, subject=None, predicate=None):
+        ids = self._resolve((subject, predicate, None))
+        if ids is None:
+            return
+        terms = self._terms
+        for s, p, o in self._triple_ids(ids):
+            yield terms[o]
+
+    def subject_objects(self, predicate=None):
+        for s, p, o in self.triples((None, predicate, None)):
+            yield s, o
+
+    def subject_predicates(self, object=None):
+        for s, p, o in self.triples((None, None, object)):
+            yield s, p
+
+    def predicate_objects(self, subject=None):
+        for s, p, o in self.triples((subject, None, None)):
+            yield p, o
+
+    def value(self, subject=None, predicate=rdflib.RDF.value, object=None, default=None, any=True):
+        """
+        Returns a term matching the one None position in the pattern, or
+        default. any is accepted for compatibility with rdflib, but ignored.
+        """
+        for s, p, o in self.triples((subject, predicate, object)):
+            if subject is None:
+                return s
+            elif predicate is None:
+                return p
+            else:
+                return o
+        return default
+
+    def to_rdflib(self):
+        """
+        Returns an rdflib ConjunctiveGraph with the same triples.
+        """
+        graph = rdflib.ConjunctiveGraph()
+        graph += self
+        return graph
+
+    def serialize(self, *args, **kwargs):
+        return self.to_rdflib().serialize(*args, **kwargs)
@@ -4,7 +4,9 @@ from rdflib import Namespace, URIRef
 
 from django.conf import settings
 
-__all__ = ['NS', 'register', 'expand', 'contract']
+from humfrey.utils.prefixes import PrefixIndex
+
+__all__ = ['NS', 'register', 'expand', 'contract', 'get_namespace_index']
 
 NS = {
     'aiiso': 'http://purl.org/vocab/aiiso/schema#',
@@ -54,14 +56,36 @@ NS.update(getattr(settings, 'ADDITIONAL_NAMESPACES', {}))
 INVERSE_NS = tuple((v, k) for k, v in sorted(NS.items(), key=lambda (k,v): -len(v)))
 
 class _NS(dict):
+    _index = None
+
     def __getattr__(self, key):
         return self[key]
 
+    def __setitem__(self, key, value):
+        super(_NS, self).__setitem__(key, value)
+        self._index = None
+
+    def update(self, *args, **kwargs):
+        super(_NS, self).update(*args, **kwargs)
+        self._index = None
+
+    # Not a property, so as not to clash with a namespace prefix
+    def _get_index(self):
+        if self._index is None:
+            self._index = PrefixIndex((uri, prefix) for prefix, uri in sorted(self.iteritems()))
+        return self._index
+
 NS = _NS((k, Namespace(v)) for k, v in NS.iteritems())
 
 def register(k, v):
     NS[k] = Namespace(v)
 
+def get_namespace_index():
+    """
+    Returns a PrefixIndex of namespace URIs to their prefixes.
+    """
+    return NS._get_index()
+
 is_localpart = re.compile(u"""^[A-Z _ a-z \xc0-\xd6 \xd8-\xf6 \xf8-\xff \u037f-\u1fff \u200c-\u218f]
                                [A-Z _ a-z \xc0-\xd6 \xd8-\xf6 \xf8-\xff \u037f-\u1fff \u200c-\u218f \\- . \\d]*$""",
                           re.VERBOSE).match
@@ -76,9 +100,8 @@ def expand(qname):
         return URIRef(qname)
 
 def contract(uri, separator=':'):
-    for ns, prefix in INVERSE_NS:
-        if uri.startswith(ns):
-            localpart = uri[len(ns):]
-            if is_localpart(localpart):
-                return "{0}{1}{2}".format(prefix, separator, localpart)
+    for ns, prefix in NS._get_index().matches(uri):
+        localpart = uri[len(ns):]
+        if is_localpart(localpart):
+            return "{0}{1}{2}".format(prefix, separator, localpart)
     return uri
@@ -0,0 +1,66 @@
+"""
+Longest-prefix matching of URIs against sets of prefixes.
+
+Namespaces, ID mappings and the like are all matched by prefix. Rather than
+trying each prefix in turn, a PrefixIndex looks up the start of a URI at each
+length that a prefix has, longest first, and remembers the results for
+recently seen URIs.
+"""
+
+__all__ = ['PrefixIndex']
+
+def _key(value):
+    # Hashing rdflib terms is comparatively slow, so key on plain strings.
+    # Byte strings are left alone, as they may not be decodable.
+    return value if type(value) is str else unicode(value)
+
+class PrefixIndex(object):
+    # Number of results to remember before starting afresh
+    memo_size = 10000
+
+    def __init__(self, items):
+        """
+        items is an iterable of (prefix, value) pairs. Where a prefix appears
+        more than once, the first value is used.
+        """
+        self._values = {}
+        for prefix, value in items:
+            self._values.setdefault(_key(prefix), value)
+        self._lengths = sorted(set(map(len, self._values)), reverse=True)
+        self._memo = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def matches(self, uri):
+        """
+        Returns a tuple of (prefix, value) pairs for the prefixes uri starts
+        with, longest first.
+        """
+        uri = _key(uri)
+        try:
+            return self._memo[uri]
+        except KeyError:
+            pass
+        values = self._values
+        matches = []
+        for length in self._lengths:
+            if length > len(uri):
+                continue
+            prefix = uri[:length]
+            value = values.get(prefix)
+            if value is not None:
+                matches.append((prefix, value))
+        matches = tuple(matches)
+        if len(self._memo) >= self.memo_size:
+            self._memo = {}
+        self._memo[uri] = matches
+        return matches
+
+    def longest(self, uri):
+        """
+        Returns the (prefix, value) pair for the longest prefix of uri, or
+        None.
+        """
+        matches = self.matches(uri)
+        return matches[0] if matches else None
@@ -1 +1,3 @@
-from .html_sanitizer import *
\ No newline at end of file
+from .graph import *
+from .html_sanitizer import *
+from .prefixes import *
@@ -0,0 +1,61 @@
+import itertools
+import unittest
+
+import rdflib
+
+from humfrey.utils.graph import CompactGraph
+
+EX = rdflib.Namespace('http://example.org/')
+
+class CompactGraphTestCase(unittest.TestCase):
+    triples = [(EX.a, rdflib.RDF.type, EX.Thing),
+               (EX.a, rdflib.RDFS.label, rdflib.Literal('a', lang='en')),
+               (EX.a, rdflib.RDFS.label, rdflib.Literal('a', lang='fr')),
+               (EX.a, rdflib.RDFS.label, rdflib.Literal('a')),
+               (EX.a, EX.related, EX.b),
+               (EX.a, EX.related, EX.c),
+               (EX.b, rdflib.RDF.type, EX.Thing),
+               (EX.b, EX.value, rdflib.Literal(1)),
+               (EX.b, EX.node, rdflib.BNode('x')),
+               (rdflib.BNode('x'), EX.related, EX.a),
+               (EX.c, EX.related, EX.a)]
+
+    def setUp(self):
+        self.graph = CompactGraph(self.triples)
+        self.rdflib_graph = rdflib.ConjunctiveGraph()
+        self.rdflib_graph += self.triples
+
+    def testPatterns(self):
+        terms = [None, EX.a, EX.related, EX.Thing, rdflib.Literal('a', lang='en'),
+                 rdflib.BNode('x'), EX.missing, rdflib.RDF.type]
+        for pattern in itertools.product(terms, repeat=3):
+            self.assertEqual(sorted(self.graph.triples(pattern)),
+                             sorted(self.rdflib_graph.triples(pattern)),
+                             pattern)
+
+    def testDuplicates(self):
+        self.graph += self.triples
+        self.graph.add((EX.a, rdflib.RDFS.label, rdflib.Literal('a', lang='en')))
+        self.assertEqual(len(self.graph), len(self.triples))
+        self.assertEqual(sorted(self.graph), sorted(self.triples))
+
+    def testAccessors(self):
+        graph = self.graph
+        self.assertEqual(sorted(graph.subjects(rdflib.RDF.type, EX.Thing)), [EX.a, EX.b])
+        self.assertEqual(sorted(graph.objects(EX.a, EX.related)), [EX.b, EX.c])
+        self.assertEqual(sorted(graph.predicates(EX.b)), sorted([rdflib.RDF.type, EX.node, EX.value]))
+        self.assertEqual(sorted(graph.subject_objects(EX.related)),
+                         sorted([(EX.a, EX.b), (EX.a, EX.c), (rdflib.BNode('x'), EX.a), (EX.c, EX.a)]))
+        self.assertEqual(sorted(graph.predicate_objects(EX.c)), [(EX.related, EX.a)])
+        self.assertEqual(graph.value(EX.b, EX.value), rdflib.Literal(1))
+        self.assertEqual(graph.value(EX.b, EX.missing, default=0), 0)
+        self.assertTrue((EX.c, EX.related, EX.a) in graph)
+        self.assertFalse((EX.c, EX.related, EX.b) in graph)
+
+    def testUnicodeSubclass(self):
+        class Resource(rdflib.URIRef):
+            pass
+        self.assertEqual(sorted(self.graph.objects(Resource(EX.a), EX.related)), [EX.b, EX.c])
+
+    def testToRDFLib(self):
+        self.assertEqual(sorted(self.graph.to_rdflib()), sorted(self.triples))
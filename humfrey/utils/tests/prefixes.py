@@ -0,0 +1,48 @@
+import unittest
+
+import rdflib
+
+from humfrey.utils.prefixes import PrefixIndex
+
+class PrefixIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex([('http://example.org/', 'ex'),
+                                  ('http://example.org/vocab/', 'vocab'),
+                                  ('http://example.org/vocab#', 'hash'),
+                                  ('http://example.org/', 'duplicate'),
+                                  ('http://other.example.org/', 'other')])
+
+    def testLen(self):
+        self.assertEqual(len(self.index), 4)
+
+    def testMatches(self):
+        self.assertEqual(self.index.matches('http://example.org/vocab/foo'),
+                         (('http://example.org/vocab/', 'vocab'),
+                          ('http://example.org/', 'ex')))
+        self.assertEqual(self.index.matches('http://example.org/vocab#foo'),
+                         (('http://example.org/vocab#', 'hash'),
+                          ('http://example.org/', 'ex')))
+        self.assertEqual(self.index.matches('http://example.com/'), ())
+        self.assertEqual(self.index.matches('http://'), ())
+
+    def testTerms(self):
+        uri = rdflib.URIRef('http://other.example.org/foo')
+        self.assertEqual(self.index.matches(uri), (('http://other.example.org/', 'other'),))
+        self.assertEqual(self.index.matches(unicode(uri)), (('http://other.example.org/', 'other'),))
+
+    def testByteStrings(self):
+        self.assertEqual(self.index.longest('http://example.org/fu\xc3\x9f'),
+                         ('http://example.org/', 'ex'))
+
+    def testLongest(self):
+        self.assertEqual(self.index.longest('http://example.org/vocab/foo'),
+                         ('http://example.org/vocab/', 'vocab'))
+        self.assertEqual(self.index.longest('http://example.com/'), None)
+
+    def testMemoSize(self):
+        index = PrefixIndex([('http://example.org/', 'ex')])
+        index.memo_size = 2
+        for i in range(5):
+            self.assertEqual(index.longest('http://example.org/%d' % i),
+                             ('http://example.org/', 'ex'))
+        self.assertTrue(len(index._memo) <= 2)